@@ -2,9 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import RedirectResponse
 from typing import Dict, Any
 import secrets
-import json
+import time
 from ..core.config import settings
+from ..core.auth import get_current_user
+from ..core.session import Session, SESSION_MAX_AGE, new_session_id, session_store, sign_session_id
 from ..services.spotify import SpotifyService
+from ..services.token_refresh import token_refresh
 from ..models.spotify import SpotifyToken, SpotifyUser
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -34,7 +37,7 @@ async def callback(code: str = None, state: str = None, error: str = None, reque
         raise HTTPException(status_code=400, detail="No state parameter received")
     
     # Exchange code for access token
-    token_data = SpotifyService.get_token(code)
+    token_data = await SpotifyService.get_token(code)
     
     if "error" in token_data:
         raise HTTPException(
@@ -43,60 +46,80 @@ async def callback(code: str = None, state: str = None, error: str = None, reque
         )
     
     # Get user profile
-    user_data = SpotifyService.get_user_profile(token_data["access_token"])
+    user_data = await SpotifyService.get_user_profile(token_data["access_token"])
     
-    # Create response with user data
-    response = RedirectResponse(url="/profile")
+    token = SpotifyToken(**token_data)
+    user = SpotifyUser(**user_data)
     
-    # Store token and user data in cookies
-    # In production, use a proper session management system
-    response.set_cookie(
-        key="spotify_token", 
-        value=json.dumps(token_data),
-        httponly=True,
-        samesite="lax",
-        max_age=3600,     # 1 hour
-        path="/"          # Make sure cookie is available for all paths
+    # Keep tokens and profile server-side; the client only holds a signed session ID
+    now = time.time()
+    session = Session(
+        session_id=new_session_id(),
+        user_id=user.id,
+        access_token=token.access_token,
+        refresh_token=token.refresh_token,
+        expires_at=now + token.expires_in,
+        display_name=user.display_name,
+        email=user.email,
+        image_url=user.profile_image,
+        created_at=now
     )
+    await session_store.save(session)
+    token_refresh.track(session)
+    
+    # Create response with user data
+    response = RedirectResponse(url="/profile")
     
     response.set_cookie(
-        key="spotify_user", 
-        value=json.dumps(user_data),
+        key=settings.SESSION_COOKIE_NAME,
+        value=sign_session_id(session.session_id),
         httponly=True,
         samesite="lax",
-        max_age=3600,     # 1 hour
+        max_age=SESSION_MAX_AGE,
         path="/"          # Make sure cookie is available for all paths
     )
     
     return response
 
 @router.get("/profile")
-async def profile(request: Request):
+async def profile(current_user: Session = Depends(get_current_user)):
     """Get the user's Spotify profile"""
-    token_data = request.cookies.get("spotify_token")
-    user_data = request.cookies.get("spotify_user")
+    user = SpotifyUser(
+        id=current_user.user_id,
+        display_name=current_user.display_name,
+        email=current_user.email,
+        images=[{"url": current_user.image_url}] if current_user.image_url else []
+    )
     
-    if not token_data or not user_data:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    return {
+        "user": user,
+        "token_expires_in": current_user.expires_in
+    }
+
+@router.get("/check")
+async def check(current_user: Session = Depends(get_current_user)):
+    """Report whether the request carries a valid session
     
-    try:
-        token = SpotifyToken(**json.loads(token_data))
-        user = SpotifyUser(**json.loads(user_data))
-        
-        return {
-            "user": user,
-            "token_expires_in": token.expires_in
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid data: {str(e)}")
+    The session token itself stays in the httponly cookie and is never
+    returned in a body that scripts could read.
+    """
+    return {
+        "authenticated": True,
+        "user_id": current_user.user_id
+    }
 
 @router.get("/logout")
-async def logout():
-    """Log out by clearing cookies"""
+async def logout(request: Request):
+    """Log out by deleting the session and clearing its cookie"""
+    try:
+        current_user = await get_current_user(request)
+        await session_store.delete(current_user.session_id)
+    except HTTPException:
+        pass
+    
     response = RedirectResponse(url="/")
     
     # Clear cookies
-    response.delete_cookie("spotify_token", path="/")
-    response.delete_cookie("spotify_user", path="/")
+    response.delete_cookie(settings.SESSION_COOKIE_NAME, path="/")
     
-    return response 
\ No newline at end of file
+    return response
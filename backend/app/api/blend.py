@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from ..services.spotify import SpotifyService
+from ..services.blend import TrackPool, blend, load_pool, save_pool
+from ..core.auth import get_current_user
+from ..core.session import Session
+
+router = APIRouter(prefix="/blend", tags=["blend"])
+
+async def register_track_pool(access_token: str, user_id: str) -> TrackPool:
+    """Collect the user's candidate tracks with their features and remember the pool"""
+    results = await asyncio.gather(
+        SpotifyService.get_top_tracks(access_token, "short_term", 50),
+        SpotifyService.get_top_tracks(access_token, "medium_term", 50),
+        SpotifyService.get_top_tracks(access_token, "long_term", 50),
+        SpotifyService.get_recently_played(access_token, limit=50)
+    )
+    top_tracks = [track for tracks in results[:3] for track in tracks]
+    recent_tracks = [item["track"] for item in results[3]]
+    
+    track_ids = list(dict.fromkeys(
+        track["id"] for track in top_tracks + recent_tracks if track.get("id")
+    ))
+    features = await SpotifyService.get_audio_features(access_token, track_ids)
+    
+    pool = TrackPool.from_features(track_ids, features)
+    await save_pool(user_id, pool)
+    return pool
+
+@router.post("/pool")
+async def update_pool(
+    current_user: Session = Depends(get_current_user)
+):
+    """Refresh the current user's candidate track pool so partners can blend with it"""
+    pool = await register_track_pool(current_user.access_token, current_user.user_id)
+    return {"user_id": current_user.user_id, "track_count": len(pool)}
+
+@router.post("/{partner_id}")
+async def create_blend(
+    partner_id: str,
+    size: int = 50,
+    name: str = "Sonic Sync Blend",
+    current_user: Session = Depends(get_current_user)
+):
+    """Create a private playlist blending the current user's tracks with a partner's
+    
+    Args:
+        partner_id: Spotify user ID of a partner who has registered a track pool
+        size: Number of tracks in the playlist (max 500)
+        name: Playlist name
+    """
+    if size < 1 or size > 500:
+        raise HTTPException(status_code=400, detail="Invalid size. Must be between 1 and 500")
+    
+    partner_pool = await load_pool(partner_id)
+    if partner_pool is None:
+        raise HTTPException(status_code=404, detail="Partner has no track pool yet")
+    
+    access_token = current_user.access_token
+    user_id = current_user.user_id
+    pool = await register_track_pool(access_token, user_id)
+    tracks = blend(pool, partner_pool, size)
+    if not tracks:
+        raise HTTPException(status_code=422, detail="No tracks with audio features to blend")
+    
+    playlist = await SpotifyService.create_playlist(
+        access_token,
+        user_id,
+        name,
+        description=f"A Sonic Sync blend of {user_id} and {partner_id}"
+    )
+    if "id" not in playlist:
+        raise HTTPException(status_code=502, detail="Failed to create playlist")
+    
+    await SpotifyService.add_tracks_to_playlist(
+        access_token,
+        playlist["id"],
+        [f"spotify:track:{track['id']}" for track in tracks]
+    )
+    
+    return {
+        "playlist_id": playlist["id"],
+        "playlist_url": playlist.get("external_urls", {}).get("spotify"),
+        "tracks": tracks
+    }
@@ -0,0 +1,89 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..core.metrics import metrics
+from ..core.response_cache import response_cache
+from ..services.catalog import track_catalog
+from ..services.feature_cache import feature_cache
+from ..services.feature_provider import dataset_provider
+from ..services.scheduler import upstream
+
+router = APIRouter(tags=["metrics"])
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _cache_metrics():
+    """Hit counters the caches keep themselves, read at scrape time"""
+    features = feature_cache.stats()
+    responses = response_cache.stats()
+    catalog = track_catalog.stats()
+    dataset = dataset_provider()
+    if dataset is not None:
+        stats = dataset.stats()
+        yield (
+            "sonic_sync_feature_dataset_lookups_total",
+            "counter",
+            "Audio-feature lookups against the local dataset by result",
+            [("", {"result": "hit"}, stats["hits"]), ("", {"result": "miss"}, stats["misses"])]
+        )
+        yield (
+            "sonic_sync_feature_dataset_tracks",
+            "gauge",
+            "Tracks in the local audio-feature dataset",
+            [("", {}, stats["size"])]
+        )
+    yield (
+        "sonic_sync_cache_lookups_total",
+        "counter",
+        "Cache lookups by cache and result",
+        [
+            ("", {"cache": "audio_features", "result": "memory_hit"}, features["memory_hits"]),
+            ("", {"cache": "audio_features", "result": "disk_hit"}, features["disk_hits"]),
+            ("", {"cache": "audio_features", "result": "miss"}, features["misses"]),
+            ("", {"cache": "response", "result": "hit"}, responses["hits"]),
+            ("", {"cache": "response", "result": "miss"}, responses["misses"]),
+            ("", {"cache": "track_catalog", "result": "hit"}, catalog["hits"]),
+            ("", {"cache": "track_catalog", "result": "miss"}, catalog["misses"])
+        ]
+    )
+    yield (
+        "sonic_sync_cache_hit_ratio",
+        "gauge",
+        "Fraction of lookups served from cache since process start",
+        [
+            ("", {"cache": "audio_features"}, features["hit_ratio"]),
+            ("", {"cache": "response"}, responses["hit_ratio"]),
+            ("", {"cache": "track_catalog"}, catalog["hit_ratio"])
+        ]
+    )
+    yield (
+        "sonic_sync_cache_entries",
+        "gauge",
+        "Entries held in memory",
+        [
+            ("", {"cache": "audio_features"}, features["memory_size"]),
+            ("", {"cache": "response"}, responses["size"]),
+            ("", {"cache": "spotify_etag"}, len(upstream.etag_cache)),
+            ("", {"cache": "track_catalog"}, catalog["tracks"]),
+            ("", {"cache": "album_catalog"}, catalog["albums"])
+        ]
+    )
+    yield (
+        "sonic_sync_spotify_coalesced_total",
+        "counter",
+        "Spotify GETs answered by joining an identical in-flight call",
+        [("", {}, upstream.coalesced)]
+    )
+    yield (
+        "sonic_sync_spotify_revalidated_total",
+        "counter",
+        "Spotify GETs answered with 304 Not Modified and served from the ETag cache",
+        [("", {}, upstream.revalidated)]
+    )
+
+metrics.add_collector(_cache_metrics)
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Expose request, Spotify and cache metrics for Prometheus to scrape"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
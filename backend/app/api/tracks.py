@@ -1,47 +1,78 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Cookie, Response
-import json
-from typing import List, Dict, Any, Optional
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import List, Any, AsyncIterator, Optional, Tuple
 from ..services.spotify import SpotifyService
-from ..models.spotify import Track, AudioFeatures
+from ..services.mood_clusters import mood_clusters
+from ..services.scheduler import UpstreamError
+from ..services.time_buckets import GRANULARITIES, get_timezone
+from ..services.projection import FULL, parse_fields, project_tracks
+from ..models.records import AudioFeaturesRecord, TrackRecord
 from ..core.auth import get_current_user
+from ..core.config import settings
+from ..core.response_cache import cached_json
+from ..core.session import Session, session_store
+from ..core.streaming import resolve_stream_format, stream_events
 
 router = APIRouter(prefix="/tracks", tags=["tracks"])
 
-async def get_access_token(request: Request) -> str:
-    """Get the access token from cookies"""
-    token_data = request.cookies.get("spotify_token")
-    
-    if not token_data:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
+async def resolve_timezone(tz: Optional[str], session: Session) -> str:
+    """The timezone to analyze in, remembering an explicit `tz` on the session"""
+    if tz is None:
+        return session.timezone or settings.DEFAULT_TIMEZONE
     try:
-        token = json.loads(token_data)
-        return token["access_token"]
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid token data: {str(e)}")
+        get_timezone(tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if tz != session.timezone:
+        session.timezone = tz
+        await session_store.save(session)
+    return tz
+
+def check_fields(fields: Optional[str]) -> None:
+    """Reject a malformed `fields=` projection before doing any work"""
+    if fields is None or fields == FULL:
+        return
+    try:
+        parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/top")
 async def get_top_tracks(
+    request: Request,
     time_range: str = "medium_term",
     limit: int = 50,
-    current_user: Dict = Depends(get_current_user)
+    fields: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
 ):
-    """Get user's top tracks"""
-    try:
-        tracks = SpotifyService.get_top_tracks(
-            current_user["access_token"],
+    """Get user's top tracks
+    
+    Args:
+        fields: Comma-separated dotted paths to return per track (e.g.
+            `id,name,artists.name`), or `full` for every catalog field;
+            defaults to a slim track shape
+    """
+    check_fields(fields)
+    
+    async def build():
+        tracks = await SpotifyService.get_top_tracks(
+            current_user.access_token,
             time_range=time_range,
             limit=limit
         )
-        return {"tracks": tracks}
+        return {"tracks": project_tracks(tracks, fields)}
+    
+    try:
+        return await cached_json(request, current_user.user_id, "top", settings.RESPONSE_CACHE_TTL_TOP, build)
+    except UpstreamError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/audio-features")
 async def get_audio_features(
-    request: Request,
     track_ids: str,
-    access_token: str = Depends(get_access_token)
+    current_user: Session = Depends(get_current_user)
 ):
     """Get audio features for tracks
     
@@ -52,7 +83,7 @@ async def get_audio_features(
         raise HTTPException(status_code=400, detail="No track IDs provided")
     
     track_id_list = track_ids.split(",")
-    audio_features = SpotifyService.get_audio_features(access_token, track_id_list)
+    audio_features = await SpotifyService.get_audio_features(current_user.access_token, track_id_list)
     
     return audio_features
 
@@ -61,90 +92,343 @@ async def get_top_tracks_with_features(
     request: Request,
     time_range: str = "medium_term",
     limit: int = 50,
-    access_token: str = Depends(get_access_token)
+    fields: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
 ):
-    """Get the user's top tracks with audio features"""
+    """Get the user's top tracks with audio features
+    
+    Args:
+        fields: Comma-separated dotted paths to return per track, or `full`;
+            defaults to a slim track shape
+    """
     if time_range not in ["short_term", "medium_term", "long_term"]:
         raise HTTPException(status_code=400, detail="Invalid time_range. Must be one of: short_term, medium_term, long_term")
     
     if limit < 1 or limit > 50:
         raise HTTPException(status_code=400, detail="Invalid limit. Must be between 1 and 50")
     
+    check_fields(fields)
+    
+    async def build():
+        tracks = await _top_tracks_with_features(current_user.access_token, time_range, limit)
+        return project_tracks([track.to_dict() for track in tracks], fields)
+    
+    return await cached_json(
+        request,
+        current_user.user_id,
+        "top-with-features",
+        settings.RESPONSE_CACHE_TTL_TOP,
+        build
+    )
+
+async def _top_tracks_with_features(access_token: str, time_range: str, limit: int) -> List[TrackRecord]:
     # Get top tracks
-    tracks = SpotifyService.get_top_tracks(access_token, time_range, limit)
+    tracks = await SpotifyService.get_top_tracks(access_token, time_range, limit)
     
     if not tracks:
         return []
     
-    # Get audio features for all tracks
+    # Get audio features for all tracks, in track order
     track_ids = [track["id"] for track in tracks]
-    audio_features = SpotifyService.get_audio_features(access_token, track_ids)
-    
-    # Create a mapping of track ID to audio features
-    features_map = {feature["id"]: feature for feature in audio_features if feature}
-    
-    # Combine track data with audio features
-    result = []
-    for track in tracks:
-        track_id = track["id"]
-        if track_id in features_map:
-            track_with_features = Track(
-                **track,
-                audio_features=AudioFeatures(**features_map[track_id])
-            )
-            result.append(track_with_features)
-        else:
-            # Include track even if audio features are not available
-            track_with_features = Track(**track)
-            result.append(track_with_features)
-    
-    return result
+    audio_features = await SpotifyService.get_audio_features(access_token, track_ids)
+    
+    # Upstream data is trusted, so build unvalidated records; tracks
+    # without audio features are still included
+    return [
+        TrackRecord(track, AudioFeaturesRecord(features) if features else None)
+        for track, features in zip(tracks, audio_features)
+    ]
+
+@router.get("/top-with-features/stream")
+async def stream_top_tracks_with_features(
+    request: Request,
+    time_range: str = "medium_term",
+    limit: int = 50,
+    batch_size: int = 10,
+    fields: Optional[str] = None,
+    format: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
+):
+    """Stream the user's top tracks with audio features as NDJSON or SSE
+    
+    Emits `meta` ({total}) once the top tracks arrive, then a `tracks`
+    event ({offset, tracks}) for each batch as soon as its features
+    resolve, in completion order, then `done`.
+    
+    Args:
+        batch_size: Tracks per `tracks` event (1-50)
+        format: ndjson or sse; defaults to sse when the Accept header asks for it
+    """
+    if time_range not in ["short_term", "medium_term", "long_term"]:
+        raise HTTPException(status_code=400, detail="Invalid time_range. Must be one of: short_term, medium_term, long_term")
+    
+    if limit < 1 or limit > 50:
+        raise HTTPException(status_code=400, detail="Invalid limit. Must be between 1 and 50")
+    
+    if batch_size < 1 or batch_size > 50:
+        raise HTTPException(status_code=400, detail="Invalid batch_size. Must be between 1 and 50")
+    
+    check_fields(fields)
+    format = resolve_stream_format(format, request)
+    return stream_events(
+        _top_tracks_with_features_events(current_user.access_token, time_range, limit, batch_size, fields),
+        format
+    )
+
+async def _top_tracks_with_features_events(
+    access_token: str,
+    time_range: str,
+    limit: int,
+    batch_size: int,
+    fields: Optional[str]
+) -> AsyncIterator[Tuple[str, Any]]:
+    tracks = await SpotifyService.get_top_tracks(access_token, time_range, limit)
+    yield "meta", {"total": len(tracks)}
+    
+    async def resolve(offset: int) -> Tuple[int, List[TrackRecord]]:
+        batch = tracks[offset:offset + batch_size]
+        audio_features = await SpotifyService.get_audio_features(access_token, [track["id"] for track in batch])
+        return offset, [
+            TrackRecord(track, AudioFeaturesRecord(features) if features else None)
+            for track, features in zip(batch, audio_features)
+        ]
+    
+    tasks = [asyncio.ensure_future(resolve(offset)) for offset in range(0, len(tracks), batch_size)]
+    try:
+        for next_batch in asyncio.as_completed(tasks):
+            offset, records = await next_batch
+            yield "tracks", {"offset": offset, "tracks": project_tracks([record.to_dict() for record in records], fields)}
+    finally:
+        # The client may disconnect mid-stream
+        for task in tasks:
+            task.cancel()
 
 @router.get("/time-analysis")
 async def get_time_analysis(
+    request: Request,
     days: int = 7,
-    current_user: Dict = Depends(get_current_user)
+    tz: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
 ):
-    """Get time-based analysis of listening habits"""
-    try:
-        # Get tracks organized by time
-        time_tracks = SpotifyService.get_time_based_tracks(
-            current_user["access_token"],
-            days=days
+    """Get time-based analysis of listening habits
+    
+    Args:
+        days: Number of days of history to analyze
+        tz: IANA timezone (e.g. Asia/Tokyo); remembered for later requests
+        fields: Projection for each segment's sample tracks, or `full`;
+            defaults to a slim track shape
+    """
+    check_fields(fields)
+    tz = await resolve_timezone(tz, current_user)
+    
+    async def build():
+        # Read the materialized per-segment statistics for the window
+        analysis = await SpotifyService.analyze_time_window(
+            current_user.access_token,
+            current_user.user_id,
+            days=days,
+            tz=tz
         )
-        
-        # Analyze each time segment
-        analysis = {}
-        for segment, tracks in time_tracks.items():
-            if tracks:
-                features = SpotifyService.analyze_time_segment(
-                    current_user["access_token"],
-                    tracks
-                )
-                analysis[segment] = {
-                    "track_count": len(tracks),
-                    "features": features,
-                    "tracks": tracks[:5]  # Include top 5 tracks for each segment
-                }
+        for segment_analysis in analysis.values():
+            segment_analysis["tracks"] = project_tracks(segment_analysis["tracks"], fields)
         
         return {
             "time_analysis": analysis,
-            "time_segments": SpotifyService.TIME_SEGMENTS
+            "time_segments": SpotifyService.TIME_SEGMENTS,
+            "timezone": tz
         }
+    
+    try:
+        return await cached_json(
+            request,
+            current_user.user_id,
+            "time-analysis",
+            settings.RESPONSE_CACHE_TTL_TIME_ANALYSIS,
+            build,
+            vary=(tz,)
+        )
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/time-analysis/stream")
+async def stream_time_analysis(
+    request: Request,
+    days: int = 7,
+    tz: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
+):
+    """Stream the time-based analysis as NDJSON or SSE
+    
+    Emits `meta` ({time_segments, timezone}) immediately, then a `segment`
+    event ({segment, analysis}) as each segment is aggregated, then `done`.
+    Takes the same parameters as /time-analysis, plus `format` (ndjson or sse).
+    """
+    check_fields(fields)
+    tz = await resolve_timezone(tz, current_user)
+    format = resolve_stream_format(format, request)
+    
+    async def events() -> AsyncIterator[Tuple[str, Any]]:
+        yield "meta", {"time_segments": SpotifyService.TIME_SEGMENTS, "timezone": tz}
+        async for segment, analysis in SpotifyService.iter_time_window(
+            current_user.access_token,
+            current_user.user_id,
+            days=days,
+            tz=tz
+        ):
+            analysis["tracks"] = project_tracks(analysis["tracks"], fields)
+            yield "segment", {"segment": segment, "analysis": analysis}
+    
+    return stream_events(events(), format)
+
+@router.get("/time-buckets")
+async def get_time_buckets(
+    granularity: str = "hour_of_week",
+    days: int = 28,
+    window_days: int = 7,
+    tz: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
+):
+    """Get play counts and mean audio features per local-time bucket
+    
+    Args:
+        granularity: segment, hour (24-hour curve), hour_of_week (168-cell
+            heatmap) or rolling (consecutive windows of `window_days` days)
+        days: Number of days of history to analyze
+        window_days: Rolling window length in days
+        tz: IANA timezone (e.g. Asia/Tokyo); remembered for later requests
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid granularity. Must be one of: {', '.join(GRANULARITIES)}")
+    
+    if days < 1 or window_days < 1:
+        raise HTTPException(status_code=400, detail="Invalid days. Must be at least 1")
+    
+    tz = await resolve_timezone(tz, current_user)
+    try:
+        return await SpotifyService.analyze_time_buckets(
+            current_user.access_token,
+            current_user.user_id,
+            granularity=granularity,
+            days=days,
+            tz=tz,
+            window_days=window_days
+        )
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/mood-clusters")
+async def get_mood_clusters(
+    request: Request,
+    k: Optional[int] = None,
+    tracks_per_cluster: int = 5,
+    fields: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
+):
+    """Get the user's distinct listening modes, found by clustering their history
+    
+    Args:
+        k: Number of clusters (1-12) for this response only; defaults to
+            the user's stored choice, which POST /tracks/mood-clusters sets
+        tracks_per_cluster: Most-played tracks returned per cluster (max 50)
+        fields: Projection for each cluster's tracks, or `full`; defaults to
+            a slim track shape
+    """
+    if k is not None and (k < 1 or k > settings.MOOD_CLUSTERS_MAX_K):
+        raise HTTPException(status_code=400, detail=f"Invalid k. Must be between 1 and {settings.MOOD_CLUSTERS_MAX_K}")
+    
+    if tracks_per_cluster < 0 or tracks_per_cluster > 50:
+        raise HTTPException(status_code=400, detail="Invalid tracks_per_cluster. Must be between 0 and 50")
+    
+    check_fields(fields)
+    
+    # Without an explicit k the response follows the stored choice
+    vary: Tuple[int, ...] = ()
+    if k is None:
+        stored = await asyncio.to_thread(mood_clusters.get, current_user.user_id)
+        vary = (stored.k if stored else settings.MOOD_CLUSTERS_K,)
+    
+    async def build():
+        analysis = await SpotifyService.analyze_mood_clusters(
+            current_user.access_token,
+            current_user.user_id,
+            k=k,
+            tracks_per_cluster=tracks_per_cluster
+        )
+        for cluster in analysis["clusters"]:
+            tracks = project_tracks([item["track"] for item in cluster["tracks"]], fields)
+            cluster["tracks"] = [{**item, "track": track} for item, track in zip(cluster["tracks"], tracks)]
+        return analysis
+    
+    try:
+        return await cached_json(
+            request,
+            current_user.user_id,
+            "mood-clusters",
+            settings.RESPONSE_CACHE_TTL_TIME_ANALYSIS,
+            build,
+            vary=vary
+        )
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/mood-clusters")
+async def update_mood_clusters(
+    k: int,
+    current_user: Session = Depends(get_current_user)
+):
+    """Change the number of clusters the user's listening modes are stored with
+    
+    Args:
+        k: Number of clusters (1-12); the clusters are refit over the
+            user's history and later requests default to it
+    """
+    if k < 1 or k > settings.MOOD_CLUSTERS_MAX_K:
+        raise HTTPException(status_code=400, detail=f"Invalid k. Must be between 1 and {settings.MOOD_CLUSTERS_MAX_K}")
+    
+    try:
+        await SpotifyService.sync_listening_history(current_user.access_token, current_user.user_id)
+        clusters = await SpotifyService.update_mood_clusters(current_user.access_token, current_user.user_id, k)
+        return {"k": clusters.k, "track_count": len(clusters.plays)}
+    except UpstreamError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/recent")
 async def get_recent_tracks(
+    request: Request,
     limit: int = 50,
-    current_user: Dict = Depends(get_current_user)
+    fields: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
 ):
-    """Get user's recently played tracks"""
-    try:
-        tracks = SpotifyService.get_recently_played(
-            current_user["access_token"],
+    """Get user's recently played tracks
+    
+    Args:
+        fields: Projection for each play's track, or `full`; defaults to a
+            slim track shape
+    """
+    check_fields(fields)
+    
+    async def build():
+        items = await SpotifyService.get_recently_played(
+            current_user.access_token,
             limit=limit
         )
-        return {"tracks": tracks}
+        tracks = project_tracks([item["track"] for item in items], fields)
+        return {"tracks": [{**item, "track": track} for item, track in zip(items, tracks)]}
+    
+    try:
+        return await cached_json(request, current_user.user_id, "recent", settings.RESPONSE_CACHE_TTL_RECENT, build)
+    except UpstreamError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -0,0 +1,143 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, Optional
+import numpy as np
+from ..services.spotify import SpotifyService
+from ..services.twins import twins_index, twins_registry, build_mood_vector, METRICS, SEGMENT_KEYS
+from ..services.compatibility import (
+    COMPATIBILITY_METRICS,
+    compatibility_index,
+    compatibility_registry,
+    pack_compatibility_profile
+)
+from ..services.registry import pack_arrays
+from ..services.aggregation import FEATURE_KEYS
+from ..models.spotify import CompatibilityMatch, TwinMatch
+from ..core.auth import get_current_user
+from ..core.session import Session
+
+router = APIRouter(prefix="/twins", tags=["twins"])
+
+async def register_mood_profile(access_token: str, user_id: str, tz: Optional[str] = None) -> np.ndarray:
+    """Compute the user's per-segment mood vector and (re)insert it into every worker's index"""
+    analysis = await SpotifyService.analyze_time_window(access_token, user_id, tz=tz)
+    vector = build_mood_vector({segment: segment_analysis["features"] for segment, segment_analysis in analysis.items()})
+    await twins_registry.publish(user_id, pack_arrays(vector=vector))
+    return vector
+
+async def register_compatibility_profile(
+    access_token: str,
+    user_id: str,
+    tz: Optional[str] = None,
+    vector: Optional[np.ndarray] = None
+) -> None:
+    """Index the user's mood vector, 24-hour mood curve and top tracks and artists for compatibility scoring"""
+    if vector is None:
+        await twins_registry.sync()
+        vector = twins_index.get(user_id)
+        if vector is None:
+            vector = await register_mood_profile(access_token, user_id, tz)
+    curve = await SpotifyService.get_mood_curve(access_token, user_id, tz=tz)
+    tracks = await SpotifyService.get_top_tracks(access_token, "medium_term", 50)
+    await compatibility_registry.publish(user_id, pack_compatibility_profile(
+        vector,
+        curve,
+        [track["id"] for track in tracks],
+        [artist["id"] for track in tracks for artist in track.get("artists", [])]
+    ))
+
+def _profile_dict(vector: np.ndarray) -> Dict[str, Dict[str, float]]:
+    matrix = vector.reshape(len(SEGMENT_KEYS), len(FEATURE_KEYS))
+    return {
+        segment: {key: float(matrix[row, column]) for column, key in enumerate(FEATURE_KEYS)}
+        for row, segment in enumerate(SEGMENT_KEYS)
+    }
+
+@router.post("/profile")
+async def update_profile(
+    current_user: Session = Depends(get_current_user)
+):
+    """Compute the user's mood profile and add it to the Sonic Twins index"""
+    vector = await register_mood_profile(current_user.access_token, current_user.user_id, current_user.timezone)
+    await register_compatibility_profile(
+        current_user.access_token, current_user.user_id, current_user.timezone, vector
+    )
+    return {"user_id": current_user.user_id, "profile": _profile_dict(vector)}
+
+@router.delete("/profile")
+async def delete_profile(current_user: Session = Depends(get_current_user)):
+    """Remove the user from the Sonic Twins and compatibility indexes"""
+    removed = await twins_registry.remove(current_user.user_id)
+    await compatibility_registry.remove(current_user.user_id)
+    return {"removed": removed}
+
+@router.get("")
+async def get_twins(
+    k: int = 10,
+    metric: str = "cosine",
+    current_user: Session = Depends(get_current_user)
+):
+    """Find the users whose listening moods are closest to the current user's
+    
+    Args:
+        k: Number of twins to return (max 100)
+        metric: cosine or euclidean
+    """
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Must be one of: {', '.join(METRICS)}")
+    
+    if k < 1 or k > 100:
+        raise HTTPException(status_code=400, detail="Invalid k. Must be between 1 and 100")
+    
+    await twins_registry.sync()
+    vector = twins_index.get(current_user.user_id)
+    if vector is None:
+        vector = await register_mood_profile(current_user.access_token, current_user.user_id, current_user.timezone)
+    
+    matches = twins_index.search(vector, k=k, metric=metric, exclude=current_user.user_id)
+    return {
+        "metric": metric,
+        "twins": [TwinMatch(user_id=match_id, score=score) for match_id, score in matches]
+    }
+
+@router.get("/compatibility")
+async def get_compatibility(
+    k: int = 20,
+    metrics: Optional[str] = None,
+    candidates: Optional[str] = None,
+    current_user: Session = Depends(get_current_user)
+):
+    """Rank users by how compatible they are with the current user, with a per-metric breakdown
+    
+    Args:
+        k: Number of matches to return (max 100)
+        metrics: Comma-separated subset of profile (per-segment mood
+            cosine), curve (24-hour mood curve, allowing a few hours of
+            shift), tracks and artists (top-list overlap); all by default
+        candidates: Comma-separated user IDs to score; every registered
+            user by default
+    """
+    metric_list = metrics.split(",") if metrics else list(COMPATIBILITY_METRICS)
+    invalid = [metric for metric in metric_list if metric not in COMPATIBILITY_METRICS]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid metric: {invalid[0]}. Must be one of: {', '.join(COMPATIBILITY_METRICS)}"
+        )
+    
+    if k < 1 or k > 100:
+        raise HTTPException(status_code=400, detail="Invalid k. Must be between 1 and 100")
+    
+    await compatibility_registry.sync()
+    if current_user.user_id not in compatibility_index:
+        await register_compatibility_profile(current_user.access_token, current_user.user_id, current_user.timezone)
+    
+    matches = compatibility_index.score(
+        current_user.user_id,
+        k=k,
+        metrics=metric_list,
+        candidates=candidates.split(",") if candidates else None
+    )
+    return {
+        "metrics": metric_list,
+        "matches": [CompatibilityMatch(**match) for match in matches]
+    }
@@ -0,0 +1,28 @@
+from fastapi import HTTPException, Request
+from .config import settings
+from .session import Session, session_store, unsign_session_id
+from ..services.token_refresh import token_refresh
+
+async def get_current_user(request: Request) -> Session:
+    """Resolve the current user's session from the session cookie or a Bearer header
+    
+    The signed session ID is checked and looked up in the session store's
+    hot cache, so no token or profile JSON is parsed per request. Tokens
+    near expiry are refreshed without blocking the request.
+    """
+    value = request.cookies.get(settings.SESSION_COOKIE_NAME)
+    if not value:
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            value = authorization[len("Bearer "):]
+    
+    if not value:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    session_id = unsign_session_id(value)
+    session = await session_store.get(session_id) if session_id else None
+    if session is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    # Hand out a valid token; refreshes near expiry happen in the background
+    return await token_refresh.ensure_fresh(session)
@@ -13,10 +13,106 @@ class Settings(BaseSettings):
     SPOTIFY_CLIENT_ID: str = os.getenv("SPOTIFY_CLIENT_ID", "")
     SPOTIFY_CLIENT_SECRET: str = os.getenv("SPOTIFY_CLIENT_SECRET", "")
     SPOTIFY_REDIRECT_URI: str = os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8000/api/v1/auth/callback")
-    
+
+    # Spotify endpoints (point these at benchmarks/fake_spotify.py for local load tests)
+    SPOTIFY_ACCOUNTS_BASE_URL: str = "https://accounts.spotify.com"
+    SPOTIFY_API_BASE_URL: str = "https://api.spotify.com/v1"
+
+    # Spotify HTTP client settings (shared keep-alive pool per process)
+    SPOTIFY_HTTP_MAX_CONNECTIONS: int = 100
+    SPOTIFY_HTTP_MAX_KEEPALIVE: int = 20
+    SPOTIFY_HTTP_KEEPALIVE_EXPIRY: float = 30.0   # seconds
+    SPOTIFY_HTTP_TIMEOUT: float = 10.0            # seconds
+    SPOTIFY_HTTP_CONNECT_TIMEOUT: float = 5.0     # seconds
+    SPOTIFY_FEATURES_CONCURRENCY: int = 4         # concurrent /audio-features chunks per call
+
+    # Spotify rate limiting and retries
+    SPOTIFY_APP_RATE: float = 10.0                # requests per second for the whole app
+    SPOTIFY_APP_BURST: float = 30.0
+    SPOTIFY_USER_RATE: float = 3.0                # requests per second per access token
+    SPOTIFY_USER_BURST: float = 10.0
+    SPOTIFY_USER_BUCKETS: int = 10000             # per-user buckets kept in memory
+    SPOTIFY_MAX_RETRIES: int = 3
+    SPOTIFY_BACKOFF_BASE: float = 0.5             # seconds
+    SPOTIFY_BACKOFF_MAX: float = 30.0             # seconds
+    SPOTIFY_RETRY_AFTER_MAX: float = 60.0         # give up instead of waiting longer than this
+    SPOTIFY_ETAG_CACHE_SIZE: int = 5000           # per-token ETag entries: /me responses and top-track ID lists
+    SPOTIFY_SHARED_BUDGET: bool = False           # share rate budgets across workers (run.py enables this)
+    SPOTIFY_SHARED_BUDGET_PATH: str = ""          # defaults to DATA_DIR/rate_budget.bin
+    SPOTIFY_SHARED_BUDGET_SLOTS: int = 65536      # per-user buckets in the shared table
+
+    # Local data directory for persistent caches and stores
+    DATA_DIR: str = os.getenv("SONIC_SYNC_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data"))
+
+    # Audio-feature cache (in-memory LRU in front of SQLite)
+    FEATURE_CACHE_SIZE: int = 50000
+    FEATURE_CACHE_PERSIST: bool = True
+    FEATURE_CACHE_PATH: str = ""                  # defaults to DATA_DIR/audio_features.sqlite3
+    FEATURE_CACHE_WARM_SIZE: int = 20000          # entries loaded into memory at worker start-up
+    FEATURE_MISSING_TTL: float = 600.0            # seconds before tracks without features are asked for again
+    FEATURE_DATASET_DIR: str = ""                 # compiled offline feature dataset, consulted before the API
+
+    # Listening history (synced incrementally from /me/player/recently-played)
+    HISTORY_DB_PATH: str = ""                     # defaults to DATA_DIR/history.sqlite3
+    HISTORY_PLAYS_DIR: str = ""                   # columnar play logs, defaults to DATA_DIR/history
+    HISTORY_OPEN_LOGS: int = 128                  # play logs kept memory-mapped (two fds each)
+    HISTORY_SYNC_INTERVAL: float = 60.0           # seconds between upstream syncs per user
+    HISTORY_SYNC_MAX_PAGES: int = 20              # pages of 50 plays fetched per sync
+    MOOD_PROFILE_DIR: str = ""                    # running mood statistics, defaults to DATA_DIR/profiles
+    MOOD_PROFILE_CACHE_SIZE: int = 10000          # users whose statistics are kept in memory
+    DEFAULT_TIMEZONE: str = "UTC"                 # for users who haven't set a timezone
+    MOOD_CLUSTERS_DIR: str = ""                   # per-user mood clusters, defaults to DATA_DIR/clusters
+    MOOD_CLUSTERS_K: int = 4                      # default number of clusters
+    MOOD_CLUSTERS_MAX_K: int = 12
+    MOOD_CLUSTERS_REFIT_GROWTH: float = 0.5       # refit once plays grow by this fraction since the last fit
+
+    # Sonic Twins index (switches from brute force to IVF above the threshold)
+    TWINS_IVF_THRESHOLD: int = 20000
+    TWINS_IVF_NPROBE: int = 8
+    REGISTRY_DB_PATH: str = ""                    # twins, compatibility and blend entries shared by workers, defaults to DATA_DIR/registry.sqlite3
+
+    # Compatibility scoring (one user vs. every registered user)
+    COMPATIBILITY_CURVE_DAYS: int = 28            # history behind each user's 24-hour mood curve
+    COMPATIBILITY_MAX_SHIFT_HOURS: int = 3        # hours curves may slide to line up
+    COMPATIBILITY_WEIGHT_PROFILE: float = 0.4
+    COMPATIBILITY_WEIGHT_CURVE: float = 0.2
+    COMPATIBILITY_WEIGHT_TRACKS: float = 0.2
+    COMPATIBILITY_WEIGHT_ARTISTS: float = 0.2
+
+    # Blend playlists
+    BLEND_POOL_CACHE_SIZE: int = 10000            # users whose track pools are kept in memory
+
+    # Shared track/album catalog (per-user lists hold only IDs)
+    TRACK_CATALOG_SIZE: int = 200000              # tracks (and albums) kept in memory
+    TRACK_CATALOG_TTL: float = 86400.0            # seconds before metadata is refetched
+
+    # Per-user response cache for read endpoints (TTLs in seconds)
+    RESPONSE_CACHE_SIZE: int = 20000
+    RESPONSE_CACHE_TTL_TOP: float = 300.0         # top tracks change at most daily
+    RESPONSE_CACHE_TTL_RECENT: float = 30.0
+    RESPONSE_CACHE_TTL_TIME_ANALYSIS: float = 60.0
+
+    # Production serving (python run.py --workers N)
+    SHUTDOWN_GRACE_PERIOD: float = 30.0           # seconds to let in-flight requests finish on shutdown
+
+    # Metrics (Prometheus text format at /metrics)
+    METRICS_ENABLED: bool = True
+
     # Auth settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "supersecretkey")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+
+    # Session store ("memory" or "sqlite"; use sqlite when running several workers)
+    SESSION_BACKEND: str = "memory"
+    SESSION_CACHE_SIZE: int = 100000              # sessions kept in the hot in-memory cache
+    SESSION_CACHE_TTL: float = 2.0                # seconds before a cached session is rechecked against SQLite
+    SESSION_DB_PATH: str = ""                     # defaults to DATA_DIR/sessions.sqlite3
+    SESSION_COOKIE_NAME: str = "session"
+
+    # Proactive access-token refresh
+    TOKEN_REFRESH_MARGIN: float = 300.0           # refresh this many seconds before expiry
+    TOKEN_REFRESH_INTERVAL: float = 30.0          # background scan interval in seconds
+    TOKEN_REFRESH_IDLE_TIMEOUT: float = 7200.0    # stop refreshing sessions idle this long
     
     # CORS settings
     BACKEND_CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:8000", "http://127.0.0.1:8000"]
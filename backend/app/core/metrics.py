@@ -0,0 +1,202 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Latency buckets in seconds, covering cached hits through slow upstream calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route label for requests that matched no route, so scanners can't grow the label set
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Gauge(Counter):
+    """Value that can go up and down, such as requests in flight"""
+
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) - amount
+
+    def set(self, labels: Labels, value: float) -> None:
+        self.values[labels] = value
+
+class Histogram:
+    """Fixed-bucket histogram keyed by a tuple of label values
+
+    Each series is a flat list of per-bucket counts with the sum and count
+    in its last two slots, so an observation is a bisect and two in-place
+    increments. Buckets are made cumulative only when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            # One slot per bucket plus +Inf, then sum and count
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        bounds = ['le="' + _format_value(bound) + '"' for bound in self.buckets] + ['le="+Inf"']
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, bound)} {cumulative}"
+            suffix = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{suffix} {repr(float(series[-2]))}"
+            yield f"{self.name}_count{suffix} {series[-1]}"
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text format
+
+    Recording happens on the event loop thread only, so updates are plain
+    dict and list operations with no locks. Values that other components
+    already count (cache hits, coalesced calls) are read through collectors
+    at scrape time instead of being counted twice.
+    """
+
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Histogram:
+        metric = Histogram(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]) -> None:
+        """Register a callable yielding (name, type, help, samples) at scrape time
+
+        Each sample is (suffix, labels, value); the suffix is appended to
+        the metric name and is usually empty.
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for suffix, labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(
+                        f"{name}{suffix}{_format_labels(names, tuple(labels.values()))} {_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "sonic_sync_http_requests_total", "HTTP requests handled", ("method", "route", "status")
+)
+http_latency = metrics.histogram(
+    "sonic_sync_http_request_duration_seconds", "Time from request start until the response body is sent", ("method", "route")
+)
+http_in_flight = metrics.gauge("sonic_sync_http_requests_in_flight", "HTTP requests being handled")
+upstream_requests = metrics.counter(
+    "sonic_sync_spotify_requests_total", "Spotify API calls, counting each retry", ("endpoint", "status")
+)
+upstream_latency = metrics.histogram(
+    "sonic_sync_spotify_request_duration_seconds", "Latency of individual Spotify API calls", ("endpoint",)
+)
+upstream_in_flight = metrics.gauge(
+    "sonic_sync_spotify_requests_in_flight", "Spotify API calls awaiting a response", ("endpoint",)
+)
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests per route
+
+    Routes are labelled by their path template (`/blend/{partner_id}`), read
+    from the scope after routing, so path parameters don't add series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.dec()
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", UNMATCHED_ROUTE))
+            http_latency.observe(labels, time.perf_counter() - start)
+            http_requests.inc(labels + (str(status),))
@@ -0,0 +1,91 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from fastapi import Request, Response
+from .config import settings
+from .serialization import dumps
+from ..services.feature_cache import LRUCache
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    expires_at: float                 # epoch seconds
+
+class ResponseCache:
+    """Rendered JSON responses keyed by (user, endpoint, parameters)
+
+    Bodies are stored already serialized with a strong ETag over their
+    bytes, so a hit costs one dict lookup and a matching `If-None-Match`
+    is answered with an empty 304. A rebuilt body that hasn't changed
+    keeps its ETag, so clients keep revalidating successfully across TTLs.
+    """
+
+    def __init__(self, maxsize: int):
+        self._entries = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, content: Any, ttl: float) -> CachedResponse:
+        body = dumps(content)
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        entry = CachedResponse(body, etag, time.time() + ttl)
+        self._entries.put(key, entry)
+        return entry
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "size": len(self._entries)
+        }
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+async def cached_json(
+    request: Request,
+    user_id: str,
+    endpoint: str,
+    ttl: float,
+    build: Callable[[], Awaitable[Any]],
+    vary: Tuple[Hashable, ...] = ()
+) -> Response:
+    """Serve a per-user JSON response from the cache, building it on a miss
+
+    Args:
+        request: The incoming request; its query parameters are part of the key
+        user_id: Owner of the response
+        endpoint: Cache namespace for the route
+        ttl: Seconds the rendered response stays fresh
+        build: Produces the response content on a miss
+        vary: Extra key parts resolved server-side (e.g. the session timezone)
+    """
+    key = (user_id, endpoint, tuple(sorted(request.query_params.multi_items())), vary)
+    entry = response_cache.get(key)
+    if entry is None:
+        entry = response_cache.put(key, await build(), ttl)
+
+    # no-cache: browsers may store the body but must revalidate, which is a 304
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE)
@@ -0,0 +1,24 @@
+from typing import Any
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Serialize response content to JSON bytes with orjson
+
+    Plain dicts, lists and NumPy values are encoded natively; Pydantic
+    models are dumped without re-validation. NaN becomes null.
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+class FastJSONResponse(Response):
+    """JSON response rendered with `dumps` instead of the standard library encoder"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,228 @@
+import asyncio
+from abc import ABC, abstractmethod
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields
+from typing import Optional
+from .config import settings
+
+@dataclass
+class Session:
+    """Server-side session: the user's tokens plus the profile fields we display"""
+    session_id: str
+    user_id: str
+    access_token: str
+    refresh_token: str
+    expires_at: float                 # epoch seconds when the access token expires
+    display_name: Optional[str] = None
+    email: Optional[str] = None
+    image_url: Optional[str] = None
+    created_at: float = 0.0
+    timezone: Optional[str] = None    # IANA zone for time-of-day analytics
+    updated_at: float = 0.0           # set on every save; tells workers their copy is stale
+
+    @property
+    def expires_in(self) -> int:
+        """Seconds until the access token expires"""
+        return max(int(self.expires_at - time.time()), 0)
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(18)
+
+def sign_session_id(session_id: str) -> str:
+    """Append an HMAC so clients can't forge or guess session IDs"""
+    return f"{session_id}.{_signature(session_id)}"
+
+def unsign_session_id(value: str) -> Optional[str]:
+    """Return the session ID if the signature is valid, otherwise None"""
+    session_id, _, signature = value.rpartition(".")
+    if not session_id or not hmac.compare_digest(signature, _signature(session_id)):
+        return None
+    return session_id
+
+def _signature(session_id: str) -> str:
+    digest = hmac.new(settings.SECRET_KEY.encode(), session_id.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).decode().rstrip("=")
+
+class SessionStore(ABC):
+    """Interface for session backends"""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[Session]:
+        ...
+
+    @abstractmethod
+    async def save(self, session: Session) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        ...
+
+    async def reload(self, session_id: str) -> Optional[Session]:
+        """The session as last saved by any worker, bypassing local caches"""
+        return await self.get(session_id)
+
+class MemorySessionStore(SessionStore):
+    """Process-local sessions, evicted least-recently-used beyond `maxsize`"""
+
+    def __init__(self, maxsize: int, max_age: float):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session.created_at + self.max_age < time.time():
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def save(self, session: Session) -> None:
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.maxsize:
+            self._sessions.popitem(last=False)
+
+    async def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+class SQLiteSessionStore(SessionStore):
+    """Persistent sessions shared by every worker, with a hot in-memory cache
+
+    Reads are served from the cache in O(1). A cached session is checked
+    against SQLite's `updated_at` once it is `cache_ttl` seconds old, so a
+    logout, token refresh or timezone change made by another worker shows
+    up here within that time; only a changed session is re-read in full.
+    """
+
+    def __init__(self, path: str, cache: MemorySessionStore, max_age: float, cache_ttl: float):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.cache = cache
+        self.max_age = max_age
+        self.cache_ttl = cache_ttl
+        # When each cached session was last checked against SQLite
+        self._checked: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "updated_at" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+        self._conn.commit()
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        session = await self.cache.get(session_id)
+        if session is None:
+            return await self.reload(session_id)
+        if time.time() - self._checked.get(session_id, 0.0) < self.cache_ttl:
+            return session
+
+        updated_at = await asyncio.to_thread(self._select_updated_at, session_id)
+        if updated_at is None:
+            # Logged out on another worker
+            await self._forget(session_id)
+            return None
+        if updated_at != session.updated_at:
+            return await self.reload(session_id)
+        self._mark_checked(session_id)
+        return session
+
+    async def reload(self, session_id: str) -> Optional[Session]:
+        row = await asyncio.to_thread(self._select, session_id)
+        if row is None:
+            await self._forget(session_id)
+            return None
+        session = Session(**json.loads(row))
+        if session.created_at + self.max_age < time.time():
+            await self.delete(session_id)
+            return None
+
+        # Update the cached object in place so holders of it see the change
+        cached = await self.cache.get(session_id)
+        if cached is not None:
+            for field in fields(Session):
+                setattr(cached, field.name, getattr(session, field.name))
+            session = cached
+        else:
+            await self.cache.save(session)
+        self._mark_checked(session_id)
+        return session
+
+    async def save(self, session: Session) -> None:
+        session.updated_at = time.time()
+        await self.cache.save(session)
+        self._mark_checked(session.session_id)
+        await asyncio.to_thread(self._upsert, session)
+
+    async def delete(self, session_id: str) -> None:
+        await self._forget(session_id)
+        await asyncio.to_thread(self._delete, session_id)
+
+    async def _forget(self, session_id: str) -> None:
+        await self.cache.delete(session_id)
+        self._checked.pop(session_id, None)
+
+    def _mark_checked(self, session_id: str) -> None:
+        self._checked[session_id] = time.time()
+        self._checked.move_to_end(session_id)
+        while len(self._checked) > self.cache.maxsize:
+            self._checked.popitem(last=False)
+
+    def _select(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _select_updated_at(self, session_id: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _upsert(self, session: Session) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (session.session_id, json.dumps(asdict(session)), session.created_at, session.updated_at)
+            )
+            self._conn.commit()
+
+    def _delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+# Sessions outlive the one-hour Spotify token; this is the app login lifetime
+SESSION_MAX_AGE = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+def _create_session_store() -> SessionStore:
+    cache = MemorySessionStore(settings.SESSION_CACHE_SIZE, SESSION_MAX_AGE)
+    if settings.SESSION_BACKEND == "sqlite":
+        path = settings.SESSION_DB_PATH or os.path.join(settings.DATA_DIR, "sessions.sqlite3")
+        return SQLiteSessionStore(path, cache, SESSION_MAX_AGE, settings.SESSION_CACHE_TTL)
+    return cache
+
+session_store = _create_session_store()
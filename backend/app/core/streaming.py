@@ -0,0 +1,48 @@
+import logging
+from typing import Any, AsyncIterator, Optional, Tuple
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMATS = ("ndjson", "sse")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+def resolve_stream_format(format: Optional[str], request: Request) -> str:
+    """The explicit `format`, otherwise SSE when the client accepts it, else NDJSON"""
+    if format is None:
+        return "sse" if "text/event-stream" in request.headers.get("Accept", "") else "ndjson"
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(STREAM_FORMATS)}")
+    return format
+
+def _encode(format: str, event: str, data: Any) -> bytes:
+    if format == "sse":
+        return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+    return dumps({"event": event, "data": data}) + b"\n"
+
+def stream_events(events: AsyncIterator[Tuple[str, Any]], format: str) -> StreamingResponse:
+    """Send (event, data) pairs to the client as they are produced
+
+    Each pair becomes one NDJSON line `{"event": ..., "data": ...}` or one
+    Server-Sent Event. The stream ends with a `done` event, or with an
+    `error` event if producing the rest failed.
+    """
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            async for event, data in events:
+                yield _encode(format, event, data)
+        except Exception as e:
+            logger.exception("Streaming response failed")
+            yield _encode(format, "error", {"detail": str(e)})
+            return
+        yield _encode(format, "done", {})
+
+    # Ask reverse proxies not to buffer, so each event goes out immediately
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[format], headers=headers)
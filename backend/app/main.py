@@ -1,11 +1,47 @@
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from .core.config import settings
-from .api import auth, tracks
+from .core.metrics import MetricsMiddleware
+from .core.serialization import FastJSONResponse
+from .api import auth, tracks, twins, blend, metrics
+from .services.feature_cache import feature_cache
+from .services.http import close_http_client, get_http_client
+from .services.scheduler import UpstreamError
+from .services.token_refresh import token_refresh
 
-app = FastAPI(title=settings.APP_NAME)
+logger = logging.getLogger(__name__)
+
+async def warm_up() -> None:
+    """Prepare a worker before it takes traffic
+
+    Opens the Spotify connection pool and fills the in-memory feature tier
+    from the shared store, so the first requests a new worker serves don't
+    all miss.
+    """
+    get_http_client()
+    loaded = await feature_cache.warm(settings.FEATURE_CACHE_WARM_SIZE)
+    logger.info("Worker %d warmed up with %d cached audio features", os.getpid(), loaded)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up and tear down process-wide resources
+
+    The server stops accepting connections and lets in-flight requests
+    finish (up to SHUTDOWN_GRACE_PERIOD) before the shutdown half runs.
+    """
+    await warm_up()
+    token_refresh.start()
+    yield
+    await token_refresh.stop()
+    # Release the pooled Spotify connections on shutdown
+    await close_http_client()
+
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -14,11 +50,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+if settings.METRICS_ENABLED:
+    # Outermost, so timings include CORS handling and streamed bodies
+    app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    """Pass Spotify failures on as errors, so no layer caches them as results"""
+    if exc.status_code == 401:
+        return FastJSONResponse({"detail": "Spotify rejected the access token"}, status_code=401)
+    if exc.status_code == 429:
+        headers = {"Retry-After": exc.retry_after} if exc.retry_after else None
+        return FastJSONResponse({"detail": "Spotify rate limit reached"}, status_code=503, headers=headers)
+    return FastJSONResponse({"detail": str(exc)}, status_code=502)
+
 # Include routers
 app.include_router(auth.router, prefix=settings.API_V1_STR)
 app.include_router(tracks.router, prefix=settings.API_V1_STR)
+app.include_router(twins.router, prefix=settings.API_V1_STR)
+app.include_router(blend.router, prefix=settings.API_V1_STR)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
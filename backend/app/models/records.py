@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Optional
+
+class AudioFeaturesRecord:
+    """Audio features from Spotify, held without validation
+
+    Upstream payloads are trusted, so building a record is plain attribute
+    assignment.
+    """
+
+    __slots__ = (
+        "id",
+        "danceability",
+        "energy",
+        "key",
+        "loudness",
+        "mode",
+        "speechiness",
+        "acousticness",
+        "instrumentalness",
+        "liveness",
+        "valence",
+        "tempo",
+        "duration_ms",
+        "time_signature"
+    )
+
+    def __init__(self, data: Dict[str, Any]):
+        for field in self.__slots__:
+            setattr(self, field, data.get(field))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+class TrackRecord:
+    """A Spotify track reduced to the fields the API uses, held without validation
+
+    `artists` and `album` keep the upstream dicts as-is rather than being
+    copied or parsed.
+    """
+
+    __slots__ = ("id", "name", "artists", "album", "popularity", "uri", "audio_features")
+
+    def __init__(self, data: Dict[str, Any], audio_features: Optional[AudioFeaturesRecord] = None):
+        self.id: str = data["id"]
+        self.name: str = data.get("name")
+        self.artists: List[Dict[str, Any]] = data.get("artists") or []
+        self.album: Dict[str, Any] = data.get("album") or {}
+        self.popularity: Optional[int] = data.get("popularity")
+        self.uri: Optional[str] = data.get("uri")
+        self.audio_features = audio_features
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "artists": self.artists,
+            "album": self.album,
+            "popularity": self.popularity,
+            "uri": self.uri,
+            "audio_features": self.audio_features.to_dict() if self.audio_features else None
+        }
@@ -86,4 +86,14 @@ class MoodProfile(BaseModel):
                     "tempo": 95.2
                 }
             }
-        } 
\ No newline at end of file
+        }
+
+class TwinMatch(BaseModel):
+    user_id: str
+    score: float
+
+class CompatibilityMatch(BaseModel):
+    user_id: str
+    score: float
+    metrics: Dict[str, float]
+    shift_hours: Optional[int] = None
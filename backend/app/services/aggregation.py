@@ -0,0 +1,161 @@
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Mood-related audio features, in feature-matrix column order
+FEATURE_KEYS = (
+    "valence",
+    "energy",
+    "danceability",
+    "tempo",
+    "instrumentalness",
+    "acousticness",
+    "speechiness",
+    "liveness"
+)
+
+STATISTICS = ("mean", "std", "median", "weighted_mean", "count")
+
+# Recency weights halve every week
+RECENCY_HALF_LIFE_DAYS = 7.0
+
+def build_feature_matrix(
+    features: Sequence[Optional[Dict[str, Any]]],
+    keys: Sequence[str] = FEATURE_KEYS
+) -> np.ndarray:
+    """Pack audio-feature dicts into a contiguous (tracks x features) float32 array
+
+    Missing entries and missing keys become NaN so they are excluded from
+    every statistic instead of being counted as zeros.
+    """
+    matrix = np.full((len(features), len(keys)), np.nan, dtype=np.float32)
+    for row, feature in enumerate(features):
+        if feature:
+            matrix[row] = [feature.get(key, np.nan) for key in keys]
+    return matrix
+
+def grouped_statistics(
+    matrix: np.ndarray,
+    groups: np.ndarray,
+    n_groups: int,
+    weights: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """Compute per-group feature statistics in vectorized passes
+
+    Args:
+        matrix: (rows x features) float32 array, NaN where a value is missing
+        groups: Group index per row, in [0, n_groups)
+        n_groups: Number of groups (e.g. time segments)
+        weights: Optional per-row weights for the weighted mean
+
+    Returns:
+        Arrays of shape (n_groups x features) keyed by statistic name, plus
+        `rows`, the number of rows in each group
+    """
+    n_rows, n_features = matrix.shape
+    groups = np.asarray(groups, dtype=np.intp)
+    if weights is None:
+        weights = np.ones(n_rows, dtype=np.float64)
+
+    valid = ~np.isnan(matrix)
+    filled = np.where(valid, matrix, 0).astype(np.float64)
+
+    # Flattened (group, feature) cell index for every matrix element
+    cells = (groups[:, None] * n_features + np.arange(n_features)).ravel()
+    size = n_groups * n_features
+
+    def cell_sum(values: np.ndarray) -> np.ndarray:
+        return np.bincount(cells, weights=values.ravel(), minlength=size).reshape(n_groups, n_features)
+
+    count = cell_sum(valid.astype(np.float64))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = cell_sum(filled) / count
+
+        # Second pass over deviations keeps the variance numerically stable
+        deviations = np.where(valid, filled - mean[groups], 0)
+        std = np.sqrt(cell_sum(deviations * deviations) / count)
+
+        weighted = valid * weights[:, None]
+        weighted_mean = cell_sum(filled * weighted) / cell_sum(weighted)
+
+    median = _grouped_median(matrix, groups, n_groups, count.astype(np.intp))
+
+    return {
+        "mean": mean,
+        "std": std,
+        "median": median,
+        "weighted_mean": weighted_mean,
+        "count": count.astype(np.intp),
+        "rows": np.bincount(groups, minlength=n_groups)
+    }
+
+def _grouped_median(matrix: np.ndarray, groups: np.ndarray, n_groups: int, count: np.ndarray) -> np.ndarray:
+    """Per-group median of each column, ignoring NaN, from one sort of the whole matrix"""
+    n_rows, n_features = matrix.shape
+    median = np.full((n_groups, n_features), np.nan)
+    if n_rows == 0:
+        return median
+
+    # Map each column into [0, 1) and offset it by its group so a single
+    # column-wise sort orders rows by (group, value); NaNs sort last in a group
+    valid = ~np.isnan(matrix)
+    low = np.min(matrix, axis=0, initial=np.inf, where=valid).astype(np.float64)
+    high = np.max(matrix, axis=0, initial=-np.inf, where=valid).astype(np.float64)
+    low[~np.isfinite(low)] = 0
+    span = np.where(np.isfinite(high), high - low + 1, 1)
+    keys = np.where(valid, (matrix - low) / span, 2.0) + (groups * 4.0)[:, None]
+    values = np.take_along_axis(matrix, np.argsort(keys, axis=0), axis=0)
+
+    # Sorted rows for group g start at starts[g]
+    sizes = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    present = count > 0
+    group_index, column_index = np.nonzero(present)
+    c = count[present]
+    lower = values[starts[group_index] + (c - 1) // 2, column_index]
+    upper = values[starts[group_index] + c // 2, column_index]
+    median[present] = (lower.astype(np.float64) + upper) / 2
+
+    return median
+
+def statistics_by_group(
+    statistics: Dict[str, np.ndarray],
+    group_names: Sequence[str],
+    keys: Sequence[str] = FEATURE_KEYS
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Convert grouped statistic arrays into plain per-group dicts
+
+    Groups without any feature values map to an empty dict. Statistics
+    missing from `statistics` are left out.
+    """
+    present = [statistic for statistic in STATISTICS if statistic in statistics]
+    result = {}
+    for index, name in enumerate(group_names):
+        if not statistics["count"][index].any():
+            result[name] = {}
+            continue
+        result[name] = {
+            statistic: {
+                key: _to_float(statistics[statistic][index, column])
+                for column, key in enumerate(keys)
+            }
+            for statistic in present
+        }
+    return result
+
+def _to_float(value: Any) -> Optional[float]:
+    if isinstance(value, np.integer):
+        return int(value)
+    value = float(value)
+    return None if np.isnan(value) else value
+
+def top_k(ids: Sequence[Any], scores: np.ndarray, k: int) -> List[Tuple[Any, float]]:
+    """Best `k` (id, score) pairs using argpartition instead of a full sort"""
+    if k <= 0 or len(scores) == 0:
+        return []
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(ids[i], float(scores[i])) for i in ordered]
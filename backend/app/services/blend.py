@@ -0,0 +1,87 @@
+import asyncio
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+from ..core.config import settings
+from .aggregation import build_feature_matrix, top_k
+from .feature_cache import LRUCache
+from .registry import pack_arrays, registry, unpack_arrays
+from .twins import FEATURE_SCALE
+
+class TrackPool:
+    """A user's candidate tracks with their scaled feature matrix"""
+
+    def __init__(self, track_ids: Sequence[str], matrix: np.ndarray):
+        self.track_ids = np.asarray(track_ids, dtype=object)
+        self.matrix = matrix
+
+    @classmethod
+    def from_features(cls, track_ids: Sequence[str], features: Sequence[Optional[Dict[str, Any]]]) -> "TrackPool":
+        """Build a pool, dropping tracks without any audio features"""
+        matrix = build_feature_matrix(features) / FEATURE_SCALE
+        keep = ~np.isnan(matrix).all(axis=1)
+        return cls(np.asarray(track_ids, dtype=object)[keep], matrix[keep])
+
+    def __len__(self) -> int:
+        return len(self.track_ids)
+
+    def profile(self) -> np.ndarray:
+        """The pool's mood profile: its NaN-aware mean feature vector"""
+        present = (~np.isnan(self.matrix)).sum(axis=0)
+        return np.nansum(self.matrix, axis=0) / np.maximum(present, 1)
+
+def score_candidates(matrix: np.ndarray, profile_a: np.ndarray, profile_b: np.ndarray) -> np.ndarray:
+    """Score every candidate against both users' profiles in one pass
+
+    Each user's affinity is 1 / (1 + distance to their profile); the blend
+    score is the geometric mean of the two, so a track must suit both users
+    to rank highly. Missing feature values are ignored in the distance.
+    """
+    profiles = np.stack([profile_a, profile_b]).astype(np.float32)
+    differences = matrix[:, None, :] - profiles[None, :, :]
+    distances = np.sqrt(np.nansum(differences * differences, axis=2))
+    affinity = 1.0 / (1.0 + distances)
+    return np.sqrt(affinity[:, 0] * affinity[:, 1])
+
+def blend(pool_a: TrackPool, pool_b: TrackPool, size: int) -> List[Dict[str, Any]]:
+    """Pick the `size` tracks from both pools that best fit both users
+
+    Returns:
+        Ranked tracks as dicts with `id` and `score`
+    """
+    track_ids = np.concatenate([pool_a.track_ids, pool_b.track_ids])
+    matrix = np.concatenate([pool_a.matrix, pool_b.matrix])
+    if len(track_ids) == 0 or size <= 0:
+        return []
+
+    # Tracks both users already share appear once
+    _, first = np.unique(track_ids.astype(str), return_index=True)
+    track_ids = track_ids[first]
+    matrix = matrix[first]
+
+    scores = score_candidates(matrix, pool_a.profile(), pool_b.profile())
+
+    return [{"id": str(track_id), "score": score} for track_id, score in top_k(track_ids, scores, size)]
+
+# Decoded pools as (registry version, pool), so an unchanged pool is only read once per worker
+pool_registry = LRUCache(settings.BLEND_POOL_CACHE_SIZE)
+
+async def save_pool(user_id: str, pool: TrackPool) -> None:
+    """Register the user's pool with every worker, so a partner can blend with it later"""
+    data = pack_arrays(track_ids=np.array(pool.track_ids.tolist(), dtype=str), matrix=pool.matrix)
+    await asyncio.to_thread(registry.put, "blend_pools", user_id, data)
+
+async def load_pool(user_id: str) -> Optional[TrackPool]:
+    """The user's most recently registered pool, from whichever worker registered it"""
+    version = await asyncio.to_thread(registry.version, "blend_pools", user_id)
+    if version is None:
+        return None
+    cached = pool_registry.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    entry = await asyncio.to_thread(registry.get, "blend_pools", user_id)
+    if entry is None or entry[1] is None:
+        return None
+    arrays = unpack_arrays(entry[1])
+    pool = TrackPool(arrays["track_ids"].tolist(), arrays["matrix"])
+    pool_registry.put(user_id, (entry[0], pool))
+    return pool
@@ -0,0 +1,134 @@
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from ..core.config import settings
+from .feature_cache import LRUCache
+
+class CatalogAlbum:
+    """Album metadata shared by every catalog track on the album"""
+
+    __slots__ = ("id", "name", "release_date", "images", "expires_at")
+
+    def __init__(self, data: Dict[str, Any], expires_at: float):
+        self.id: Optional[str] = data.get("id")
+        self.name: Optional[str] = data.get("name")
+        self.release_date: Optional[str] = data.get("release_date")
+        # (url, height, width) per image, largest first as Spotify sends them
+        self.images: Tuple[Tuple[str, Optional[int], Optional[int]], ...] = tuple(
+            (image.get("url"), image.get("height"), image.get("width")) for image in data.get("images") or []
+        )
+        self.expires_at = expires_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "release_date": self.release_date,
+            "images": [{"url": url, "height": height, "width": width} for url, height, width in self.images]
+        }
+
+class CatalogTrack:
+    """The track fields the API serves; markets, external IDs and URLs are dropped"""
+
+    __slots__ = ("id", "name", "uri", "popularity", "duration_ms", "explicit", "artists", "album", "expires_at")
+
+    def __init__(self, data: Dict[str, Any], album: Optional[CatalogAlbum], expires_at: float):
+        self.id: str = data["id"]
+        self.name: Optional[str] = data.get("name")
+        self.uri: Optional[str] = data.get("uri")
+        self.popularity: Optional[int] = data.get("popularity")
+        self.duration_ms: Optional[int] = data.get("duration_ms")
+        self.explicit: Optional[bool] = data.get("explicit")
+        # Artist IDs and names recur across many tracks, so intern them
+        self.artists: Tuple[Tuple[str, str], ...] = tuple(
+            (sys.intern(artist.get("id") or ""), sys.intern(artist.get("name") or ""))
+            for artist in data.get("artists") or []
+        )
+        self.album = album
+        self.expires_at = expires_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        """A Spotify-shaped track dict; optional fields appear only when known"""
+        track = {
+            "id": self.id,
+            "name": self.name,
+            "artists": [{"id": artist_id, "name": name} for artist_id, name in self.artists],
+            "album": self.album.to_dict() if self.album is not None else {}
+        }
+        for key in ("uri", "popularity", "duration_ms", "explicit"):
+            value = getattr(self, key)
+            if value is not None:
+                track[key] = value
+        return track
+
+class TrackCatalog:
+    """Process-wide track and album metadata keyed by Spotify ID
+
+    Every response that carries tracks stores them here once, so a track
+    in thousands of users' top lists and histories is held once and
+    per-user structures keep only IDs. Entries expire after `ttl` seconds
+    (popularity drifts) and are evicted least-recently-used beyond
+    `maxsize`. Lookups may come from worker threads, hence the lock.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.ttl = ttl
+        self.tracks = LRUCache(maxsize)
+        self.albums = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put_many(self, tracks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store upstream (or previously compacted) track dicts
+
+        Returns:
+            The compact dict for each track with an ID, in input order
+        """
+        now = time.time()
+        expires_at = now + self.ttl
+        resolved = []
+        with self._lock:
+            for data in tracks:
+                if not data.get("id"):
+                    continue
+                album_data = data.get("album") or {}
+                album = None
+                if album_data.get("id"):
+                    album = self.albums.get(album_data["id"])
+                    if album is None or album.expires_at <= now:
+                        album = CatalogAlbum(album_data, expires_at)
+                        self.albums.put(album.id, album)
+                track = CatalogTrack(data, album, expires_at)
+                self.tracks.put(track.id, track)
+                resolved.append(track.to_dict())
+        return resolved
+
+    def get_many(self, track_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Compact dicts for the IDs that are cached and unexpired; misses are left out"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for track_id in track_ids:
+                if track_id in found:
+                    continue
+                track = self.tracks.get(track_id)
+                if track is None or track.expires_at <= now:
+                    self.misses += 1
+                    continue
+                found[track_id] = track.to_dict()
+            self.hits += len(found)
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "tracks": len(self.tracks),
+            "albums": len(self.albums)
+        }
+
+track_catalog = TrackCatalog(settings.TRACK_CATALOG_SIZE, settings.TRACK_CATALOG_TTL)
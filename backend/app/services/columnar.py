@@ -0,0 +1,231 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl; single-process only
+    fcntl = None
+
+# Column dtypes: 8-byte timestamps plus a 4-byte track index = 12 bytes per play
+TIMESTAMP_DTYPE = np.dtype("<i8")
+TRACK_INDEX_DTYPE = np.dtype("<i4")
+
+@contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """Advisory lock shared by every worker process on the host
+
+    Exclusive by default; `shared` lets readers hold it together while
+    keeping writers out.
+    """
+    with open(path + ".lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class TrackInterner:
+    """Maps Spotify track IDs to dense integer indexes shared by all users
+
+    The mapping is an append-only file with one ID per line, so the index
+    of a track never changes and other workers pick up new IDs by reading
+    the lines appended since they last looked.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids: List[str] = []
+        self.indexes: Dict[str, int] = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+        open(path, "a").close()
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def intern(self, track_ids: Sequence[str]) -> np.ndarray:
+        """Index for each track ID, assigning new indexes as needed"""
+        with self._lock:
+            if any(track_id not in self.indexes for track_id in track_ids):
+                with file_lock(self.path):
+                    self._refresh()
+                    new_ids = list(dict.fromkeys(
+                        track_id for track_id in track_ids if track_id not in self.indexes
+                    ))
+                    if new_ids:
+                        with open(self.path, "a", encoding="ascii") as f:
+                            f.write("".join(f"{track_id}\n" for track_id in new_ids))
+                        self._refresh()
+            return np.fromiter(
+                (self.indexes[track_id] for track_id in track_ids),
+                dtype=TRACK_INDEX_DTYPE,
+                count=len(track_ids)
+            )
+
+    def lookup(self, indexes: Sequence[int]) -> List[str]:
+        """Track IDs for the given indexes"""
+        with self._lock:
+            if len(indexes) and int(np.max(indexes)) >= len(self.ids):
+                self._refresh()
+            return [self.ids[index] for index in indexes]
+
+    def _refresh(self) -> None:
+        with open(self.path, "r", encoding="ascii") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Ignore a trailing partial line another process is still writing
+        complete = data[:data.rfind("\n") + 1]
+        for track_id in complete.splitlines():
+            self.indexes[track_id] = len(self.ids)
+            self.ids.append(track_id)
+        self._offset += len(complete)
+
+class PlayLog:
+    """One user's plays as two fixed-width columns in memory-mapped files
+
+    Timestamps (epoch ms) are kept sorted, so time-window scans are a
+    binary search plus zero-copy slices of the mapped arrays. Writers hold
+    the log's file lock; readers map the two columns under it in shared
+    mode, so they never pair a rewritten column with a stale one.
+    """
+
+    def __init__(self, path: str):
+        self.timestamps_path = path + ".ts"
+        self.tracks_path = path + ".trk"
+        self._mapped: Tuple[Tuple[int, int], np.ndarray, np.ndarray] = ((-1, -1), None, None)
+
+    def __len__(self) -> int:
+        return len(self.columns()[0])
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Read-only memory-mapped (timestamps, track indexes) columns"""
+        return self._columns(locked=False)
+
+    def _columns(self, locked: bool) -> Tuple[np.ndarray, np.ndarray]:
+        # `locked`: the caller already holds the exclusive file lock
+        key = self._file_key()
+        if key is None:
+            return np.empty(0, TIMESTAMP_DTYPE), np.empty(0, TRACK_INDEX_DTYPE)
+        if self._mapped[0] != key:
+            if locked:
+                self._map()
+            else:
+                with file_lock(self.timestamps_path, shared=True):
+                    self._map()
+        return self._mapped[1], self._mapped[2]
+
+    def _file_key(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.timestamps_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def _map(self) -> None:
+        # Re-stat under the lock: the files may have changed since the check
+        key = self._file_key() or (-1, 0)
+        count = key[1] // TIMESTAMP_DTYPE.itemsize
+        if count == 0:
+            timestamps = np.empty(0, TIMESTAMP_DTYPE)
+            tracks = np.empty(0, TRACK_INDEX_DTYPE)
+        else:
+            timestamps = np.memmap(self.timestamps_path, TIMESTAMP_DTYPE, "r", shape=(count,))
+            tracks = np.memmap(self.tracks_path, TRACK_INDEX_DTYPE, "r", shape=(count,))
+        self._mapped = (key, timestamps, tracks)
+
+    def close(self) -> None:
+        """Drop the mappings; each file is unmapped once no returned view still uses it"""
+        self._mapped = ((-1, -1), None, None)
+
+    def window(self, start_ms: int = 0, end_ms: int = np.iinfo(np.int64).max) -> Tuple[np.ndarray, np.ndarray]:
+        """Plays with start_ms <= timestamp < end_ms, as views into the mapped files"""
+        timestamps, tracks = self.columns()
+        lo, hi = np.searchsorted(timestamps, [start_ms, end_ms])
+        return timestamps[lo:hi], tracks[lo:hi]
+
+    def append(self, timestamps: np.ndarray, tracks: np.ndarray) -> int:
+        """Add plays, ignoring timestamps already stored
+
+        Returns:
+            The number of plays added
+        """
+        timestamps = np.asarray(timestamps, TIMESTAMP_DTYPE)
+        tracks = np.asarray(tracks, TRACK_INDEX_DTYPE)
+        timestamps, first = np.unique(timestamps, return_index=True)
+        tracks = tracks[first]
+
+        with file_lock(self.timestamps_path):
+            stored_timestamps, stored_tracks = self._columns(locked=True)
+            last = stored_timestamps[-1] if len(stored_timestamps) else None
+
+            if last is None or timestamps.size == 0 or timestamps[0] > last:
+                # Common case: every play is newer, so just extend both files.
+                # Readers size both maps from the timestamp file, so it goes last.
+                with open(self.tracks_path, "ab") as f:
+                    f.write(tracks.tobytes())
+                with open(self.timestamps_path, "ab") as f:
+                    f.write(timestamps.tobytes())
+                return len(timestamps)
+
+            # Out-of-order plays: merge, de-duplicate and atomically rewrite
+            new = ~np.isin(timestamps, stored_timestamps)
+            merged_timestamps = np.concatenate([stored_timestamps, timestamps[new]])
+            merged_tracks = np.concatenate([stored_tracks, tracks[new]])
+            order = np.argsort(merged_timestamps, kind="stable")
+            self._rewrite(merged_timestamps[order], merged_tracks[order])
+            return int(new.sum())
+
+    def _rewrite(self, timestamps: np.ndarray, tracks: np.ndarray) -> None:
+        # Called under the exclusive lock: write both columns in full, then
+        # swap them in a fixed order so no reader maps one without the other
+        columns = ((self.tracks_path, tracks), (self.timestamps_path, timestamps))
+        for path, column in columns:
+            with open(path + ".tmp", "wb") as f:
+                f.write(column.tobytes())
+        for path, _ in columns:
+            os.replace(path + ".tmp", path)
+
+class ColumnarPlayStore:
+    """Per-user play logs plus the shared track interner, under one directory
+
+    Every mapped column holds a file descriptor, so only the `max_open`
+    most recently used logs stay mapped; older ones are closed and
+    remapped on their next read.
+    """
+
+    def __init__(self, directory: str, max_open: int = 128):
+        self.directory = directory
+        self.max_open = max_open
+        os.makedirs(os.path.join(directory, "plays"), exist_ok=True)
+        self.interner = TrackInterner(os.path.join(directory, "track_ids.txt"))
+        self._logs: "OrderedDict[str, PlayLog]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def log(self, user_id: str) -> PlayLog:
+        with self._lock:
+            play_log = self._logs.get(user_id)
+            if play_log is None:
+                # Hash user IDs so any ID is a safe file name
+                name = hashlib.blake2b(user_id.encode(), digest_size=16).hexdigest()
+                play_log = PlayLog(os.path.join(self.directory, "plays", name))
+                self._logs[user_id] = play_log
+            self._logs.move_to_end(user_id)
+            while len(self._logs) > self.max_open:
+                self._logs.popitem(last=False)[1].close()
+            return play_log
+
+    def append(self, user_id: str, timestamps: Sequence[int], track_ids: Sequence[str]) -> int:
+        """Intern the track IDs and add the plays to the user's log"""
+        return self.log(user_id).append(np.asarray(timestamps), self.interner.intern(track_ids))
+
+    def window(self, user_id: str, start_ms: int = 0, end_ms: int = np.iinfo(np.int64).max) -> Tuple[np.ndarray, np.ndarray]:
+        """Zero-copy (timestamps, track indexes) for the user's plays in [start_ms, end_ms)"""
+        return self.log(user_id).window(start_ms, end_ms)
@@ -0,0 +1,293 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..core.config import settings
+from .aggregation import FEATURE_KEYS, top_k
+from .registry import RegistryFollower, pack_arrays, registry, unpack_arrays
+from .twins import SEGMENT_KEYS
+
+# Features traced across the day by the 24-hour mood curve
+CURVE_KEYS = ("valence", "energy")
+
+HOURS = 24
+
+# Stored IDs per user; top lists are at most 50 tracks, whose artists can be more
+TRACK_SET_SIZE = 50
+ARTIST_SET_SIZE = 100
+
+COMPATIBILITY_METRICS = ("profile", "curve", "tracks", "artists")
+
+# Relative weight of each metric in the overall score
+METRIC_WEIGHTS = {
+    "profile": settings.COMPATIBILITY_WEIGHT_PROFILE,
+    "curve": settings.COMPATIBILITY_WEIGHT_CURVE,
+    "tracks": settings.COMPATIBILITY_WEIGHT_TRACKS,
+    "artists": settings.COMPATIBILITY_WEIGHT_ARTISTS
+}
+
+def build_mood_curve(hours: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Mean of each CURVE_KEYS feature per local hour of day, as a (features x 24) curve
+
+    Args:
+        hours: Local hour (0-23) of each play
+        matrix: (plays x CURVE_KEYS) feature matrix, NaN where missing
+
+    Hours without plays take the user's overall mean, so they neither
+    attract nor repel candidates.
+    """
+    curve = np.empty((len(CURVE_KEYS), HOURS), dtype=np.float32)
+    hours = np.asarray(hours, dtype=np.intp)
+    for row in range(len(CURVE_KEYS)):
+        values = matrix[:, row]
+        known = ~np.isnan(values)
+        counts = np.bincount(hours[known], minlength=HOURS)
+        sums = np.bincount(hours[known], weights=values[known], minlength=HOURS)
+        overall = values[known].mean() if known.any() else 0.0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            curve[row] = np.where(counts > 0, sums / counts, overall)
+    return curve
+
+def cosine_scores(query: np.ndarray, units: np.ndarray) -> np.ndarray:
+    """Cosine similarity of the query to every unit-normalized row"""
+    norm = np.linalg.norm(query)
+    return units @ (query / norm if norm else query)
+
+def curve_scores(
+    query: np.ndarray,
+    curves: np.ndarray,
+    sq_norms: np.ndarray,
+    max_shift: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Shift-tolerant similarity of a (features x 24) curve to every flattened stored curve
+
+    The squared distance at a circular shift is |q|^2 + |x|^2 - 2 corr(shift).
+    Only the shifts within `max_shift` hours either way are allowed, so
+    their correlations come from one matmul against that many rolled
+    copies of the query; the best one is kept, so a night owl whose day
+    runs a few hours late still matches an early riser.
+
+    Returns:
+        1 - RMS distance at the best shift (curves are on a 0-1 scale), and
+        that shift in hours; positive when the candidate runs later
+    """
+    query = np.asarray(query, dtype=np.float32)
+    shifts = np.arange(-max_shift, max_shift + 1) if max_shift < HOURS // 2 else np.arange(-(HOURS // 2) + 1, HOURS // 2 + 1)
+    # corr(s) = sum_t q[t] x[t + s] = x . roll(q, s)
+    rolled = np.stack([np.roll(query, shift, axis=1).ravel() for shift in shifts], axis=1)
+    correlation = curves @ rolled
+    best = np.argmax(correlation, axis=1)
+    peak = correlation[np.arange(len(best)), best]
+    sq_distance = np.maximum(float((query * query).sum()) + sq_norms - 2 * peak, 0)
+    return 1 - np.sqrt(sq_distance / query.size), shifts[best]
+
+def overlap_scores(query: np.ndarray, sets: np.ndarray, sizes: np.ndarray, vocabulary: int) -> np.ndarray:
+    """Jaccard overlap of an ID set with every padded row of `sets`
+
+    IDs are interned to small integers, so the intersection sizes come
+    from one gather through a membership table of the query's IDs rather
+    than a merge per pair. ID 0 is the padding and never matches.
+    """
+    if len(query) == 0 or len(sets) == 0:
+        return np.zeros(len(sets))
+    member = np.zeros(vocabulary, dtype=bool)
+    member[query] = True
+    member[0] = False
+    intersection = np.count_nonzero(member[sets], axis=1)
+    union = len(query) + sizes - intersection
+    return np.divide(intersection, union, out=np.zeros(len(sets)), where=union > 0)
+
+class CompatibilityIndex:
+    """Per-user compatibility profiles in contiguous arrays, scored one user vs. all
+
+    Each user contributes a mood vector (the Sonic Twins per-segment
+    profile), a 24-hour mood curve, and the sorted interned IDs of their top
+    tracks and artists padded to a fixed width. Scoring a user against
+    every candidate is a handful of array operations, with no per-pair
+    Python work. Removal swaps the last row into the hole.
+    """
+
+    def __init__(self, dim: int = len(SEGMENT_KEYS) * len(FEATURE_KEYS), capacity: int = 64):
+        self.size = 0
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        # Track and artist IDs share one interner; 0 is the padding
+        self.interned: Dict[str, int] = {}
+        self.units = np.zeros((capacity, dim), dtype=np.float32)
+        self.curves = np.zeros((capacity, len(CURVE_KEYS) * HOURS), dtype=np.float32)
+        self.curve_sq_norms = np.zeros(capacity, dtype=np.float32)
+        self.tracks = np.zeros((capacity, TRACK_SET_SIZE), dtype=np.int32)
+        self.track_sizes = np.zeros(capacity, dtype=np.int64)
+        self.artists = np.zeros((capacity, ARTIST_SET_SIZE), dtype=np.int32)
+        self.artist_sizes = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.rows
+
+    def upsert(
+        self,
+        user_id: str,
+        profile: np.ndarray,
+        curve: np.ndarray,
+        track_ids: Sequence[str],
+        artist_ids: Sequence[str]
+    ) -> None:
+        """Insert or replace a user's compatibility profile
+
+        Only the first TRACK_SET_SIZE distinct tracks and ARTIST_SET_SIZE
+        distinct artists are kept.
+        """
+        row = self.rows.get(user_id)
+        if row is None:
+            if self.size == len(self.units):
+                self._grow()
+            row = self.size
+            self.rows[user_id] = row
+            self.ids.append(user_id)
+            self.size += 1
+
+        norm = float(np.linalg.norm(profile))
+        self.units[row] = profile / norm if norm else profile
+        self.curves[row] = np.asarray(curve, dtype=np.float32).ravel()
+        self.curve_sq_norms[row] = float(self.curves[row] @ self.curves[row])
+        for table, sizes, ids in ((self.tracks, self.track_sizes, track_ids), (self.artists, self.artist_sizes, artist_ids)):
+            interned = np.sort(self._intern(ids, table.shape[1]))
+            table[row] = 0
+            table[row, :len(interned)] = interned
+            sizes[row] = len(interned)
+
+    def remove(self, user_id: str) -> bool:
+        """Remove a user; returns False if they were not indexed"""
+        row = self.rows.pop(user_id, None)
+        if row is None:
+            return False
+        last = self.size - 1
+        if row != last:
+            for name in self._arrays():
+                array = getattr(self, name)
+                array[row] = array[last]
+            moved_id = self.ids[last]
+            self.ids[row] = moved_id
+            self.rows[moved_id] = row
+        self.ids.pop()
+        self.size = last
+        return True
+
+    def score(
+        self,
+        user_id: str,
+        k: int = 20,
+        metrics: Sequence[str] = COMPATIBILITY_METRICS,
+        candidates: Optional[Sequence[str]] = None,
+        max_shift: int = settings.COMPATIBILITY_MAX_SHIFT_HOURS
+    ) -> List[Dict[str, Any]]:
+        """Rank candidates by their weighted compatibility with an indexed user
+
+        Args:
+            user_id: Indexed user to score against everyone else
+            k: Number of matches to return
+            metrics: Metrics combined into the overall score
+            candidates: Users to score; every indexed user when omitted.
+                Unindexed IDs are skipped.
+            max_shift: Hours the mood curves may be shifted to line up
+
+        Returns:
+            Best first: user_id, score, and per-metric scores, plus the
+            curve shift in hours when the curve metric is used
+
+        Raises:
+            KeyError: If `user_id` is not indexed
+        """
+        unknown = [metric for metric in metrics if metric not in COMPATIBILITY_METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metric: {unknown[0]}")
+        row = self.rows[user_id]
+
+        # A full scan reads the arrays in place; a candidate list gathers its rows first
+        if candidates is None:
+            selected = np.arange(self.size)
+            rows: Any = slice(0, self.size)
+        else:
+            selected = np.array([self.rows[c] for c in dict.fromkeys(candidates) if c in self.rows], dtype=np.intp)
+            rows = selected
+        if len(selected) == 0 or k <= 0:
+            return []
+
+        breakdown: Dict[str, np.ndarray] = {}
+        shifts = None
+        if "profile" in metrics:
+            breakdown["profile"] = cosine_scores(self.units[row], self.units[rows])
+        if "curve" in metrics:
+            query = self.curves[row].reshape(len(CURVE_KEYS), HOURS)
+            breakdown["curve"], shifts = curve_scores(query, self.curves[rows], self.curve_sq_norms[rows], max_shift)
+        vocabulary = len(self.interned) + 1
+        if "tracks" in metrics:
+            query = self.tracks[row, :self.track_sizes[row]]
+            breakdown["tracks"] = overlap_scores(query, self.tracks[rows], self.track_sizes[rows], vocabulary)
+        if "artists" in metrics:
+            query = self.artists[row, :self.artist_sizes[row]]
+            breakdown["artists"] = overlap_scores(query, self.artists[rows], self.artist_sizes[rows], vocabulary)
+
+        total_weight = sum(METRIC_WEIGHTS[metric] for metric in breakdown) or 1.0
+        combined = sum(METRIC_WEIGHTS[metric] * scores for metric, scores in breakdown.items()) / total_weight
+        # The user never matches themselves
+        combined = np.where(selected == row, -np.inf, combined)
+
+        matches = []
+        for position, score in top_k(range(len(selected)), combined, k):
+            if selected[position] == row:
+                continue
+            match = {
+                "user_id": self.ids[selected[position]],
+                "score": score,
+                "metrics": {metric: float(scores[position]) for metric, scores in breakdown.items()}
+            }
+            if shifts is not None:
+                match["shift_hours"] = int(shifts[position])
+            matches.append(match)
+        return matches
+
+    def _intern(self, ids: Sequence[str], size: int) -> np.ndarray:
+        unique = list(dict.fromkeys(item_id for item_id in ids if item_id))[:size]
+        interned = self.interned
+        return np.array([interned.setdefault(item_id, len(interned) + 1) for item_id in unique], dtype=np.int32)
+
+    @staticmethod
+    def _arrays() -> Tuple[str, ...]:
+        return ("units", "curves", "curve_sq_norms", "tracks", "track_sizes", "artists", "artist_sizes")
+
+    def _grow(self) -> None:
+        capacity = len(self.units) * 2
+        for name in self._arrays():
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+compatibility_index = CompatibilityIndex()
+
+def pack_compatibility_profile(
+    profile: np.ndarray,
+    curve: np.ndarray,
+    track_ids: Sequence[str],
+    artist_ids: Sequence[str]
+) -> bytes:
+    return pack_arrays(
+        profile=np.asarray(profile, dtype=np.float32),
+        curve=np.asarray(curve, dtype=np.float32),
+        track_ids=np.array(list(track_ids), dtype=str),
+        artist_ids=np.array(list(artist_ids), dtype=str)
+    )
+
+def _apply_compatibility_entry(user_id: str, data: Optional[bytes]) -> None:
+    if data is None:
+        compatibility_index.remove(user_id)
+        return
+    arrays = unpack_arrays(data)
+    compatibility_index.upsert(
+        user_id, arrays["profile"], arrays["curve"], arrays["track_ids"].tolist(), arrays["artist_ids"].tolist()
+    )
+
+# Every worker's compatibility_index follows the same registered users
+compatibility_registry = RegistryFollower(registry, "compatibility", _apply_compatibility_entry)
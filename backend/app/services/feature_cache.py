@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+from ..core.config import settings
+
+class LRUCache:
+    """Bounded in-process mapping that evicts the least recently used key"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SQLiteFeatureStore:
+    """Persistent audio-feature store shared by every worker on the host"""
+
+    # Stay well below SQLite's bound-parameter limit
+    BATCH_SIZE = 500
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS audio_features (track_id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Load the stored features for the given track IDs"""
+        found = {}
+        with self._lock:
+            for i in range(0, len(track_ids), self.BATCH_SIZE):
+                batch = track_ids[i:i + self.BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT track_id, data FROM audio_features WHERE track_id IN ({placeholders})",
+                    batch
+                )
+                for track_id, data in rows:
+                    found[track_id] = json.loads(data)
+        return found
+
+    def recent(self, limit: int) -> Dict[str, Dict[str, Any]]:
+        """Load the most recently stored features (replaced rows get a new rowid)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT track_id, data FROM audio_features ORDER BY rowid DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return {track_id: json.loads(data) for track_id, data in reversed(rows)}
+
+    def put_many(self, features: Dict[str, Dict[str, Any]]) -> None:
+        """Store features keyed by track ID, replacing existing rows"""
+        rows = [(track_id, json.dumps(feature)) for track_id, feature in features.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO audio_features (track_id, data) VALUES (?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class FeatureCache:
+    """Two-tier audio-feature cache: in-memory LRU in front of SQLite
+
+    Audio features for a track never change, so entries never expire.
+    """
+
+    def __init__(self, maxsize: int, store: Optional[SQLiteFeatureStore] = None):
+        self.memory = LRUCache(maxsize)
+        self.store = store
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def get_many(self, track_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Resolve as many track IDs as possible without touching the network
+
+        Args:
+            track_ids: Unique Spotify track IDs
+
+        Returns:
+            Mapping of track ID to features for every cached ID
+        """
+        found = {}
+        pending = []
+        for track_id in track_ids:
+            feature = self.memory.get(track_id)
+            if feature is not None:
+                found[track_id] = feature
+            else:
+                pending.append(track_id)
+        self.memory_hits += len(found)
+
+        if pending and self.store is not None:
+            stored = await asyncio.to_thread(self.store.get_many, pending)
+            for track_id, feature in stored.items():
+                self.memory.put(track_id, feature)
+            found.update(stored)
+            self.disk_hits += len(stored)
+            self.misses += len(pending) - len(stored)
+        else:
+            self.misses += len(pending)
+
+        return found
+
+    async def put_many(self, features: Dict[str, Dict[str, Any]]) -> None:
+        """Add freshly fetched features to both tiers"""
+        if not features:
+            return
+        for track_id, feature in features.items():
+            self.memory.put(track_id, feature)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.put_many, features)
+
+    async def warm(self, limit: int) -> int:
+        """Fill the memory tier from the store so a fresh worker starts with hits
+
+        Returns:
+            Number of entries loaded
+        """
+        if self.store is None or limit <= 0:
+            return 0
+        features = await asyncio.to_thread(self.store.recent, min(limit, self.memory.maxsize))
+        for track_id, feature in features.items():
+            self.memory.put(track_id, feature)
+        return len(features)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters since process start"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_size": len(self.memory)
+        }
+
+def _create_feature_cache() -> FeatureCache:
+    store = None
+    if settings.FEATURE_CACHE_PERSIST:
+        path = settings.FEATURE_CACHE_PATH or os.path.join(settings.DATA_DIR, "audio_features.sqlite3")
+        store = SQLiteFeatureStore(path)
+    return FeatureCache(settings.FEATURE_CACHE_SIZE, store)
+
+feature_cache = _create_feature_cache()
@@ -0,0 +1,156 @@
+"""Compiled, memory-mapped audio-feature dataset
+
+Compile a CSV export (one row per track, with an `id` or `track_id` column
+and Spotify's audio-feature columns) from the backend directory:
+
+    python -m app.services.feature_dataset tracks.csv data/feature_dataset
+
+and point FEATURE_DATASET_DIR at the output directory.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import shutil
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# Stored columns, in the order of the float32 feature block
+DATASET_COLUMNS = (
+    "danceability",
+    "energy",
+    "key",
+    "loudness",
+    "mode",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "valence",
+    "tempo",
+    "duration_ms",
+    "time_signature"
+)
+
+# Columns Spotify reports as integers; restored as ints on lookup
+INTEGER_COLUMNS = frozenset(("key", "mode", "duration_ms", "time_signature"))
+
+ID_COLUMNS = ("id", "track_id")
+
+FORMAT_VERSION = 1
+
+class FeatureDataset:
+    """Read-only audio features for a fixed set of tracks
+
+    The directory holds `ids.npy` (sorted fixed-width track IDs),
+    `features.npy` (a float32 tracks x columns block, NaN where a value is
+    unknown) and `meta.json`. Both arrays are memory-mapped, so opening is
+    instant, pages are shared by every worker, and a batch lookup is one
+    vectorised binary search.
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported feature dataset version: {meta.get('version')}")
+        self.columns: Tuple[str, ...] = tuple(meta["columns"])
+        self.ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode="r")
+        self.features = np.load(os.path.join(directory, "features.npy"), mmap_mode="r")
+        self._integer = [column in INTEGER_COLUMNS for column in self.columns]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, track_ids: List[str]) -> np.ndarray:
+        """Row for each track ID, or -1 where the dataset doesn't have it"""
+        if not track_ids or not len(self.ids):
+            return np.full(len(track_ids), -1, dtype=np.int64)
+        width = self.ids.dtype.itemsize
+        # IDs longer than the stored width would be truncated into false matches
+        queries = np.array([track_id.encode("ascii", "replace") for track_id in track_ids], dtype=self.ids.dtype)
+        fits = np.fromiter((len(track_id) <= width for track_id in track_ids), dtype=bool, count=len(track_ids))
+        rows = np.minimum(np.searchsorted(self.ids, queries), len(self.ids) - 1)
+        return np.where(fits & (self.ids[rows] == queries), rows, -1)
+
+    def get_many(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Features for every track ID the dataset has, shaped like Spotify's objects"""
+        rows = self.positions(track_ids)
+        hits = np.flatnonzero(rows >= 0)
+        block = self.features[rows[hits]].tolist()
+        found = {}
+        for hit, values in zip(hits.tolist(), block):
+            track_id = track_ids[hit]
+            feature: Dict[str, Any] = {"id": track_id}
+            for column, integer, value in zip(self.columns, self._integer, values):
+                if math.isnan(value):
+                    feature[column] = None
+                else:
+                    feature[column] = int(value) if integer else value
+            found[track_id] = feature
+        return found
+
+def _parse(value: Optional[str]) -> float:
+    try:
+        return float(value) if value not in (None, "") else math.nan
+    except ValueError:
+        return math.nan
+
+def _read_csv(path: str) -> Iterable[Tuple[str, List[float]]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        id_column = next((column for column in ID_COLUMNS if column in (reader.fieldnames or [])), None)
+        if id_column is None:
+            raise ValueError(f"{path} has none of the ID columns: {', '.join(ID_COLUMNS)}")
+        for row in reader:
+            track_id = (row.get(id_column) or "").strip()
+            if track_id:
+                yield track_id, [_parse(row.get(column)) for column in DATASET_COLUMNS]
+
+def compile_dataset(csv_path: str, directory: str) -> int:
+    """Compile a CSV of track features into a FeatureDataset directory
+
+    Later rows win when a track appears twice. The output is written next
+    to `directory` and swapped in with a rename, so running workers never
+    see a half-written dataset.
+
+    Returns:
+        Number of tracks written
+    """
+    rows: Dict[str, List[float]] = {}
+    for track_id, values in _read_csv(csv_path):
+        rows[track_id] = values
+
+    track_ids = sorted(rows)
+    width = max((len(track_id) for track_id in track_ids), default=1)
+    ids = np.array([track_id.encode("ascii", "replace") for track_id in track_ids], dtype=f"S{width}")
+    features = np.array([rows[track_id] for track_id in track_ids], dtype=np.float32).reshape(-1, len(DATASET_COLUMNS))
+
+    staging = directory.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    np.save(os.path.join(staging, "ids.npy"), ids)
+    np.save(os.path.join(staging, "features.npy"), features)
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump({"version": FORMAT_VERSION, "columns": list(DATASET_COLUMNS), "tracks": len(track_ids)}, f)
+
+    # Rename the old copy aside first; workers that have it mapped keep reading it
+    previous = directory.rstrip(os.sep) + ".old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, previous)
+    os.rename(staging, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+    return len(track_ids)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile a track-feature CSV into a memory-mapped dataset")
+    parser.add_argument("csv_path")
+    parser.add_argument("directory")
+    args = parser.parse_args()
+    count = compile_dataset(args.csv_path, args.directory)
+    print(f"Wrote {count} tracks to {args.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+import httpx
+from ..core.config import settings
+from .feature_cache import FeatureCache, LRUCache, feature_cache
+from .feature_dataset import FeatureDataset
+from .scheduler import UpstreamError, check_response, upstream
+
+logger = logging.getLogger(__name__)
+
+class FeatureProvider(ABC):
+    """Interface for audio-feature sources"""
+
+    @abstractmethod
+    async def get_many(self, access_token: str, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Features for as many of the given unique track IDs as this source can resolve"""
+
+class DatasetFeatureProvider(FeatureProvider):
+    """Features from a compiled local dataset; no network, microseconds per batch"""
+
+    def __init__(self, dataset: FeatureDataset):
+        self.dataset = dataset
+        self.hits = 0
+        self.misses = 0
+
+    async def get_many(self, access_token: str, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        found = self.dataset.get_many(track_ids)
+        self.hits += len(found)
+        self.misses += len(track_ids) - len(found)
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "size": len(self.dataset)
+        }
+
+class SpotifyFeatureProvider(FeatureProvider):
+    """Features from the cache tiers, fetching misses from /audio-features
+
+    Tracks Spotify has no features for, and chunks whose request failed,
+    are remembered for `missing_ttl` seconds and left unresolved rather
+    than asked for again on every call. A failed chunk never fails the
+    caller; its tracks are simply returned without features.
+    """
+
+    # Spotify API allows up to 100 IDs per request
+    CHUNK_SIZE = 100
+
+    def __init__(
+        self,
+        cache: FeatureCache,
+        concurrency: int = settings.SPOTIFY_FEATURES_CONCURRENCY,
+        missing_ttl: float = settings.FEATURE_MISSING_TTL
+    ):
+        self.cache = cache
+        self.concurrency = concurrency
+        self.missing_ttl = missing_ttl
+        # Track ID -> monotonic time until which it is not fetched again
+        self.missing = LRUCache(cache.memory.maxsize)
+
+    async def get_many(self, access_token: str, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        # Features never change, so only cache misses go to Spotify
+        features_map = await self.cache.get_many(track_ids)
+        now = time.monotonic()
+        missing_ids = [
+            track_id for track_id in track_ids
+            if track_id not in features_map and (self.missing.get(track_id) or 0) <= now
+        ]
+        chunks = [missing_ids[i:i + self.CHUNK_SIZE] for i in range(0, len(missing_ids), self.CHUNK_SIZE)]
+
+        # Send the chunks concurrently, bounded by the configured limit
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_chunk(chunk: List[str]) -> List[Optional[Dict[str, Any]]]:
+            async with semaphore:
+                try:
+                    return await self._fetch_chunk(access_token, chunk)
+                except (UpstreamError, httpx.TransportError) as e:
+                    logger.warning("Audio features unavailable for %d tracks: %s", len(chunk), e)
+                    return []
+
+        results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+
+        fetched = {}
+        for chunk_features in results:
+            for feature in chunk_features:
+                if feature:
+                    fetched[feature["id"]] = feature
+
+        retry_at = time.monotonic() + self.missing_ttl
+        for track_id in missing_ids:
+            if track_id not in fetched:
+                self.missing.put(track_id, retry_at)
+
+        await self.cache.put_many(fetched)
+        features_map.update(fetched)
+        return features_map
+
+    @staticmethod
+    async def _fetch_chunk(access_token: str, track_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Fetch audio features for at most 100 tracks in one request
+
+        Not revalidated upstream: the features themselves are cached per
+        track, so a per-token copy of the response body would only duplicate them.
+        """
+        response = await upstream.request(
+            "GET",
+            f"{settings.SPOTIFY_API_BASE_URL}/audio-features",
+            access_token=access_token,
+            params={"ids": ",".join(track_ids)},
+            endpoint="audio_features"
+        )
+
+        return check_response(response, "audio_features").json().get("audio_features") or []
+
+class ChainedFeatureProvider(FeatureProvider):
+    """Asks each provider in turn for the tracks the earlier ones couldn't resolve"""
+
+    def __init__(self, providers: Sequence[FeatureProvider]):
+        self.providers = list(providers)
+
+    async def get_many(self, access_token: str, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        pending = track_ids
+        for provider in self.providers:
+            if not pending:
+                break
+            found.update(await provider.get_many(access_token, pending))
+            pending = [track_id for track_id in pending if track_id not in found]
+        return found
+
+def _create_feature_provider() -> FeatureProvider:
+    api = SpotifyFeatureProvider(feature_cache)
+    directory = settings.FEATURE_DATASET_DIR
+    if not directory:
+        return api
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        logger.warning("No compiled feature dataset in %s; using the Spotify API only", directory)
+        return api
+    return ChainedFeatureProvider([DatasetFeatureProvider(FeatureDataset(directory)), api])
+
+feature_provider = _create_feature_provider()
+
+def dataset_provider() -> Optional[DatasetFeatureProvider]:
+    """The local dataset provider, if one is configured"""
+    if isinstance(feature_provider, ChainedFeatureProvider):
+        return next(
+            (provider for provider in feature_provider.providers if isinstance(provider, DatasetFeatureProvider)),
+            None
+        )
+    return None
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..core.config import settings
+from .catalog import track_catalog
+from .columnar import ColumnarPlayStore
+
+def played_at_to_ms(played_at: str) -> int:
+    """Convert a Spotify `played_at` timestamp to epoch milliseconds"""
+    return int(datetime.fromisoformat(played_at.replace("Z", "+00:00")).timestamp() * 1000)
+
+def ms_to_played_at(played_at_ms: int) -> str:
+    """Format epoch milliseconds the way Spotify formats `played_at`"""
+    played_at = datetime.fromtimestamp(played_at_ms / 1000, tz=timezone.utc)
+    return played_at.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+class ListeningHistoryStore:
+    """Per-user play history
+
+    Plays live in columnar memory-mapped logs (timestamp + interned track
+    index, 12 bytes per play) de-duplicated by `played_at`, so re-ingesting
+    an overlapping page is a no-op. Track metadata and sync cursors live in
+    SQLite, stored once per track rather than per play.
+    """
+
+    def __init__(self, path: str, plays: ColumnarPlayStore):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.plays = plays
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                track_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                user_id TEXT PRIMARY KEY,
+                cursor INTEGER NOT NULL,
+                synced_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+        # Per-user sync in flight, so concurrent views share one delta request
+        self.inflight: Dict[str, "asyncio.Task[int]"] = {}
+
+    def get_sync_state(self, user_id: str) -> Optional[Dict[str, float]]:
+        """The newest stored `played_at` (ms) and when the user was last synced"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cursor, synced_at FROM sync_state WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return {"cursor": row[0], "synced_at": row[1]} if row else None
+
+    def add_plays(self, user_id: str, items: List[Dict[str, Any]]) -> int:
+        """Store recently-played items and advance the user's cursor
+
+        Items' tracks are expected in the catalog's compact shape (as
+        `SpotifyService.get_recently_played` returns them).
+        
+        Returns:
+            The number of plays that were not already stored
+        """
+        timestamps = []
+        track_ids = []
+        tracks = {}
+        for item in items:
+            track = item.get("track") or {}
+            if not track.get("id"):
+                continue
+            timestamps.append(played_at_to_ms(item["played_at"]))
+            track_ids.append(track["id"])
+            tracks[track["id"]] = json.dumps(track)
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tracks (track_id, data) VALUES (?, ?)",
+                tracks.items()
+            )
+            added = self.plays.append(user_id, timestamps, track_ids)
+            cursor = max(timestamps, default=0)
+            self._conn.execute(
+                """INSERT INTO sync_state (user_id, cursor, synced_at) VALUES (?, ?, ?)
+                   ON CONFLICT(user_id) DO UPDATE SET
+                       cursor = MAX(cursor, excluded.cursor),
+                       synced_at = excluded.synced_at""",
+                (user_id, cursor, time.time())
+            )
+            self._conn.commit()
+        return added
+
+    def get_window(self, user_id: str, since_ms: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Zero-copy (timestamps, track indexes) columns for plays at or after `since_ms`
+
+        Timestamps are ascending; resolve indexes with `track_ids`.
+        """
+        return self.plays.window(user_id, since_ms)
+
+    def track_ids(self, indexes: Sequence[int]) -> List[str]:
+        """Spotify track IDs for interned track indexes"""
+        return self.plays.interner.lookup(indexes)
+
+    def get_tracks(self, track_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Track metadata keyed by track ID, from the shared catalog or else SQLite"""
+        found = track_catalog.get_many(track_ids)
+        missing = [track_id for track_id in dict.fromkeys(track_ids) if track_id not in found]
+        stored = []
+        with self._lock:
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT data FROM tracks WHERE track_id IN ({placeholders})",
+                    batch
+                )
+                stored.extend(json.loads(data) for (data,) in rows)
+        found.update((track["id"], track) for track in track_catalog.put_many(stored))
+        return found
+
+def _create_history_store() -> ListeningHistoryStore:
+    path = settings.HISTORY_DB_PATH or os.path.join(settings.DATA_DIR, "history.sqlite3")
+    plays_dir = settings.HISTORY_PLAYS_DIR or os.path.join(settings.DATA_DIR, "history")
+    return ListeningHistoryStore(path, ColumnarPlayStore(plays_dir, settings.HISTORY_OPEN_LOGS))
+
+listening_history = _create_history_store()
@@ -0,0 +1,33 @@
+import httpx
+from typing import Optional
+from ..core.config import settings
+
+# One keep-alive connection pool per process, shared by every request
+_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared async HTTP client, creating it on first use"""
+    global _client
+
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.SPOTIFY_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SPOTIFY_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.SPOTIFY_HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                settings.SPOTIFY_HTTP_TIMEOUT,
+                connect=settings.SPOTIFY_HTTP_CONNECT_TIMEOUT
+            )
+        )
+
+    return _client
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client and release its pooled connections"""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,267 @@
+import hashlib
+import os
+import threading
+from typing import Optional, Tuple
+import numpy as np
+from ..core.config import settings
+from .aggregation import FEATURE_KEYS
+from .columnar import file_lock
+from .feature_cache import LRUCache
+
+# Features are clustered on a common 0-1 scale; tempo is the only one in other units
+FEATURE_SCALE = np.array([250.0 if key == "tempo" else 1.0 for key in FEATURE_KEYS], dtype=np.float32)
+
+# Points sampled per mini-batch step while fitting
+BATCH_SIZE = 256
+
+def nearest(points: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Index of and squared distance to each point's closest centroid"""
+    distances = (
+        np.einsum("ij,ij->i", points, points)[:, None]
+        - 2 * points @ centroids.T
+        + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+    )
+    labels = np.argmin(distances, axis=1)
+    return labels, np.maximum(distances[np.arange(len(points)), labels], 0)
+
+def kmeans_plus_plus(points: np.ndarray, weights: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """Seed k centroids, each drawn with probability proportional to weight x squared distance"""
+    centroids = np.empty((k, points.shape[1]), dtype=np.float32)
+    centroids[0] = points[rng.choice(len(points), p=weights / weights.sum())]
+    closest = np.full(len(points), np.inf)
+    for i in range(1, k):
+        closest = np.minimum(closest, ((points - centroids[i - 1]) ** 2).sum(axis=1))
+        mass = weights * closest
+        total = mass.sum()
+        # Fewer distinct points than k: repeat one rather than divide by zero
+        centroids[i] = points[rng.choice(len(points), p=mass / total)] if total > 0 else centroids[i - 1]
+    return centroids
+
+def minibatch_step(
+    centroids: np.ndarray,
+    counts: np.ndarray,
+    points: np.ndarray,
+    labels: np.ndarray,
+    weights: Optional[np.ndarray] = None
+) -> None:
+    """Move each centroid toward its batch points with a per-centroid 1/count rate
+
+    The batched form of Sculley's mini-batch k-means update: a centroid
+    that has absorbed `count` points moves by the batch's weighted offset
+    divided by its new count, so it stays the running mean of its members.
+    """
+    k = len(centroids)
+    if weights is None:
+        weights = np.ones(len(points), dtype=np.float64)
+    batch_counts = np.bincount(labels, weights=weights, minlength=k)
+    sums = np.stack(
+        [np.bincount(labels, weights=weights * points[:, column], minlength=k) for column in range(points.shape[1])],
+        axis=1
+    )
+    touched = batch_counts > 0
+    counts[touched] += batch_counts[touched]
+    centroids[touched] += (
+        (sums[touched] - batch_counts[touched, None] * centroids[touched]) / counts[touched, None]
+    ).astype(np.float32)
+
+class MoodClusters:
+    """A user's K listening modes, found by mini-batch k-means over their tracks
+
+    The model keeps the user's distinct tracks (interned index, scaled
+    features, play count) so membership can be read without refetching
+    features. Each new play moves its nearest centroid as a running mean;
+    once the history has grown by MOOD_CLUSTERS_REFIT_GROWTH since the last
+    fit, the clusters are refit from scratch to follow shifting tastes.
+    """
+
+    def __init__(self, k: int, n_features: int = len(FEATURE_KEYS)):
+        self.k = k
+        self.cursor = -1                  # newest ingested play timestamp (ms)
+        self.track_indexes = np.empty(0, dtype=np.int64)          # sorted
+        self.features = np.empty((0, n_features), dtype=np.float32)
+        self.plays = np.empty(0, dtype=np.int64)
+        self.centroids = np.empty((0, n_features), dtype=np.float32)
+        self.counts = np.empty(0, dtype=np.float64)
+        self.fitted_plays = 0
+
+    def ingest(self, timestamps: np.ndarray, track_indexes: np.ndarray, matrix: np.ndarray) -> None:
+        """Fold new plays into the track table and the clusters
+
+        Args:
+            timestamps: Play times in epoch ms
+            track_indexes: Interned track index of each play
+            matrix: (plays x features) feature matrix; plays with any
+                missing feature are not clustered
+        """
+        if len(timestamps) == 0:
+            return
+        self.cursor = max(self.cursor, int(np.max(timestamps)))
+        usable = ~np.isnan(matrix).any(axis=1)
+        if not usable.any():
+            return
+        track_indexes = np.asarray(track_indexes, dtype=np.int64)[usable]
+        points = (matrix[usable] / FEATURE_SCALE).astype(np.float32)
+        self._add_tracks(track_indexes, points)
+
+        total = int(self.plays.sum())
+        if len(self.centroids) != min(self.k, len(self.plays)) or total >= self.fitted_plays * (1 + settings.MOOD_CLUSTERS_REFIT_GROWTH):
+            self.fit()
+        else:
+            labels, _ = nearest(points, self.centroids)
+            minibatch_step(self.centroids, self.counts, points, labels)
+
+    def fit(self, iterations: Optional[int] = None, seed: int = 0) -> None:
+        """Refit the clusters from scratch over every track, weighted by plays"""
+        k = min(self.k, len(self.plays))
+        if k == 0:
+            return
+        rng = np.random.default_rng(seed)
+        weights = self.plays.astype(np.float64)
+        probabilities = weights / weights.sum()
+        centroids = kmeans_plus_plus(self.features, weights, k, rng)
+        counts = np.zeros(k, dtype=np.float64)
+        # Enough steps for each track to be sampled a few times
+        iterations = iterations or int(np.clip(3 * len(self.plays) // BATCH_SIZE, 20, 100))
+        for _ in range(iterations):
+            batch = self.features[rng.choice(len(self.plays), size=BATCH_SIZE, p=probabilities)]
+            labels, _ = nearest(batch, centroids)
+            minibatch_step(centroids, counts, batch, labels)
+
+        # Restart the rates from the real membership, so each centroid is
+        # the running mean of the plays it owns and new plays move it as such
+        labels, _ = nearest(self.features, centroids)
+        self.counts = np.bincount(labels, weights=weights, minlength=k)
+        self.centroids = centroids
+        self.fitted_plays = int(self.plays.sum())
+
+    def with_k(self, k: int) -> "MoodClusters":
+        """A copy refit with k clusters over the same tracks; this model is left untouched"""
+        clusters = MoodClusters(k, self.features.shape[1])
+        clusters.cursor = self.cursor
+        clusters.track_indexes = self.track_indexes
+        clusters.features = self.features
+        clusters.plays = self.plays.copy()
+        clusters.fit()
+        return clusters
+
+    def assign(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Cluster label and squared distance to its centroid for every track"""
+        if len(self.centroids) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        return nearest(self.features, self.centroids)
+
+    def centroid_features(self) -> np.ndarray:
+        """Centroids in the features' original units"""
+        return self.centroids * FEATURE_SCALE
+
+    def _add_tracks(self, track_indexes: np.ndarray, points: np.ndarray) -> None:
+        unique, first, play_counts = np.unique(track_indexes, return_index=True, return_counts=True)
+        positions = np.searchsorted(self.track_indexes, unique)
+        known = positions < len(self.track_indexes)
+        known[known] = self.track_indexes[positions[known]] == unique[known]
+        np.add.at(self.plays, positions[known], play_counts[known])
+
+        new = ~known
+        if new.any():
+            insert_at = positions[new]
+            self.track_indexes = np.insert(self.track_indexes, insert_at, unique[new])
+            self.features = np.insert(self.features, insert_at, points[first[new]], axis=0)
+            self.plays = np.insert(self.plays, insert_at, play_counts[new])
+
+    def save(self, path: str) -> None:
+        temporary = path + ".tmp.npz"
+        np.savez(
+            temporary,
+            k=np.int64(self.k),
+            cursor=np.int64(self.cursor),
+            fitted_plays=np.int64(self.fitted_plays),
+            track_indexes=self.track_indexes,
+            features=self.features,
+            plays=self.plays,
+            centroids=self.centroids,
+            counts=self.counts
+        )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MoodClusters":
+        with np.load(path) as data:
+            clusters = cls(int(data["k"]), data["features"].shape[1])
+            clusters.cursor = int(data["cursor"])
+            clusters.fitted_plays = int(data["fitted_plays"])
+            for field in ("track_indexes", "features", "plays", "centroids", "counts"):
+                setattr(clusters, field, data[field])
+        return clusters
+
+class MoodClusterStore:
+    """Per-user mood clusters, persisted next to the play history
+
+    Updates take a file lock and only fold in plays newer than the stored
+    cursor, so workers racing on the same delta never count a play twice.
+    """
+
+    def __init__(self, directory: str, cache_size: int):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[MoodClusters]:
+        """The user's clusters, reloaded if another worker has updated them"""
+        with self._lock:
+            return self._load(user_id)
+
+    def update(
+        self,
+        user_id: str,
+        k: int,
+        timestamps: np.ndarray,
+        track_indexes: np.ndarray,
+        matrix: np.ndarray
+    ) -> MoodClusters:
+        """Ingest the plays not yet reflected in the stored clusters and persist them
+
+        Clusters stored with a different `k` are refit over their tracks and
+        keep the new `k` from then on.
+        """
+        path = self._path(user_id)
+        with self._lock, file_lock(path):
+            clusters = self._load(user_id)
+            changed = False
+            if clusters is None:
+                clusters = MoodClusters(k)
+            elif clusters.k != k:
+                clusters.k = k
+                clusters.fit()
+                changed = True
+            new = np.asarray(timestamps) > clusters.cursor
+            if new.any():
+                clusters.ingest(timestamps[new], track_indexes[new], matrix[new])
+                changed = True
+            if changed:
+                clusters.save(path)
+                self._cache.put(user_id, (os.stat(path).st_mtime_ns, clusters))
+            return clusters
+
+    def _load(self, user_id: str) -> Optional[MoodClusters]:
+        path = self._path(user_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        clusters = MoodClusters.load(path)
+        self._cache.put(user_id, (mtime, clusters))
+        return clusters
+
+    def _path(self, user_id: str) -> str:
+        name = hashlib.blake2b(user_id.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{name}.npz")
+
+def _create_mood_cluster_store() -> MoodClusterStore:
+    directory = settings.MOOD_CLUSTERS_DIR or os.path.join(settings.DATA_DIR, "clusters")
+    return MoodClusterStore(directory, settings.MOOD_PROFILE_CACHE_SIZE)
+
+mood_clusters = _create_mood_cluster_store()
@@ -0,0 +1,296 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+import numpy as np
+from ..core.config import settings
+from .aggregation import FEATURE_KEYS, RECENCY_HALF_LIFE_DAYS
+from .columnar import file_lock
+from .feature_cache import LRUCache
+from .time_buckets import DAY_MS
+
+# Arrays kept per (day, segment[, feature]) bucket
+MOMENT_FIELDS = ("count", "mean", "m2", "wsum", "wcount")
+
+# Median sketch: fixed-width histogram bins over [0, upper] per feature
+SKETCH_BINS = 32
+SKETCH_UPPER = np.array([250.0 if key == "tempo" else 1.0 for key in FEATURE_KEYS])
+
+class MoodProfileStats:
+    """A user's running feature statistics, bucketed by (local day, time segment)
+
+    Each bucket holds count, mean and M2 (Welford) per feature, plus
+    recency-weighted sums whose weights are anchored at the end of the
+    bucket's day, so they can be decayed to any later time at read time.
+    Buckets combine with Chan's parallel update, so ingesting new plays
+    costs O(new plays) and reading a window costs O(days in window).
+    Each bucket also keeps a SKETCH_BINS histogram per feature; histograms
+    add exactly, and the window median is interpolated within its bin.
+    """
+
+    def __init__(self, n_segments: int, timezone: str = "UTC", n_features: int = len(FEATURE_KEYS)):
+        self.n_segments = n_segments
+        self.timezone = timezone          # zone the days and segments are in
+        self.n_features = n_features
+        self.cursor = -1                  # newest ingested play timestamp (ms)
+        self.days = np.empty(0, dtype=np.int64)
+        self.rows = np.empty((0, n_segments), dtype=np.int64)
+        for field in MOMENT_FIELDS:
+            setattr(self, field, np.empty((0, n_segments, n_features), dtype=np.float64))
+        # A day has far fewer than 65536 plays, so uint16 counts keep the sketch small
+        self.histogram = np.empty((0, n_segments, n_features, SKETCH_BINS), dtype=np.uint16)
+        self.has_median_sketch = True     # False for profiles saved before the sketch existed
+
+    def ingest(
+        self,
+        timestamps: np.ndarray,
+        matrix: np.ndarray,
+        segments: np.ndarray,
+        days: Optional[np.ndarray] = None
+    ) -> None:
+        """Fold new plays into the running statistics
+
+        Args:
+            timestamps: Play times in epoch ms
+            matrix: (plays x features) feature matrix, NaN where missing
+            segments: Time-segment index of each play
+            days: Local day of each play, UTC days when omitted
+        """
+        if len(timestamps) == 0:
+            return
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if days is None:
+            days = timestamps // DAY_MS
+        days, day_index = np.unique(days, return_inverse=True)
+        batch = self._bucket_moments(timestamps, days, day_index, matrix, np.asarray(segments, dtype=np.intp))
+        self._merge(days, batch)
+        self.cursor = max(self.cursor, int(timestamps.max()))
+
+    def window(self, since_day: int, now_ms: float) -> Dict[str, np.ndarray]:
+        """Combined per-segment statistics for plays on `since_day` and later
+
+        Returns:
+            (segments x features) arrays: mean, std, median (approximate,
+            from the histogram sketch), weighted_mean and count, plus
+            `rows`, the number of plays per segment
+        """
+        selected = self.days >= since_day
+        count = self.count[selected]
+        mean = self.mean[selected]
+
+        total = count.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            total_mean = (count * mean).sum(axis=0) / total
+            spread = np.where(count > 0, count * (mean - total_mean) ** 2, 0)
+            m2 = self.m2[selected].sum(axis=0) + spread.sum(axis=0)
+            std = np.sqrt(m2 / total)
+
+            # Weights are anchored at a fixed instant per day, so re-anchoring
+            # to now is exact; today's anchor is in the future (factor > 1)
+            day_end = (self.days[selected] + 1) * DAY_MS
+            decay = np.power(0.5, (now_ms - day_end) / (RECENCY_HALF_LIFE_DAYS * DAY_MS))
+            decay = decay[:, None, None]
+            weighted_mean = (self.wsum[selected] * decay).sum(axis=0) / (self.wcount[selected] * decay).sum(axis=0)
+
+        return {
+            "mean": total_mean,
+            "std": std,
+            "median": self._sketch_median(self.histogram[selected].sum(axis=0, dtype=np.int64)),
+            "weighted_mean": weighted_mean,
+            "count": total.astype(np.intp),
+            "rows": self.rows[selected].sum(axis=0)
+        }
+
+    def _sketch_median(self, histogram: np.ndarray) -> np.ndarray:
+        """Median of each (segment, feature) histogram, linear within the median's bin"""
+        cumulative = np.cumsum(histogram, axis=-1)
+        total = cumulative[..., -1]
+        half = total / 2
+        index = np.minimum((cumulative < half[..., None]).sum(axis=-1), SKETCH_BINS - 1)
+        below = np.where(index > 0, np.take_along_axis(cumulative, np.maximum(index - 1, 0)[..., None], -1)[..., 0], 0)
+        in_bin = np.take_along_axis(histogram, index[..., None], -1)[..., 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = np.clip((half - below) / in_bin, 0, 1)
+        width = SKETCH_UPPER[:self.n_features] / SKETCH_BINS
+        return np.where(total > 0, (index + fraction) * width, np.nan)
+
+    def _bucket_moments(
+        self,
+        timestamps: np.ndarray,
+        days: np.ndarray,
+        day_index: np.ndarray,
+        matrix: np.ndarray,
+        segments: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        n_buckets = len(days) * self.n_segments
+        shape = (len(days), self.n_segments, self.n_features)
+        cells = day_index * self.n_segments + segments
+        feature_cells = (cells[:, None] * self.n_features + np.arange(self.n_features)).ravel()
+
+        def cell_sum(values: np.ndarray) -> np.ndarray:
+            return np.bincount(feature_cells, weights=values.ravel(), minlength=n_buckets * self.n_features).reshape(shape)
+
+        valid = ~np.isnan(matrix)
+        filled = np.where(valid, matrix, 0).astype(np.float64)
+        count = cell_sum(valid.astype(np.float64))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nan_to_num(cell_sum(filled) / count)
+        deviations = np.where(valid, filled - mean.reshape(-1, self.n_features)[cells], 0)
+
+        day_end = (days[day_index] + 1) * DAY_MS
+        weights = np.power(0.5, (day_end - timestamps) / (RECENCY_HALF_LIFE_DAYS * DAY_MS))[:, None] * valid
+
+        bins = np.clip(
+            (filled / SKETCH_UPPER[:self.n_features] * SKETCH_BINS).astype(np.intp), 0, SKETCH_BINS - 1
+        )
+        histogram = np.bincount(
+            (feature_cells * SKETCH_BINS + bins.ravel())[valid.ravel()],
+            minlength=n_buckets * self.n_features * SKETCH_BINS
+        ).reshape(shape + (SKETCH_BINS,))
+
+        return {
+            "histogram": histogram,
+            "rows": np.bincount(cells, minlength=n_buckets).reshape(len(days), self.n_segments),
+            "count": count,
+            "mean": mean,
+            "m2": cell_sum(deviations * deviations),
+            "wsum": cell_sum(filled * weights),
+            "wcount": cell_sum(weights)
+        }
+
+    def _merge(self, days: np.ndarray, batch: Dict[str, np.ndarray]) -> None:
+        all_days = np.union1d(self.days, days)
+        old = np.searchsorted(all_days, self.days)
+        new = np.searchsorted(all_days, days)
+
+        merged = {"rows": np.zeros((len(all_days), self.n_segments), dtype=np.int64)}
+        for field in MOMENT_FIELDS:
+            merged[field] = np.zeros((len(all_days), self.n_segments, self.n_features))
+            merged[field][old] = getattr(self, field)
+        merged["rows"][old] = self.rows
+        merged["histogram"] = np.zeros((len(all_days),) + self.histogram.shape[1:], dtype=np.uint16)
+        merged["histogram"][old] = self.histogram
+        merged["histogram"][new] += batch["histogram"].astype(np.uint16)
+
+        # Chan et al. parallel combination of (count, mean, M2)
+        count_a = merged["count"][new]
+        mean_a = merged["mean"][new]
+        count_b = batch["count"]
+        count = count_a + count_b
+        delta = batch["mean"] - mean_a
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.where(count > 0, count_b / count, 0)
+        merged["mean"][new] = mean_a + delta * ratio
+        merged["m2"][new] += batch["m2"] + delta * delta * count_a * ratio
+        merged["count"][new] = count
+        for field in ("wsum", "wcount"):
+            merged[field][new] += batch[field]
+        merged["rows"][new] += batch["rows"]
+
+        self.days = all_days
+        for field, values in merged.items():
+            setattr(self, field, values)
+
+    def save(self, path: str) -> None:
+        temporary = path + ".tmp.npz"
+        np.savez(
+            temporary,
+            cursor=np.int64(self.cursor),
+            timezone=np.array(self.timezone),
+            days=self.days,
+            rows=self.rows,
+            histogram=self.histogram,
+            **{field: getattr(self, field) for field in MOMENT_FIELDS}
+        )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MoodProfileStats":
+        with np.load(path) as data:
+            # Profiles written before timezone support are in UTC
+            timezone = str(data["timezone"]) if "timezone" in data.files else "UTC"
+            stats = cls(data["rows"].shape[1], timezone, data["count"].shape[2])
+            stats.cursor = int(data["cursor"])
+            stats.days = data["days"]
+            stats.rows = data["rows"]
+            for field in MOMENT_FIELDS:
+                setattr(stats, field, data[field])
+            if "histogram" in data.files:
+                stats.histogram = data["histogram"]
+            else:
+                stats.histogram = np.zeros(stats.count.shape + (SKETCH_BINS,), dtype=np.uint16)
+                stats.has_median_sketch = False
+        return stats
+
+class MoodProfileStore:
+    """Materialized per-user mood statistics, persisted next to the play history
+
+    Updates take a file lock and only fold in plays newer than the stored
+    cursor, so workers racing on the same delta never count a play twice.
+    """
+
+    def __init__(self, directory: str, cache_size: int):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[MoodProfileStats]:
+        """The user's statistics, reloaded if another worker has updated them"""
+        with self._lock:
+            return self._load(user_id)
+
+    def update(
+        self,
+        user_id: str,
+        n_segments: int,
+        timezone: str,
+        timestamps: np.ndarray,
+        matrix: np.ndarray,
+        segments: np.ndarray,
+        days: np.ndarray
+    ) -> MoodProfileStats:
+        """Ingest the plays not yet reflected in the stored statistics and persist them
+
+        Statistics kept in a different timezone, or saved without the
+        median sketch, are discarded, so callers pass the whole history
+        when `needs_rebuild` says so.
+        """
+        path = self._path(user_id)
+        with self._lock, file_lock(path):
+            stats = self._load(user_id)
+            if stats is None or needs_rebuild(stats, timezone):
+                stats = MoodProfileStats(n_segments, timezone)
+            new = np.asarray(timestamps) > stats.cursor
+            if new.any():
+                stats.ingest(timestamps[new], matrix[new], segments[new], days[new])
+                stats.save(path)
+                self._cache.put(user_id, (os.stat(path).st_mtime_ns, stats))
+            return stats
+
+    def _load(self, user_id: str) -> Optional[MoodProfileStats]:
+        path = self._path(user_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        stats = MoodProfileStats.load(path)
+        self._cache.put(user_id, (mtime, stats))
+        return stats
+
+    def _path(self, user_id: str) -> str:
+        name = hashlib.blake2b(user_id.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{name}.npz")
+
+def needs_rebuild(stats: MoodProfileStats, timezone: str) -> bool:
+    """Whether stored statistics must be rebuilt from the full history"""
+    return stats.timezone != timezone or not stats.has_median_sketch
+
+def _create_mood_profile_store() -> MoodProfileStore:
+    directory = settings.MOOD_PROFILE_DIR or os.path.join(settings.DATA_DIR, "profiles")
+    return MoodProfileStore(directory, settings.MOOD_PROFILE_CACHE_SIZE)
+
+mood_profiles = _create_mood_profile_store()
@@ -0,0 +1,63 @@
+from typing import Any, Dict, List, Optional
+
+# `fields=full` returns tracks unprojected, with every field the track catalog keeps
+FULL = "full"
+
+def parse_fields(fields: str) -> Dict[str, Any]:
+    """Compile `a,b.c,b.d` into a nested selection tree {a: {}, b: {c: {}, d: {}}}
+
+    Raises:
+        ValueError: If a field path is empty
+    """
+    tree: Dict[str, Any] = {}
+    for path in fields.split(","):
+        parts = path.strip().split(".")
+        if not all(parts):
+            raise ValueError(f"Invalid field: {path!r}")
+        node = tree
+        for part in parts:
+            node = node.setdefault(part, {})
+    return tree
+
+def project(value: Any, tree: Dict[str, Any]) -> Any:
+    """Keep only the selected keys; lists are projected item by item"""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
+    return value
+
+def slim_track(track: Dict[str, Any]) -> Dict[str, Any]:
+    """The default track shape: identifiers, names, popularity and one album image
+
+    Drops available_markets, external IDs and URLs, preview URLs and every
+    album image but the first (largest).
+    """
+    album = track.get("album") or {}
+    slim = {
+        "id": track.get("id"),
+        "name": track.get("name"),
+        "artists": [{"id": artist.get("id"), "name": artist.get("name")} for artist in track.get("artists") or []],
+        "album": {"id": album.get("id"), "name": album.get("name"), "images": (album.get("images") or [])[:1]}
+    }
+    for key in ("uri", "popularity", "played_at", "audio_features"):
+        if key in track:
+            slim[key] = track[key]
+    return slim
+
+def project_tracks(tracks: List[Dict[str, Any]], fields: Optional[str]) -> List[Dict[str, Any]]:
+    """Shape tracks for a response
+
+    Args:
+        tracks: Track dicts as returned by Spotify, possibly with extra keys
+        fields: None for the slim default, "full" for the catalog objects,
+            otherwise comma-separated dotted paths (e.g. `id,name,artists.name`)
+    """
+    if fields is None:
+        return [slim_track(track) for track in tracks]
+    if fields == FULL:
+        return tracks
+    tree = parse_fields(fields)
+    return [project(track, tree) for track in tracks]
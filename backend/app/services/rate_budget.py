@@ -0,0 +1,109 @@
+import asyncio
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl; single-process only
+    fcntl = None
+
+# Each slot holds a bucket's token balance and last refill time as two doubles
+SLOT = struct.Struct("<dd")
+
+# The file starts with the shared 429 pause deadline, then the app bucket, then user buckets
+HEADER = struct.Struct("<d")
+
+class SharedBucketTable:
+    """Token buckets in a memory-mapped file, shared by every worker on the host
+
+    Slot 0 is the app-wide bucket and per-user buckets hash into the
+    remaining slots; two users landing in the same slot just share a
+    budget, which errs on the side of fewer upstream calls. Updates take an
+    flock on the file, which costs a couple of syscalls per reservation.
+
+    The file outlives reboots, so it stores wall-clock times rather than
+    `time.monotonic` (which restarts from zero). A refill time in the
+    future (clock stepped back) is treated as now, and a pause reaching
+    more than `max_pause` seconds ahead is ignored as stale. Callers still
+    pass and receive monotonic deadlines, converted here.
+    """
+
+    def __init__(self, path: str, user_slots: int, max_pause: float):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.user_slots = user_slots
+        self.max_pause = max_pause
+        size = HEADER.size + SLOT.size * (1 + user_slots)
+        self._file = open(path, "a+b")
+        with self._locked():
+            # Zero-filled: a bucket that was never used refills to capacity on first use
+            if os.fstat(self._file.fileno()).st_size < size:
+                self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def reserve(self, slot: int, rate: float, capacity: float) -> float:
+        """Take one token from a slot's bucket and return how long to wait before using it"""
+        offset = HEADER.size + SLOT.size * slot
+        with self._locked():
+            tokens, updated = SLOT.unpack_from(self._map, offset)
+            now = time.time()
+            elapsed = max(now - updated, 0.0)
+            # A balance more than one burst in debt can only be left over from a clock jump
+            tokens = min(capacity, max(tokens, -capacity) + elapsed * rate) - 1
+            SLOT.pack_into(self._map, offset, tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def user_slot(self, key: bytes) -> int:
+        return 1 + int.from_bytes(key[:8], "little") % self.user_slots
+
+    @property
+    def paused_until(self) -> float:
+        """The shared pause deadline on this process's `time.monotonic` clock"""
+        remaining = HEADER.unpack_from(self._map, 0)[0] - time.time()
+        if remaining > self.max_pause:
+            remaining = 0.0
+        return time.monotonic() + remaining
+
+    def pause_until(self, deadline: float) -> None:
+        """Hold back every worker until the monotonic `deadline`, keeping any later pause"""
+        wall_deadline = time.time() + (deadline - time.monotonic())
+        with self._locked():
+            stored = HEADER.unpack_from(self._map, 0)[0]
+            if wall_deadline > stored or stored - time.time() > self.max_pause:
+                HEADER.pack_into(self._map, 0, wall_deadline)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+class SharedTokenBucket:
+    """Drop-in for the scheduler's TokenBucket whose balance lives in a SharedBucketTable slot"""
+
+    def __init__(self, table: SharedBucketTable, slot: int, rate: float, capacity: float):
+        self.table = table
+        self.slot = slot
+        self.rate = rate
+        self.capacity = capacity
+
+    def reserve(self) -> float:
+        return self.table.reserve(self.slot, self.rate, self.capacity)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
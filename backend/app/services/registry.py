@@ -0,0 +1,121 @@
+import asyncio
+import io
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from ..core.config import settings
+
+class SharedRegistry:
+    """Versioned per-user entries in SQLite, shared by every worker on the host
+
+    Each write stamps the entry with the next version number and deletes
+    leave a tombstone, so a worker catches up with every other worker's
+    changes by reading the entries newer than the last version it applied.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS registry ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, version INTEGER NOT NULL, data BLOB, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS registry_version ON registry (namespace, version)")
+        self._conn.commit()
+
+    def put(self, namespace: str, key: str, data: Optional[bytes]) -> None:
+        """Store an entry (None writes a tombstone) under the next version"""
+        with self._lock:
+            # One statement, so the version is assigned under SQLite's write lock
+            self._conn.execute(
+                "INSERT OR REPLACE INTO registry (namespace, key, version, data) "
+                "VALUES (?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM registry), ?)",
+                (namespace, key, data)
+            )
+            self._conn.commit()
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[int, Optional[bytes]]]:
+        """(version, data) of an entry, or None if it was never written"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT version, data FROM registry WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+
+    def version(self, namespace: str, key: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM registry WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def changes(self, namespace: str, since: int) -> List[Tuple[int, str, Optional[bytes]]]:
+        """(version, key, data) of the entries written after version `since`, oldest first"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT version, key, data FROM registry WHERE namespace = ? AND version > ? ORDER BY version",
+                (namespace, since)
+            ).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def pack_arrays(**arrays: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+def unpack_arrays(data: bytes) -> Dict[str, np.ndarray]:
+    with np.load(io.BytesIO(data), allow_pickle=False) as loaded:
+        return {name: loaded[name] for name in loaded.files}
+
+class RegistryFollower:
+    """Keeps a process-local index in step with one namespace of the shared registry
+
+    Writes go to the registry first and reach the local index the same way
+    other workers' writes do, through `sync`, which applies every change
+    since the last one seen: `apply(key, data)`, with None for a removal.
+    """
+
+    def __init__(self, registry: SharedRegistry, namespace: str, apply: Callable[[str, Optional[bytes]], None]):
+        self.registry = registry
+        self.namespace = namespace
+        self.apply = apply
+        self.version = 0
+        self._lock = asyncio.Lock()
+
+    async def sync(self) -> None:
+        """Apply the changes other workers (and this one) made since the last sync"""
+        async with self._lock:
+            changes = await asyncio.to_thread(self.registry.changes, self.namespace, self.version)
+            for version, key, data in changes:
+                self.apply(key, data)
+                self.version = version
+
+    async def publish(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self.registry.put, self.namespace, key, data)
+        await self.sync()
+
+    async def remove(self, key: str) -> bool:
+        """Tombstone an entry; returns False if it was not registered"""
+        entry = await asyncio.to_thread(self.registry.get, self.namespace, key)
+        if entry is None or entry[1] is None:
+            return False
+        await asyncio.to_thread(self.registry.put, self.namespace, key, None)
+        await self.sync()
+        return True
+
+def _create_registry() -> SharedRegistry:
+    path = settings.REGISTRY_DB_PATH or os.path.join(settings.DATA_DIR, "registry.sqlite3")
+    return SharedRegistry(path)
+
+registry = _create_registry()
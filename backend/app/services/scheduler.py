@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
+import httpx
+from typing import Any, Dict, Hashable, Optional, Tuple
+from ..core.config import settings
+from ..core.metrics import upstream_in_flight, upstream_latency, upstream_requests
+from .feature_cache import LRUCache
+from .http import get_http_client
+from .rate_budget import SharedBucketTable, SharedTokenBucket
+
+# Upstream statuses worth retrying after a backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Methods that are safe to resend after a server error or dropped connection
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+class UpstreamError(Exception):
+    """Spotify answered with an error status after any retries"""
+
+    def __init__(self, endpoint: str, response: httpx.Response):
+        super().__init__(f"Spotify {endpoint} request failed with status {response.status_code}")
+        self.endpoint = endpoint
+        self.status_code = response.status_code
+        self.retry_after = response.headers.get("Retry-After")
+
+def check_response(response: httpx.Response, endpoint: str) -> httpx.Response:
+    """Return a 2xx (or 304) response, raising UpstreamError for anything else
+
+    Callers check before reading the body, so an error is never parsed
+    into an empty result and cached as if Spotify had sent it.
+    """
+    if response.is_success or response.status_code == 304:
+        return response
+    raise UpstreamError(endpoint, response)
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of polling
+
+    Each acquire deducts a token immediately (the balance may go negative)
+    and sleeps for however long the refill takes, so waiters are served in
+    arrival order without a lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take one token and return how long to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class UpstreamScheduler:
+    """Single gateway for Spotify traffic
+
+    - per-app and per-user token buckets keep us under the rate ceiling;
+      with a SharedBucketTable they are shared by every worker on the host
+    - a 429's Retry-After pauses all traffic, then retries with jitter
+    - 5xx responses and transport errors retry with jittered exponential
+      backoff, for idempotent methods only
+    - identical in-flight GETs are coalesced into one upstream call
+    - GETs that opt in keep their ETagged responses and revalidate them
+      with If-None-Match, so an unchanged resource comes back as a bodiless
+      304; only endpoints whose responses are actually reused opt in
+    - every attempt is timed and counted per endpoint and status in the
+      metrics registry
+    """
+
+    def __init__(
+        self,
+        app_rate: float = settings.SPOTIFY_APP_RATE,
+        app_burst: float = settings.SPOTIFY_APP_BURST,
+        user_rate: float = settings.SPOTIFY_USER_RATE,
+        user_burst: float = settings.SPOTIFY_USER_BURST,
+        max_retries: int = settings.SPOTIFY_MAX_RETRIES,
+        backoff_base: float = settings.SPOTIFY_BACKOFF_BASE,
+        backoff_max: float = settings.SPOTIFY_BACKOFF_MAX,
+        shared: Optional[SharedBucketTable] = None
+    ):
+        self.shared = shared
+        if shared is not None:
+            self.app_bucket = SharedTokenBucket(shared, 0, app_rate, app_burst)
+        else:
+            self.app_bucket = TokenBucket(app_rate, app_burst)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.user_buckets = LRUCache(settings.SPOTIFY_USER_BUCKETS)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.paused_until = 0.0
+        self.inflight: Dict[Hashable, "asyncio.Task[httpx.Response]"] = {}
+        self.coalesced = 0
+        self.etag_cache = LRUCache(settings.SPOTIFY_ETAG_CACHE_SIZE)
+        self.revalidated = 0
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        access_token: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        endpoint: str = "other",
+        revalidate: bool = False,
+        **kwargs: Any
+    ) -> httpx.Response:
+        """Send a request through the rate limiter, retrying when Spotify pushes back
+
+        Args:
+            method: HTTP method
+            url: Absolute upstream URL
+            access_token: User access token, sent as a Bearer header and used
+                to pick the per-user bucket; None for app-level calls
+            headers: Extra request headers
+            params: Query parameters
+            endpoint: Short name of the Spotify endpoint, used as a metrics label
+            revalidate: Keep the ETagged GET response for revalidation. Only
+                for small responses that are requested again unchanged (the
+                user profile); cursor-keyed and already cached data must not
+                hold whole bodies per token
+        """
+        headers = dict(headers or {})
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+
+        if method != "GET" or kwargs:
+            return await self._send(method, url, access_token, headers, params, endpoint, **kwargs)
+
+        # Singleflight: concurrent identical GETs share one upstream call. The
+        # call runs as its own task so a cancelled caller doesn't cancel it
+        # for everyone else.
+        key = self._request_key(url, access_token, headers, params)
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._get(key, url, access_token, headers, params, endpoint, revalidate))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _get(
+        self,
+        key: Hashable,
+        url: str,
+        access_token: Optional[str],
+        headers: Dict[str, str],
+        params: Optional[Dict[str, Any]],
+        endpoint: str,
+        revalidate: bool
+    ) -> httpx.Response:
+        if not revalidate:
+            return await self._send("GET", url, access_token, headers, params, endpoint)
+
+        # Keyed by a digest of the token, so the cache never holds credentials
+        cache_key = hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+        cached = self.etag_cache.get(cache_key)
+        if cached is not None:
+            headers = {**headers, "If-None-Match": cached.headers["ETag"]}
+
+        response = await self._send("GET", url, access_token, headers, params, endpoint)
+        if response.status_code == 304 and cached is not None:
+            self.revalidated += 1
+            return cached
+        if response.status_code == 200 and "ETag" in response.headers:
+            self.etag_cache.put(cache_key, response)
+        return response
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        access_token: Optional[str],
+        headers: Dict[str, str],
+        params: Optional[Dict[str, Any]],
+        endpoint: str,
+        **kwargs: Any
+    ) -> httpx.Response:
+        client = get_http_client()
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            await self._wait_for_budget(access_token)
+            try:
+                response = await self._timed(client, endpoint, method, url, headers, params, **kwargs)
+            except httpx.TransportError:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            status = response.status_code
+            if status not in RETRY_STATUSES or attempt >= self.max_retries:
+                return response
+            if status != 429 and not idempotent:
+                return response
+
+            if status == 429:
+                # Spotify's limit is per app, so hold back every caller
+                delay = self._retry_after(response)
+                if delay > settings.SPOTIFY_RETRY_AFTER_MAX:
+                    return response
+                delay += random.uniform(0, self.backoff_base)
+                self._pause_until(time.monotonic() + delay)
+            else:
+                delay = self._backoff(attempt)
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    async def _timed(
+        client: httpx.AsyncClient,
+        endpoint: str,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        params: Optional[Dict[str, Any]],
+        **kwargs: Any
+    ) -> httpx.Response:
+        """Send one attempt, recording its latency, status and in-flight count"""
+        labels = (endpoint,)
+        upstream_in_flight.inc(labels)
+        start = time.perf_counter()
+        status = "transport_error"
+        try:
+            response = await client.request(method, url, headers=headers, params=params, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            upstream_in_flight.dec(labels)
+            upstream_latency.observe(labels, time.perf_counter() - start)
+            upstream_requests.inc((endpoint, status))
+
+    async def _wait_for_budget(self, access_token: Optional[str]) -> None:
+        paused_until = self.shared.paused_until if self.shared is not None else self.paused_until
+        pause = paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        if access_token:
+            await self._user_bucket(access_token).acquire()
+        await self.app_bucket.acquire()
+
+    def _user_bucket(self, access_token: str) -> TokenBucket:
+        key = hashlib.blake2b(access_token.encode(), digest_size=16).digest()
+        bucket = self.user_buckets.get(key)
+        if bucket is None:
+            if self.shared is not None:
+                bucket = SharedTokenBucket(self.shared, self.shared.user_slot(key), self.user_rate, self.user_burst)
+            else:
+                bucket = TokenBucket(self.user_rate, self.user_burst)
+            self.user_buckets.put(key, bucket)
+        return bucket
+
+    def _pause_until(self, deadline: float) -> None:
+        if self.shared is not None:
+            self.shared.pause_until(deadline)
+        else:
+            self.paused_until = max(self.paused_until, deadline)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response: httpx.Response) -> float:
+        try:
+            return max(float(response.headers.get("Retry-After", "")), 0.0)
+        except ValueError:
+            return self.backoff_base
+
+    @staticmethod
+    def _request_key(
+        url: str,
+        access_token: Optional[str],
+        headers: Dict[str, str],
+        params: Optional[Dict[str, Any]]
+    ) -> Tuple[Any, ...]:
+        return (
+            url,
+            access_token,
+            tuple(sorted(headers.items())),
+            tuple(sorted((params or {}).items()))
+        )
+
+def _create_scheduler() -> UpstreamScheduler:
+    shared = None
+    if settings.SPOTIFY_SHARED_BUDGET:
+        path = settings.SPOTIFY_SHARED_BUDGET_PATH or os.path.join(settings.DATA_DIR, "rate_budget.bin")
+        shared = SharedBucketTable(
+            path,
+            settings.SPOTIFY_SHARED_BUDGET_SLOTS,
+            # The longest pause a 429 can set: Retry-After plus jitter
+            settings.SPOTIFY_RETRY_AFTER_MAX + settings.SPOTIFY_BACKOFF_BASE
+        )
+    return UpstreamScheduler(shared=shared)
+
+upstream = _create_scheduler()
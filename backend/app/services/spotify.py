@@ -1,13 +1,36 @@
+import asyncio
 import base64
-import requests
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+import hashlib
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import numpy as np
 from ..core.config import settings
+from .scheduler import check_response, upstream
+from .catalog import track_catalog
+from .compatibility import CURVE_KEYS, build_mood_curve
+from .feature_cache import LRUCache
+from .feature_provider import feature_provider
+from .history import listening_history, ms_to_played_at, played_at_to_ms
+from .mood_clusters import MoodClusters, mood_clusters
+from .mood_stats import MoodProfileStats, mood_profiles, needs_rebuild
+from .time_buckets import DAY_MS, TimeBucketer
+from .aggregation import (
+    FEATURE_KEYS,
+    build_feature_matrix,
+    grouped_statistics,
+    statistics_by_group
+)
+
+# (ETag, track IDs) of each token's last top-tracks response; metadata lives in track_catalog
+top_tracks_index = LRUCache(settings.SPOTIFY_ETAG_CACHE_SIZE)
 
 class SpotifyService:
-    AUTH_URL = "https://accounts.spotify.com/authorize"
-    TOKEN_URL = "https://accounts.spotify.com/api/token"
-    API_BASE_URL = "https://api.spotify.com/v1"
+    AUTH_URL = f"{settings.SPOTIFY_ACCOUNTS_BASE_URL}/authorize"
+    TOKEN_URL = f"{settings.SPOTIFY_ACCOUNTS_BASE_URL}/api/token"
+    API_BASE_URL = settings.SPOTIFY_API_BASE_URL
+    
+    # Maximum number of tracks added to a playlist per request
+    PLAYLIST_ITEMS_CHUNK_SIZE = 100
     
     # Time segments for analysis
     TIME_SEGMENTS = {
@@ -40,7 +63,7 @@ class SpotifyService:
         return f"{auth_url}?{query_params}"
     
     @staticmethod
-    def get_token(code: str) -> Dict[str, Any]:
+    async def get_token(code: str) -> Dict[str, Any]:
         """Exchange authorization code for access token"""
         auth_header = base64.b64encode(
             f"{settings.SPOTIFY_CLIENT_ID}:{settings.SPOTIFY_CLIENT_SECRET}".encode()
@@ -57,11 +80,11 @@ class SpotifyService:
             "redirect_uri": settings.SPOTIFY_REDIRECT_URI
         }
         
-        response = requests.post(SpotifyService.TOKEN_URL, headers=headers, data=data)
+        response = await upstream.request("POST", SpotifyService.TOKEN_URL, headers=headers, endpoint="token", data=data)
         return response.json()
     
     @staticmethod
-    def refresh_token(refresh_token: str) -> Dict[str, Any]:
+    async def refresh_token(refresh_token: str) -> Dict[str, Any]:
         """Refresh an expired access token"""
         auth_header = base64.b64encode(
             f"{settings.SPOTIFY_CLIENT_ID}:{settings.SPOTIFY_CLIENT_SECRET}".encode()
@@ -77,139 +100,523 @@ class SpotifyService:
             "refresh_token": refresh_token
         }
         
-        response = requests.post(SpotifyService.TOKEN_URL, headers=headers, data=data)
+        response = await upstream.request("POST", SpotifyService.TOKEN_URL, headers=headers, endpoint="token", data=data)
         return response.json()
     
     @staticmethod
-    def get_user_profile(access_token: str) -> Dict[str, Any]:
+    async def get_user_profile(access_token: str) -> Dict[str, Any]:
         """Get the user's Spotify profile"""
-        headers = {"Authorization": f"Bearer {access_token}"}
-        response = requests.get(f"{SpotifyService.API_BASE_URL}/me", headers=headers)
-        return response.json()
+        response = await upstream.request(
+            "GET", f"{SpotifyService.API_BASE_URL}/me", access_token=access_token, endpoint="me", revalidate=True
+        )
+        return check_response(response, "me").json()
     
     @staticmethod
-    def get_top_tracks(access_token: str, time_range: str = "medium_term", limit: int = 50) -> List[Dict[str, Any]]:
+    async def get_top_tracks(access_token: str, time_range: str = "medium_term", limit: int = 50) -> List[Dict[str, Any]]:
         """Get the user's top tracks
         
         Args:
             access_token: Spotify access token
             time_range: short_term (4 weeks), medium_term (6 months), or long_term (years)
             limit: Number of tracks to return (max 50)
+        
+        Only the ETag and track IDs are kept per user; an unchanged list is
+        revalidated with a bodiless 304 and resolved from the shared catalog.
         """
-        headers = {"Authorization": f"Bearer {access_token}"}
         params = {"time_range": time_range, "limit": limit}
+        key = (hashlib.blake2b(access_token.encode(), digest_size=16).digest(), time_range, limit)
+        cached = top_tracks_index.get(key)
         
-        response = requests.get(
-            f"{SpotifyService.API_BASE_URL}/me/top/tracks", 
-            headers=headers,
-            params=params
-        )
+        async def fetch(headers: Optional[Dict[str, str]]):
+            response = await upstream.request(
+                "GET",
+                f"{SpotifyService.API_BASE_URL}/me/top/tracks",
+                access_token=access_token,
+                headers=headers,
+                params=params,
+                endpoint="top_tracks"
+            )
+            return check_response(response, "top_tracks")
         
-        return response.json().get("items", [])
+        response = await fetch({"If-None-Match": cached[0]} if cached else None)
+        if response.status_code == 304 and cached is not None:
+            tracks = track_catalog.get_many(cached[1])
+            if all(track_id in tracks for track_id in cached[1]):
+                return [tracks[track_id] for track_id in cached[1]]
+            # Some metadata expired from the catalog, so fetch the full list again
+            response = await fetch(None)
+        
+        tracks = track_catalog.put_many(response.json().get("items", []))
+        etag = response.headers.get("ETag")
+        if etag:
+            top_tracks_index.put(key, (etag, [track["id"] for track in tracks]))
+        return tracks
     
     @staticmethod
-    def get_audio_features(access_token: str, track_ids: List[str]) -> List[Dict[str, Any]]:
-        """Get audio features for a list of tracks"""
-        headers = {"Authorization": f"Bearer {access_token}"}
+    async def get_audio_features(access_token: str, track_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Get audio features for a list of tracks
+        
+        Args:
+            access_token: Spotify access token
+            track_ids: Spotify track IDs, in any number and possibly repeated
         
-        # Spotify API allows up to 100 IDs per request
-        # Split into chunks if necessary
-        if len(track_ids) > 100:
-            # Implementation for chunking would go here
-            pass
+        Returns:
+            One entry per input ID in input order, None where Spotify has no features
+        """
+        # De-duplicate while keeping first-seen order
+        unique_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
         
-        track_ids_str = ",".join(track_ids)
-        response = requests.get(
-            f"{SpotifyService.API_BASE_URL}/audio-features", 
-            headers=headers,
-            params={"ids": track_ids_str}
-        )
+        # The local dataset (if configured) answers first; only misses reach the cache and API
+        features_map = await feature_provider.get_many(access_token, unique_ids)
         
-        return response.json().get("audio_features", [])
+        return [features_map.get(track_id) for track_id in track_ids]
     
     @staticmethod
-    def get_recently_played(access_token: str, limit: int = 50) -> List[Dict[str, Any]]:
+    async def get_recently_played(access_token: str, limit: int = 50, after: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get the user's recently played tracks
         
         Args:
             access_token: Spotify access token
             limit: Number of tracks to return (max 50)
+            after: Only return plays after this Unix timestamp in milliseconds
+        
+        Returns:
+            Items with `played_at` and the track's catalog entry
         """
-        headers = {"Authorization": f"Bearer {access_token}"}
         params = {"limit": limit}
+        if after is not None:
+            params["after"] = after
         
-        response = requests.get(
+        # Not revalidated: `after` moves on every sync, so nothing is kept per
+        # token; the cursor lives in the play history and tracks in the catalog
+        response = await upstream.request(
+            "GET",
             f"{SpotifyService.API_BASE_URL}/me/player/recently-played",
-            headers=headers,
-            params=params
+            access_token=access_token,
+            params=params,
+            endpoint="recently_played"
+        )
+        check_response(response, "recently_played")
+        
+        items = [item for item in response.json().get("items", []) if (item.get("track") or {}).get("id")]
+        tracks = track_catalog.put_many(item["track"] for item in items)
+        return [{"played_at": item["played_at"], "track": track} for item, track in zip(items, tracks)]
+    
+    @staticmethod
+    async def create_playlist(
+        access_token: str,
+        user_id: str,
+        name: str,
+        description: str = "",
+        public: bool = False
+    ) -> Dict[str, Any]:
+        """Create an empty playlist owned by the user"""
+        payload = {"name": name, "description": description, "public": public}
+        
+        response = await upstream.request(
+            "POST",
+            f"{SpotifyService.API_BASE_URL}/users/{user_id}/playlists",
+            access_token=access_token,
+            endpoint="create_playlist",
+            json=payload
         )
         
-        return response.json().get("items", [])
+        return check_response(response, "create_playlist").json()
     
     @staticmethod
-    def get_time_based_tracks(access_token: str, days: int = 7) -> Dict[str, List[Dict[str, Any]]]:
-        """Get tracks organized by time of day
+    async def add_tracks_to_playlist(access_token: str, playlist_id: str, track_uris: List[str]) -> List[str]:
+        """Append tracks to a playlist in batches of up to 100
+        
+        Batches are sent in order so the playlist keeps the given track order.
+        
+        Returns:
+            The playlist snapshot ID after each batch
+        """
+        size = SpotifyService.PLAYLIST_ITEMS_CHUNK_SIZE
+        
+        snapshots = []
+        for i in range(0, len(track_uris), size):
+            response = await upstream.request(
+                "POST",
+                f"{SpotifyService.API_BASE_URL}/playlists/{playlist_id}/tracks",
+                access_token=access_token,
+                endpoint="add_playlist_tracks",
+                json={"uris": track_uris[i:i + size]}
+            )
+            snapshots.append(check_response(response, "add_playlist_tracks").json().get("snapshot_id"))
+        
+        return snapshots
+    
+    @staticmethod
+    async def sync_listening_history(access_token: str, user_id: str) -> int:
+        """Pull plays newer than the user's stored cursor into the history store
+        
+        Concurrent calls for the same user share one sync, and users synced
+        within HISTORY_SYNC_INTERVAL seconds are not synced again.
+        
+        Returns:
+            The number of new plays stored
+        """
+        task = listening_history.inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(SpotifyService._sync_listening_history(access_token, user_id))
+            listening_history.inflight[user_id] = task
+            task.add_done_callback(lambda _: listening_history.inflight.pop(user_id, None))
+        return await asyncio.shield(task)
+    
+    @staticmethod
+    async def _sync_listening_history(access_token: str, user_id: str) -> int:
+        state = await asyncio.to_thread(listening_history.get_sync_state, user_id)
+        if state and time.time() - state["synced_at"] < settings.HISTORY_SYNC_INTERVAL:
+            return 0
+        
+        # Spotify returns at most 50 plays after the cursor per request
+        cursor = state["cursor"] if state else None
+        added = 0
+        for _ in range(settings.HISTORY_SYNC_MAX_PAGES):
+            items = await SpotifyService.get_recently_played(access_token, limit=50, after=cursor)
+            added += await asyncio.to_thread(listening_history.add_plays, user_id, items)
+            newest = max((played_at_to_ms(item["played_at"]) for item in items), default=None)
+            if len(items) < 50 or newest is None or (cursor is not None and newest <= cursor):
+                break
+            cursor = newest
+        
+        if not added and state:
+            # Record the sync even when nothing new was played
+            await asyncio.to_thread(listening_history.add_plays, user_id, [])
+        else:
+            await SpotifyService.update_mood_profile(access_token, user_id)
+            await SpotifyService.update_mood_clusters(access_token, user_id)
+        return added
+    
+    @staticmethod
+    async def update_mood_profile(
+        access_token: str,
+        user_id: str,
+        tz: Optional[str] = None
+    ) -> MoodProfileStats:
+        """Fold plays stored since the last update into the user's running statistics
+        
+        Only the new plays' features are resolved, so the cost is
+        proportional to the delta rather than to the whole history. A
+        change of timezone, or statistics saved before the median sketch,
+        rebuild from the full history.
         
         Args:
-            access_token: Spotify access token
-            days: Number of days of history to analyze
+            tz: IANA zone to bucket by; defaults to the profile's current one
         """
-        # Get recently played tracks
-        recent_tracks = SpotifyService.get_recently_played(access_token, limit=50)
+        stats = await asyncio.to_thread(mood_profiles.get, user_id)
+        tz = tz or (stats.timezone if stats else settings.DEFAULT_TIMEZONE)
+        if stats and needs_rebuild(stats, tz):
+            stats = None
+        cursor = stats.cursor if stats else -1
+        timestamps, track_indexes = listening_history.get_window(user_id, cursor + 1)
+        if stats and len(timestamps) == 0:
+            return stats
         
-        # Initialize time segments
-        time_segments = {segment: [] for segment in SpotifyService.TIME_SEGMENTS.keys()}
+        unique_indexes, inverse = np.unique(track_indexes, return_inverse=True)
+        features = await SpotifyService.get_audio_features(
+            access_token, listening_history.track_ids(unique_indexes)
+        )
+        matrix = build_feature_matrix(features)[inverse]
+        bucketer = SpotifyService.time_bucketer(tz)
+        segments, n_segments = bucketer.buckets(timestamps, "segment")
+        return await asyncio.to_thread(
+            mood_profiles.update,
+            user_id,
+            n_segments,
+            tz,
+            np.array(timestamps),
+            matrix,
+            segments,
+            bucketer.local_ms(timestamps) // DAY_MS
+        )
+    
+    @staticmethod
+    async def update_mood_clusters(access_token: str, user_id: str, k: Optional[int] = None) -> MoodClusters:
+        """Fold plays stored since the last update into the user's mood clusters
         
-        # Process each track
-        for item in recent_tracks:
-            played_at = datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
-            hour = played_at.hour
-            
-            # Determine time segment
-            for segment, (start, end) in SpotifyService.TIME_SEGMENTS.items():
-                if start <= hour < end or (start > end and (hour >= start or hour < end)):
-                    time_segments[segment].append(item["track"])
-                    break
+        Args:
+            k: Number of clusters to store; defaults to the stored model's
+                (or MOOD_CLUSTERS_K), and a different value refits the
+                clusters and replaces the stored choice
+        """
+        clusters = await asyncio.to_thread(mood_clusters.get, user_id)
+        k = k or (clusters.k if clusters else settings.MOOD_CLUSTERS_K)
+        cursor = clusters.cursor if clusters else -1
+        timestamps, track_indexes = listening_history.get_window(user_id, cursor + 1)
+        if clusters and clusters.k == k and len(timestamps) == 0:
+            return clusters
         
-        return time_segments
+        unique_indexes, inverse = np.unique(track_indexes, return_inverse=True)
+        features = await SpotifyService.get_audio_features(
+            access_token, listening_history.track_ids(unique_indexes)
+        )
+        matrix = build_feature_matrix(features)[inverse]
+        return await asyncio.to_thread(
+            mood_clusters.update,
+            user_id,
+            k,
+            np.array(timestamps),
+            np.array(track_indexes),
+            matrix
+        )
     
     @staticmethod
-    def analyze_time_segment(access_token: str, tracks: List[Dict[str, Any]]) -> Dict[str, float]:
-        """Analyze audio features for a time segment
+    async def analyze_mood_clusters(
+        access_token: str,
+        user_id: str,
+        k: Optional[int] = None,
+        tracks_per_cluster: int = 5
+    ) -> Dict[str, Any]:
+        """The user's listening modes: centroid features, share of plays and representative tracks
         
         Args:
             access_token: Spotify access token
-            tracks: List of tracks to analyze
+            user_id: Spotify user ID whose stored history is clustered
+            k: Number of clusters for this analysis only; defaults to the
+                stored model's, and a different value is refit on a copy
+                without replacing it (see update_mood_clusters)
+            tracks_per_cluster: Most-played member tracks returned per cluster
+        
+        Returns:
+            Clusters ordered by share of plays, largest first; each lists
+            its top tracks as {plays, track} items
         """
-        if not tracks:
-            return {}
-        
-        # Get track IDs
-        track_ids = [track["id"] for track in tracks if track["id"]]
-        
-        # Get audio features
-        features = SpotifyService.get_audio_features(access_token, track_ids)
-        
-        # Calculate averages for each feature
-        feature_sums = {
-            "valence": 0,
-            "energy": 0,
-            "danceability": 0,
-            "tempo": 0,
-            "instrumentalness": 0,
-            "acousticness": 0,
-            "speechiness": 0,
-            "liveness": 0
+        await SpotifyService.sync_listening_history(access_token, user_id)
+        clusters = await SpotifyService.update_mood_clusters(access_token, user_id)
+        if k and k != clusters.k:
+            clusters = await asyncio.to_thread(clusters.with_k, k)
+        
+        labels, distances = clusters.assign()
+        n_clusters = len(clusters.centroids)
+        plays = np.bincount(labels, weights=clusters.plays, minlength=n_clusters)
+        members = np.bincount(labels, minlength=n_clusters)
+        total_plays = float(plays.sum())
+        centroids = clusters.centroid_features()
+        
+        # Most-played members first, closest to the centroid breaking ties
+        order = np.lexsort((distances, -clusters.plays, labels))
+        starts = np.concatenate(([0], np.cumsum(members)[:-1]))
+        top = [order[start:start + min(count, tracks_per_cluster)] for start, count in zip(starts, members)]
+        track_ids = listening_history.track_ids(clusters.track_indexes[np.concatenate(top)]) if top else []
+        tracks = await asyncio.to_thread(listening_history.get_tracks, track_ids)
+        track_ids = iter(track_ids)
+        
+        results = []
+        for cluster, positions in enumerate(top):
+            cluster_tracks = []
+            for position in positions:
+                track = tracks.get(next(track_ids))
+                if track is not None:
+                    cluster_tracks.append({"plays": int(clusters.plays[position]), "track": track})
+            results.append({
+                "cluster": cluster,
+                "share": float(plays[cluster] / total_plays) if total_plays else 0.0,
+                "plays": int(plays[cluster]),
+                "track_count": int(members[cluster]),
+                "centroid": {key: float(centroids[cluster, column]) for column, key in enumerate(FEATURE_KEYS)},
+                "tracks": cluster_tracks
+            })
+        results.sort(key=lambda result: result["plays"], reverse=True)
+        
+        return {
+            "k": clusters.k,
+            "track_count": len(clusters.plays),
+            "plays": int(total_plays),
+            "clusters": results
         }
+    
+    @staticmethod
+    async def get_mood_curve(
+        access_token: str,
+        user_id: str,
+        days: int = settings.COMPATIBILITY_CURVE_DAYS,
+        tz: Optional[str] = None
+    ) -> np.ndarray:
+        """The user's 24-hour mood curve over the last `days` days of stored history
+        
+        Returns:
+            (CURVE_KEYS x 24) mean features per local hour of day
+        """
+        bucketer = SpotifyService.time_bucketer(tz)
+        await SpotifyService.sync_listening_history(access_token, user_id)
+        since_day = bucketer.local_day(time.time() * 1000) - days
+        timestamps, track_indexes = listening_history.get_window(user_id, bucketer.day_start_ms(since_day))
         
-        for feature in features:
-            for key in feature_sums.keys():
-                if key in feature:
-                    feature_sums[key] += feature[key]
+        unique_indexes, inverse = np.unique(track_indexes, return_inverse=True)
+        features = await SpotifyService.get_audio_features(
+            access_token, listening_history.track_ids(unique_indexes)
+        )
+        matrix = build_feature_matrix(features, CURVE_KEYS)[inverse]
+        hours, _ = bucketer.buckets(timestamps, "hour")
+        return build_mood_curve(hours, matrix)
+    
+    @staticmethod
+    def time_bucketer(tz: Optional[str] = None) -> TimeBucketer:
+        """Time bucketing in the given IANA zone over TIME_SEGMENTS
         
-        # Calculate averages
-        count = len(features)
-        if count > 0:
-            return {key: value/count for key, value in feature_sums.items()}
+        Raises:
+            ValueError: If the timezone is unknown
+        """
+        return TimeBucketer(tz or settings.DEFAULT_TIMEZONE, SpotifyService.TIME_SEGMENTS)
+    
+    @staticmethod
+    async def analyze_time_window(
+        access_token: str,
+        user_id: str,
+        days: int = 7,
+        sample_size: int = 5,
+        tz: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Analyze the user's stored history for the last `days` days by time segment
+        
+        Statistics come from the materialized running aggregates, so they
+        are read in time proportional to the number of days rather than the
+        number of plays. Segments and days are in the user's timezone `tz`, and
+        the window starts at local midnight `days` days ago.
+        
+        Returns:
+            Per non-empty segment: track_count, features (means), statistics
+            (mean, std, approximate median, weighted_mean and count) and the
+            `sample_size` most recent tracks
+        """
+        return {
+            segment: analysis
+            async for segment, analysis in SpotifyService.iter_time_window(
+                access_token, user_id, days, sample_size, tz
+            )
+        }
+    
+    @staticmethod
+    async def iter_time_window(
+        access_token: str,
+        user_id: str,
+        days: int = 7,
+        sample_size: int = 5,
+        tz: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (segment, analysis) for each non-empty segment as soon as it is ready
+        
+        See `analyze_time_window`; each segment's sample tracks are looked
+        up separately so the first segment doesn't wait for the rest.
+        """
+        bucketer = SpotifyService.time_bucketer(tz)
+        await SpotifyService.sync_listening_history(access_token, user_id)
+        stats = await SpotifyService.update_mood_profile(access_token, user_id, bucketer.tz_name)
         
-        return {} 
\ No newline at end of file
+        now_ms = time.time() * 1000
+        since_day = bucketer.local_day(now_ms) - days
+        statistics = stats.window(since_day, now_ms)
+        if not statistics["rows"].any():
+            return
+        
+        segments = list(SpotifyService.TIME_SEGMENTS.keys())
+        segment_statistics = statistics_by_group(statistics, segments)
+        samples = SpotifyService._recent_samples(
+            user_id, bucketer, bucketer.day_start_ms(since_day), statistics["rows"], sample_size
+        )
+        
+        for index, segment in enumerate(segments):
+            if not statistics["rows"][index]:
+                continue
+            tracks = await asyncio.to_thread(
+                listening_history.get_tracks, [track_id for track_id, _ in samples[index]]
+            )
+            yield segment, {
+                "track_count": int(statistics["rows"][index]),
+                "features": segment_statistics[segment].get("mean", {}),
+                "statistics": segment_statistics[segment],
+                "tracks": [
+                    {**tracks[track_id], "played_at": ms_to_played_at(played_at)}
+                    for track_id, played_at in samples[index]
+                    if track_id in tracks
+                ]
+            }
+    
+    @staticmethod
+    def _recent_samples(
+        user_id: str,
+        bucketer: TimeBucketer,
+        since_ms: int,
+        rows: np.ndarray,
+        sample_size: int
+    ) -> List[List[Any]]:
+        """The most recent (track_id, played_at) plays of each segment, newest first
+        
+        Scans backwards from the newest play over a growing tail of the
+        play log, so only as many plays are bucketed as the samples need.
+        """
+        timestamps, track_indexes = listening_history.get_window(user_id, since_ms)
+        wanted = np.minimum(rows, sample_size)
+        tail = sample_size * len(rows) * 4
+        while True:
+            tail = min(tail, len(timestamps))
+            recent = timestamps[len(timestamps) - tail:][::-1]
+            groups, _ = bucketer.buckets(recent, "segment")
+            if tail == len(timestamps) or (np.bincount(groups, minlength=len(rows)) >= wanted).all():
+                break
+            tail *= 4
+        
+        # Newest-first positions grouped by segment
+        order = np.argsort(groups, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(np.bincount(groups, minlength=len(rows)))[:-1]))
+        positions = [order[start:start + count] for start, count in zip(starts, wanted)]
+        
+        rows_index = len(timestamps) - 1 - np.concatenate(positions)
+        track_ids = iter(listening_history.track_ids(track_indexes[rows_index]))
+        return [
+            [(next(track_ids), int(recent[position])) for position in segment_positions]
+            for segment_positions in positions
+        ]
+    
+    @staticmethod
+    async def analyze_time_buckets(
+        access_token: str,
+        user_id: str,
+        granularity: str = "hour_of_week",
+        days: int = 28,
+        tz: Optional[str] = None,
+        window_days: int = 7
+    ) -> Dict[str, Any]:
+        """Play counts and mean features per time bucket in the user's local time
+        
+        Args:
+            access_token: Spotify access token
+            user_id: Spotify user ID whose stored history is read
+            granularity: segment (8 segments), hour (24-hour curve),
+                hour_of_week (168-cell heatmap) or rolling (consecutive
+                `window_days` windows ending now)
+            days: Number of days of history to analyze
+            tz: IANA zone whose local time defines the buckets
+            window_days: Rolling window length in days
+        
+        Returns:
+            Bucket labels, play counts and per-feature mean lists, all in
+            bucket order
+        """
+        bucketer = SpotifyService.time_bucketer(tz)
+        await SpotifyService.sync_listening_history(access_token, user_id)
+        
+        now_ms = time.time() * 1000
+        timestamps, track_indexes = listening_history.get_window(user_id, int(now_ms - days * DAY_MS))
+        groups, n_buckets = bucketer.buckets(timestamps, granularity, now_ms, window_days)
+        
+        unique_indexes, inverse = np.unique(track_indexes, return_inverse=True)
+        features = await SpotifyService.get_audio_features(
+            access_token, listening_history.track_ids(unique_indexes)
+        )
+        matrix = build_feature_matrix(features)[inverse]
+        statistics = grouped_statistics(matrix, groups, n_buckets)
+        
+        means = np.where(statistics["count"] > 0, statistics["mean"], np.nan)
+        return {
+            "granularity": granularity,
+            "timezone": bucketer.tz_name,
+            "labels": bucketer.labels(granularity, n_buckets, now_ms, window_days),
+            "play_counts": statistics["rows"].tolist(),
+            "features": {
+                key: [None if np.isnan(value) else float(value) for value in means[:, column]]
+                for column, key in enumerate(FEATURE_KEYS)
+            }
+        }
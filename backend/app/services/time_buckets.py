@@ -0,0 +1,159 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import numpy as np
+
+HOUR_MS = 3_600_000
+DAY_MS = 86_400_000
+
+# Every offset change in the tz database falls on a quarter hour
+OFFSET_RESOLUTION_MS = 900_000
+
+GRANULARITIES = ("segment", "hour", "hour_of_week", "rolling")
+
+# 1970-01-01 was a Thursday; weeks start on Monday
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+EPOCH_WEEKDAY = 3
+
+def get_timezone(name: str) -> ZoneInfo:
+    """Look up an IANA timezone name
+
+    Raises:
+        ValueError: If the timezone is unknown
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+def segment_lookup(time_segments: Dict[str, Tuple[int, int]]) -> np.ndarray:
+    """Segment index for each hour of the day, in `time_segments` order
+
+    Segments are (start, end) hours; a segment with start > end wraps
+    past midnight.
+    """
+    lookup = np.zeros(24, dtype=np.intp)
+    for index, (start, end) in enumerate(time_segments.values()):
+        hours = range(start, end) if start < end else list(range(start, 24)) + list(range(0, end))
+        lookup[list(hours)] = index
+    return lookup
+
+class TimeBucketer:
+    """Assigns plays to time buckets in a user's local time
+
+    UTC offsets are resolved once per distinct UTC day in the input rather
+    than per play, falling back to quarter hours only on days when the
+    offset changes (DST), and each granularity is a lookup-table or
+    integer-arithmetic pass over the resulting local timestamps.
+    """
+
+    def __init__(self, tz_name: str, time_segments: Dict[str, Tuple[int, int]]):
+        self.tz_name = tz_name
+        self.tz = get_timezone(tz_name)
+        self.time_segments = time_segments
+        self._segments = segment_lookup(time_segments)
+
+    def local_ms(self, timestamps: np.ndarray) -> np.ndarray:
+        """Epoch-ms timestamps shifted by the zone's UTC offset at each instant"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if self.tz_name == "UTC" or len(timestamps) == 0:
+            return timestamps
+
+        days, day_index = np.unique(timestamps // DAY_MS, return_inverse=True)
+        start = self._offsets(days * DAY_MS)
+        end = self._offsets((days + 1) * DAY_MS - 1)
+        offsets = start[day_index]
+
+        changing = (start != end)[day_index]
+        if changing.any():
+            quarters, quarter_index = np.unique(timestamps[changing] // OFFSET_RESOLUTION_MS, return_inverse=True)
+            offsets[changing] = self._offsets(quarters * OFFSET_RESOLUTION_MS)[quarter_index]
+        return timestamps + offsets
+
+    def _offsets(self, instants_ms: np.ndarray) -> np.ndarray:
+        return np.fromiter(
+            (
+                datetime.fromtimestamp(int(instant) // 1000, tz=self.tz).utcoffset().total_seconds() * 1000
+                for instant in instants_ms
+            ),
+            dtype=np.int64,
+            count=len(instants_ms)
+        )
+
+    def local_day(self, timestamp_ms: float) -> int:
+        """Local calendar day (days since the epoch) of an instant"""
+        return int(self.local_ms(np.array([int(timestamp_ms)]))[0] // DAY_MS)
+
+    def day_start_ms(self, day: int) -> int:
+        """Epoch ms of local midnight at the start of a local day"""
+        start = datetime.combine(date(1970, 1, 1) + timedelta(days=day), time(), tzinfo=self.tz)
+        return int(start.timestamp() * 1000)
+
+    def buckets(
+        self,
+        timestamps: np.ndarray,
+        granularity: str,
+        now_ms: Optional[float] = None,
+        window_days: int = 7
+    ) -> Tuple[np.ndarray, int]:
+        """Bucket index of each play and the number of buckets
+
+        Args:
+            timestamps: Play times in epoch ms (UTC)
+            granularity: segment, hour, hour_of_week or rolling
+            now_ms: End of the newest rolling window (rolling only)
+            window_days: Rolling window length in days (rolling only)
+        """
+        return self.bucket_all(timestamps, now_ms, window_days, (granularity,))[granularity]
+
+    def bucket_all(
+        self,
+        timestamps: np.ndarray,
+        now_ms: Optional[float] = None,
+        window_days: int = 7,
+        granularities: Tuple[str, ...] = GRANULARITIES
+    ) -> Dict[str, Tuple[np.ndarray, int]]:
+        """Bucket indexes for several granularities from a single local-time conversion"""
+        local = self.local_ms(timestamps)
+        hour = (local // HOUR_MS) % 24
+        result = {}
+        for granularity in granularities:
+            if granularity == "segment":
+                result[granularity] = (self._segments[hour], len(self.time_segments))
+            elif granularity == "hour":
+                result[granularity] = (hour.astype(np.intp), 24)
+            elif granularity == "hour_of_week":
+                weekday = (local // DAY_MS + EPOCH_WEEKDAY) % 7
+                result[granularity] = ((weekday * 24 + hour).astype(np.intp), 168)
+            elif granularity == "rolling":
+                # Window 0 ends now; window i covers [now - (i + 1) * w, now - i * w)
+                end = now_ms if now_ms is not None else int(np.max(timestamps, initial=0)) + 1
+                window = np.maximum(end - np.asarray(timestamps), 0) // (window_days * DAY_MS)
+                window = window.astype(np.intp)
+                result[granularity] = (window, int(window.max(initial=-1)) + 1)
+            else:
+                raise ValueError(f"Unknown granularity: {granularity}")
+        return result
+
+    def labels(
+        self,
+        granularity: str,
+        n_buckets: int,
+        now_ms: Optional[float] = None,
+        window_days: int = 7
+    ) -> List[str]:
+        """Display labels for the buckets of a granularity
+
+        Rolling windows are labelled with the local date they start on.
+        """
+        if granularity == "segment":
+            return list(self.time_segments.keys())
+        if granularity == "hour":
+            return [f"{hour:02d}:00" for hour in range(24)]
+        if granularity == "hour_of_week":
+            return [f"{day} {hour:02d}:00" for day in WEEKDAYS for hour in range(24)]
+        end = now_ms if now_ms is not None else datetime.now(timezone.utc).timestamp() * 1000
+        return [
+            datetime.fromtimestamp((end - (index + 1) * window_days * DAY_MS) / 1000, tz=self.tz).date().isoformat()
+            for index in range(n_buckets)
+        ]
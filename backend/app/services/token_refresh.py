@@ -0,0 +1,136 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from ..core.config import settings
+from ..core.session import Session, SessionStore, session_store
+from .spotify import SpotifyService
+
+logger = logging.getLogger(__name__)
+
+class TokenRefreshManager:
+    """Refreshes Spotify access tokens shortly before they expire
+
+    Sessions are tracked in a heap ordered by token expiry. A background
+    loop refreshes tokens that are within `margin` seconds of expiring for
+    sessions that were active recently, so requests keep finding a valid
+    token. Each session has at most one refresh in flight; concurrent
+    requests share it.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        margin: float = settings.TOKEN_REFRESH_MARGIN,
+        interval: float = settings.TOKEN_REFRESH_INTERVAL,
+        idle_timeout: float = settings.TOKEN_REFRESH_IDLE_TIMEOUT
+    ):
+        self.store = store
+        self.margin = margin
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self._deadlines: List[Tuple[float, str]] = []
+        self._last_seen: Dict[str, float] = {}
+        self._inflight: Dict[str, "asyncio.Task[Session]"] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def track(self, session: Session) -> None:
+        """Schedule a session's token for refresh before it expires"""
+        self._last_seen[session.session_id] = time.time()
+        heapq.heappush(self._deadlines, (session.expires_at, session.session_id))
+
+    async def ensure_fresh(self, session: Session) -> Session:
+        """Make sure the request gets a usable token
+
+        A token close to expiry is refreshed in the background while the
+        request carries on with the still-valid one. Only an already expired
+        token makes the request wait, and then only for the shared refresh.
+        """
+        now = time.time()
+        if session.session_id not in self._last_seen:
+            self.track(session)
+        self._last_seen[session.session_id] = now
+
+        remaining = session.expires_at - now
+        if remaining > self.margin:
+            return session
+
+        task = self.refresh(session)
+        if remaining > 0:
+            return session
+        return await asyncio.shield(task)
+
+    def refresh(self, session: Session) -> "asyncio.Task[Session]":
+        """Start a refresh for the session, or join the one already running"""
+        task = self._inflight.get(session.session_id)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(session))
+            self._inflight[session.session_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(session.session_id, None))
+        return task
+
+    async def _refresh(self, session: Session) -> Session:
+        # Another worker may have refreshed (or logged out) this session already
+        latest = await self.store.reload(session.session_id)
+        if latest is None:
+            return session
+        if latest.expires_at - time.time() > self.margin:
+            self.track(latest)
+            return latest
+        session = latest
+
+        token_data = await SpotifyService.refresh_token(session.refresh_token)
+        if "access_token" not in token_data:
+            logger.warning("Token refresh failed for session of %s: %s", session.user_id, token_data.get("error"))
+            return session
+
+        # Update in place so every holder of this session sees the new token
+        session.access_token = token_data["access_token"]
+        session.expires_at = time.time() + token_data.get("expires_in", 3600)
+        # Spotify only sometimes rotates the refresh token
+        session.refresh_token = token_data.get("refresh_token", session.refresh_token)
+        await self.store.save(session)
+        self.track(session)
+        return session
+
+    async def run(self) -> None:
+        """Background loop that refreshes tokens nearing expiry"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._refresh_due()
+            except Exception:
+                logger.exception("Background token refresh failed")
+
+    async def _refresh_due(self) -> None:
+        now = time.time()
+        while self._deadlines and self._deadlines[0][0] - self.margin <= now:
+            expires_at, session_id = heapq.heappop(self._deadlines)
+
+            last_seen = self._last_seen.get(session_id, 0)
+            if now - last_seen > self.idle_timeout:
+                # Idle sessions refresh on their next request instead
+                self._last_seen.pop(session_id, None)
+                continue
+
+            session = await self.store.get(session_id)
+            if session is None or session.expires_at != expires_at:
+                # Logged out, or already refreshed and re-tracked
+                continue
+            self.refresh(session)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+token_refresh = TokenRefreshManager(session_store)
@@ -0,0 +1,319 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from ..core.config import settings
+from .aggregation import FEATURE_KEYS, top_k
+from .registry import RegistryFollower, registry, unpack_arrays
+
+# Time segments in mood-vector order (matches SpotifyService.TIME_SEGMENTS)
+SEGMENT_KEYS = (
+    "early_morning",
+    "morning",
+    "midday",
+    "afternoon",
+    "evening",
+    "late_evening",
+    "night",
+    "late_night"
+)
+
+# Divisors that bring every feature roughly into [0, 1]
+FEATURE_SCALE = np.array([250.0 if key == "tempo" else 1.0 for key in FEATURE_KEYS], dtype=np.float32)
+
+METRICS = ("cosine", "euclidean")
+
+def build_mood_vector(segment_means: Dict[str, Dict[str, Optional[float]]]) -> np.ndarray:
+    """Flatten per-segment mean features into one (segments x features) mood vector
+
+    Segments or features without data fall back to the user's mean across
+    the segments that have it, so sparse listeners still compare sensibly.
+    """
+    matrix = np.full((len(SEGMENT_KEYS), len(FEATURE_KEYS)), np.nan, dtype=np.float32)
+    for row, segment in enumerate(SEGMENT_KEYS):
+        means = segment_means.get(segment) or {}
+        for column, key in enumerate(FEATURE_KEYS):
+            value = means.get(key)
+            if value is not None:
+                matrix[row, column] = value
+
+    matrix /= FEATURE_SCALE
+    present = (~np.isnan(matrix)).sum(axis=0)
+    overall = np.nansum(matrix, axis=0) / np.maximum(present, 1)
+    matrix = np.where(np.isnan(matrix), overall, matrix)
+    return matrix.ravel()
+
+class VectorBlock:
+    """Contiguous float32 rows with O(1) insert and swap-remove by ID"""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.dim = dim
+        self.size = 0
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.units = np.zeros((capacity, dim), dtype=np.float32)
+        self.sq_norms = np.zeros(capacity, dtype=np.float32)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.rows
+
+    def add(self, item_id: str, vector: np.ndarray) -> None:
+        if item_id in self.rows:
+            self._write(self.rows[item_id], vector)
+            return
+        if self.size == len(self.vectors):
+            self._grow()
+        self._write(self.size, vector)
+        self.rows[item_id] = self.size
+        self.ids.append(item_id)
+        self.size += 1
+
+    def remove(self, item_id: str) -> bool:
+        row = self.rows.pop(item_id, None)
+        if row is None:
+            return False
+
+        # Move the last row into the hole so the block stays contiguous
+        last = self.size - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self.vectors[row] = self.vectors[last]
+            self.units[row] = self.units[last]
+            self.sq_norms[row] = self.sq_norms[last]
+            self.ids[row] = moved_id
+            self.rows[moved_id] = row
+        self.ids.pop()
+        self.size = last
+        return True
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        row = self.rows.get(item_id)
+        return None if row is None else self.vectors[row].copy()
+
+    def scores(self, query: np.ndarray, metric: str) -> np.ndarray:
+        """Similarity of the query to every row; higher is closer"""
+        if metric == "cosine":
+            norm = np.linalg.norm(query)
+            unit = query / norm if norm else query
+            return self.units[:self.size] @ unit
+        # Negative squared Euclidean distance via |q|^2 + |x|^2 - 2 q.x
+        return 2 * (self.vectors[:self.size] @ query) - self.sq_norms[:self.size] - float(query @ query)
+
+    def _write(self, row: int, vector: np.ndarray) -> None:
+        norm = float(np.linalg.norm(vector))
+        self.vectors[row] = vector
+        self.units[row] = vector / norm if norm else vector
+        self.sq_norms[row] = norm * norm
+
+    def _grow(self) -> None:
+        capacity = len(self.vectors) * 2
+        for name in ("vectors", "units"):
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        sq_norms[:self.size] = self.sq_norms[:self.size]
+        self.sq_norms = sq_norms
+
+class BruteForceIndex:
+    """Exact nearest-neighbour search over every stored vector"""
+
+    def __init__(self, dim: int):
+        self.block = VectorBlock(dim)
+
+    def __len__(self) -> int:
+        return len(self.block)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.block
+
+    def add(self, item_id: str, vector: np.ndarray) -> None:
+        self.block.add(item_id, vector)
+
+    def remove(self, item_id: str) -> bool:
+        return self.block.remove(item_id)
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        return self.block.get(item_id)
+
+    def items(self) -> List[Tuple[str, np.ndarray]]:
+        return [(item_id, self.block.vectors[row]) for item_id, row in self.block.rows.items()]
+
+    def search(self, query: np.ndarray, k: int, metric: str = "cosine") -> List[Tuple[str, float]]:
+        return top_k(self.block.ids, self.block.scores(query, metric), k)
+
+class IVFIndex:
+    """Inverted-file index: vectors are partitioned by their nearest k-means centroid
+
+    Queries only scan the `nprobe` partitions whose centroids are closest,
+    trading a little recall for scanning a small fraction of the users.
+    Inserts and removals touch a single partition; no rebuild is needed.
+    """
+
+    def __init__(self, dim: int, centroids: np.ndarray, nprobe: int):
+        self.dim = dim
+        self.centroids = centroids.astype(np.float32)
+        self.nprobe = min(nprobe, len(centroids))
+        self.lists = [VectorBlock(dim) for _ in range(len(centroids))]
+        self.assignment: Dict[str, int] = {}
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int, nprobe: int, iterations: int = 10, seed: int = 0) -> "IVFIndex":
+        """Fit the coarse centroids with a few rounds of vectorized k-means on a sample"""
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(nlist, len(vectors)))
+        sample_size = min(len(vectors), 64 * nlist)
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = vectors[:nlist].astype(np.float32)
+        for _ in range(iterations):
+            labels = cls._nearest(centroids, vectors)
+            counts = np.bincount(labels, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, vectors)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        return cls(vectors.shape[1], centroids, nprobe)
+
+    @staticmethod
+    def _nearest(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        distances = (
+            np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            - 2 * vectors @ centroids.T
+        )
+        return np.argmin(distances, axis=1)
+
+    def __len__(self) -> int:
+        return len(self.assignment)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.assignment
+
+    def add(self, item_id: str, vector: np.ndarray) -> None:
+        self.remove(item_id)
+        partition = int(self._nearest(self.centroids, vector[None, :])[0])
+        self.lists[partition].add(item_id, vector)
+        self.assignment[item_id] = partition
+
+    def add_many(self, item_ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Bulk insert with one vectorized partition assignment"""
+        partitions = self._nearest(self.centroids, vectors)
+        for item_id, vector, partition in zip(item_ids, vectors, partitions):
+            self.remove(item_id)
+            self.lists[partition].add(item_id, vector)
+            self.assignment[item_id] = int(partition)
+
+    def remove(self, item_id: str) -> bool:
+        partition = self.assignment.pop(item_id, None)
+        if partition is None:
+            return False
+        return self.lists[partition].remove(item_id)
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        partition = self.assignment.get(item_id)
+        return None if partition is None else self.lists[partition].get(item_id)
+
+    def items(self) -> List[Tuple[str, np.ndarray]]:
+        return [
+            (item_id, block.vectors[row])
+            for block in self.lists
+            for item_id, row in block.rows.items()
+        ]
+
+    def search(self, query: np.ndarray, k: int, metric: str = "cosine") -> List[Tuple[str, float]]:
+        probes = np.argsort(self._nearest_distances(query))[:self.nprobe]
+        ids: List[str] = []
+        scores = []
+        for partition in probes:
+            block = self.lists[partition]
+            if len(block):
+                ids.extend(block.ids)
+                scores.append(block.scores(query, metric))
+        if not scores:
+            return []
+        return top_k(ids, np.concatenate(scores), k)
+
+    def _nearest_distances(self, query: np.ndarray) -> np.ndarray:
+        return np.einsum("ij,ij->i", self.centroids, self.centroids) - 2 * self.centroids @ query
+
+class TwinsIndex:
+    """Sonic Twins similarity index over users' per-segment mood vectors
+
+    Starts as an exact brute-force index and switches to an IVF index once
+    the user count passes `ivf_threshold`. The IVF centroids are retrained
+    on insert only once the population has grown by `retrain_factor` since
+    the last training, so the rebuild cost is amortized over many inserts.
+    """
+
+    def __init__(
+        self,
+        dim: int = len(SEGMENT_KEYS) * len(FEATURE_KEYS),
+        ivf_threshold: int = settings.TWINS_IVF_THRESHOLD,
+        nprobe: int = settings.TWINS_IVF_NPROBE,
+        retrain_factor: float = 4.0
+    ):
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.retrain_factor = retrain_factor
+        self.index = BruteForceIndex(dim)
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.index
+
+    def upsert(self, user_id: str, vector: np.ndarray) -> None:
+        """Insert or replace a user's mood vector"""
+        self.index.add(user_id, np.asarray(vector, dtype=np.float32))
+        if len(self.index) >= max(self.ivf_threshold, self._trained_size * self.retrain_factor):
+            self._train()
+
+    def remove(self, user_id: str) -> bool:
+        """Remove a user; returns False if they were not indexed"""
+        return self.index.remove(user_id)
+
+    def get(self, user_id: str) -> Optional[np.ndarray]:
+        return self.index.get(user_id)
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int = 10,
+        metric: str = "cosine",
+        exclude: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Find the `k` users whose mood vectors are closest to `vector`
+
+        Scores are cosine similarity, or negative Euclidean distance.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        vector = np.asarray(vector, dtype=np.float32)
+        matches = self.index.search(vector, k + 1 if exclude else k, metric)
+        if metric == "euclidean":
+            matches = [(user_id, -float(np.sqrt(max(-score, 0.0)))) for user_id, score in matches]
+        return [(user_id, score) for user_id, score in matches if user_id != exclude][:k]
+
+    def _train(self) -> None:
+        items = self.index.items()
+        vectors = np.stack([vector for _, vector in items])
+        nlist = int(np.sqrt(len(items)))
+        index = IVFIndex.train(vectors, nlist, self.nprobe)
+        index.add_many([user_id for user_id, _ in items], vectors)
+        self.index = index
+        self._trained_size = len(items)
+
+twins_index = TwinsIndex()
+
+def _apply_twins_entry(user_id: str, data: Optional[bytes]) -> None:
+    if data is None:
+        twins_index.remove(user_id)
+    else:
+        twins_index.upsert(user_id, unpack_arrays(data)["vector"])
+
+# Every worker's twins_index follows the same registered users
+twins_registry = RegistryFollower(registry, "twins", _apply_twins_entry)
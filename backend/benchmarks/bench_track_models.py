@@ -0,0 +1,83 @@
+"""Compare building a 50-track response with Pydantic models vs unvalidated records
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_track_models
+"""
+import argparse
+import json
+import random
+import timeit
+from fastapi.encoders import jsonable_encoder
+from app.core.serialization import dumps
+from app.models.records import AudioFeaturesRecord, TrackRecord
+from app.models.spotify import AudioFeatures, Track
+from app.services.projection import project_tracks
+
+MARKETS = [f"M{i}" for i in range(180)]
+
+def spotify_track(i: int) -> dict:
+    """A track shaped like a /me/top/tracks item, with realistic nesting"""
+    return {
+        "id": f"track{i}",
+        "name": f"Track {i}",
+        "uri": f"spotify:track:track{i}",
+        "popularity": random.randint(0, 100),
+        "duration_ms": 200000,
+        "explicit": False,
+        "available_markets": MARKETS,
+        "external_ids": {"isrc": f"ISRC{i}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/track{i}"},
+        "artists": [
+            {"id": f"artist{i}", "name": f"Artist {i}", "type": "artist", "uri": f"spotify:artist:artist{i}",
+             "external_urls": {"spotify": f"https://open.spotify.com/artist/artist{i}"}}
+        ],
+        "album": {
+            "id": f"album{i}",
+            "name": f"Album {i}",
+            "album_type": "album",
+            "release_date": "2024-01-01",
+            "available_markets": MARKETS,
+            "images": [{"url": f"https://i.scdn.co/image/{i}-{size}", "height": size, "width": size} for size in (640, 300, 64)]
+        }
+    }
+
+def spotify_features(i: int) -> dict:
+    return {
+        "id": f"track{i}", "danceability": random.random(), "energy": random.random(), "key": 5,
+        "loudness": -6.0, "mode": 1, "speechiness": 0.05, "acousticness": 0.1, "instrumentalness": 0.0,
+        "liveness": 0.1, "valence": random.random(), "tempo": 120.0, "duration_ms": 200000, "time_signature": 4
+    }
+
+def with_models(tracks, features):
+    """The previous path: validate into Track/AudioFeatures, jsonable_encoder, json.dumps"""
+    result = [
+        Track(**track, audio_features=AudioFeatures(**feature)) if feature else Track(**track)
+        for track, feature in zip(tracks, features)
+    ]
+    return json.dumps(jsonable_encoder(result)).encode()
+
+def with_records(tracks, features):
+    """The current path: unvalidated records, slim projection, orjson"""
+    records = [
+        TrackRecord(track, AudioFeaturesRecord(feature) if feature else None)
+        for track, feature in zip(tracks, features)
+    ]
+    return dumps(project_tracks([record.to_dict() for record in records], None))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    tracks = [spotify_track(i) for i in range(args.tracks)]
+    features = [spotify_features(i) for i in range(args.tracks)]
+
+    for name, build in (("pydantic models", with_models), ("records", with_records)):
+        seconds = min(timeit.repeat(lambda: build(tracks, features), number=args.repeat, repeat=5)) / args.repeat
+        size = len(build(tracks, features))
+        print(f"{name:16} {seconds * 1e6:10.1f} us/response  {size:8d} bytes")
+
+if __name__ == "__main__":
+    main()
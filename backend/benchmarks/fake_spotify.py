@@ -0,0 +1,293 @@
+"""Local stand-in for the Spotify Web API, serving deterministic synthetic data
+
+Run from the backend directory:
+
+    python -m benchmarks.fake_spotify --port 8900 --latency-ms 40 --rate-429 0.01
+
+and start the backend against it:
+
+    SPOTIFY_ACCOUNTS_BASE_URL=http://127.0.0.1:8900 \\
+    SPOTIFY_API_BASE_URL=http://127.0.0.1:8900/v1 python run.py
+
+Any authorization code is accepted; the code becomes the user ID, so
+load tests can log in as many distinct users as they like. Responses
+for a given user are stable across calls, and top tracks carry ETags.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlencode
+import uvicorn
+from fastapi import FastAPI, Header, Request, Response
+from fastapi.responses import JSONResponse, RedirectResponse
+
+@dataclass
+class FaultConfig:
+    latency_ms: float = 0.0            # mean added latency per request
+    jitter_ms: float = 0.0             # uniform +/- spread around the mean
+    rate_429: float = 0.0              # fraction of requests answered with 429
+    retry_after: int = 1               # Retry-After seconds sent with 429s
+    error_rate: float = 0.0            # fraction of requests answered with 503
+    catalog_size: int = 5000           # distinct synthetic tracks
+    plays_per_hour: float = 12.0       # synthetic listening rate for recently-played
+
+def _seed(*parts: Any) -> int:
+    return int.from_bytes(hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=8).digest(), "big")
+
+def _artist(index: int) -> Dict[str, Any]:
+    return {
+        "id": f"artist{index:05d}",
+        "name": f"Artist {index}",
+        "type": "artist",
+        "uri": f"spotify:artist:artist{index:05d}",
+        "genres": ["synthwave", "indie"][: 1 + index % 2],
+        "popularity": index % 100,
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/artist{index:05d}"}
+    }
+
+def _track(index: int) -> Dict[str, Any]:
+    """A track shaped like Spotify's full track object"""
+    track_id = f"track{index:06d}"
+    return {
+        "id": track_id,
+        "name": f"Track {index}",
+        "uri": f"spotify:track:{track_id}",
+        "type": "track",
+        "popularity": _seed("popularity", index) % 100,
+        "duration_ms": 120000 + _seed("duration", index) % 180000,
+        "explicit": False,
+        "available_markets": ["AR", "AU", "BR", "CA", "DE", "ES", "FR", "GB", "JP", "MX", "SE", "US"] * 15,
+        "external_ids": {"isrc": f"QZ{index:010d}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        "artists": [_artist(index % 997)],
+        "album": {
+            "id": f"album{index // 10:05d}",
+            "name": f"Album {index // 10}",
+            "album_type": "album",
+            "release_date": "2024-01-01",
+            "available_markets": ["AR", "AU", "BR", "CA", "DE", "ES", "FR", "GB", "JP", "MX", "SE", "US"] * 15,
+            "images": [
+                {"url": f"https://i.scdn.co/image/album{index // 10}-{size}", "height": size, "width": size}
+                for size in (640, 300, 64)
+            ]
+        }
+    }
+
+def _audio_features(track_id: str) -> Optional[Dict[str, Any]]:
+    if not track_id.startswith("track"):
+        return None
+    rng = random.Random(_seed("features", track_id))
+    return {
+        "id": track_id,
+        "danceability": rng.random(),
+        "energy": rng.random(),
+        "key": rng.randrange(12),
+        "loudness": rng.uniform(-20, 0),
+        "mode": rng.randrange(2),
+        "speechiness": rng.random() * 0.3,
+        "acousticness": rng.random(),
+        "instrumentalness": rng.random() * 0.5,
+        "liveness": rng.random() * 0.4,
+        "valence": rng.random(),
+        "tempo": rng.uniform(60, 200),
+        "duration_ms": 200000,
+        "time_signature": 4
+    }
+
+def create_app(config: FaultConfig) -> FastAPI:
+    app = FastAPI(title="Fake Spotify")
+    tokens: Dict[str, str] = {}        # access token -> user ID
+    refresh_tokens: Dict[str, str] = {}
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        if config.latency_ms or config.jitter_ms:
+            delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+            await asyncio.sleep(max(delay, 0) / 1000)
+        roll = random.random()
+        if roll < config.rate_429:
+            return JSONResponse(
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                status_code=429,
+                headers={"Retry-After": str(config.retry_after)}
+            )
+        if roll < config.rate_429 + config.error_rate:
+            return JSONResponse({"error": {"status": 503, "message": "Service unavailable"}}, status_code=503)
+        return await call_next(request)
+
+    def user_for(authorization: Optional[str]) -> Optional[str]:
+        if not authorization or not authorization.startswith("Bearer "):
+            return None
+        return tokens.get(authorization[len("Bearer "):])
+
+    def unauthorized() -> JSONResponse:
+        return JSONResponse({"error": {"status": 401, "message": "Invalid access token"}}, status_code=401)
+
+    def issue(user_id: str) -> Dict[str, Any]:
+        access_token = secrets.token_urlsafe(24)
+        tokens[access_token] = user_id
+        return {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "scope": "user-top-read user-read-recently-played playlist-modify-private",
+            "expires_in": 3600
+        }
+
+    @app.get("/authorize")
+    async def authorize(redirect_uri: str, state: str = "", user: str = "fake-user"):
+        """Skip the consent screen and redirect straight back with a code"""
+        return RedirectResponse(f"{redirect_uri}?{urlencode({'code': user, 'state': state})}")
+
+    @app.post("/api/token")
+    async def token(request: Request):
+        # Parsed by hand so the fake server doesn't need python-multipart
+        form = {key: values[0] for key, values in parse_qs((await request.body()).decode()).items()}
+        grant_type, code, refresh_token = form.get("grant_type"), form.get("code"), form.get("refresh_token")
+        if grant_type == "authorization_code" and code:
+            body = issue(code)
+            body["refresh_token"] = secrets.token_urlsafe(24)
+            refresh_tokens[body["refresh_token"]] = code
+            return body
+        if grant_type == "refresh_token" and refresh_token in refresh_tokens:
+            return issue(refresh_tokens[refresh_token])
+        return JSONResponse({"error": "invalid_grant", "error_description": "Invalid code"}, status_code=400)
+
+    @app.get("/v1/me")
+    async def me(authorization: Optional[str] = Header(None)):
+        user_id = user_for(authorization)
+        if user_id is None:
+            return unauthorized()
+        return {
+            "id": user_id,
+            "display_name": user_id.title(),
+            "email": f"{user_id}@example.com",
+            "images": [{"url": f"https://i.scdn.co/image/{user_id}", "height": 300, "width": 300}]
+        }
+
+    @app.get("/v1/me/top/tracks")
+    async def top_tracks(
+        time_range: str = "medium_term",
+        limit: int = 20,
+        offset: int = 0,
+        authorization: Optional[str] = Header(None),
+        if_none_match: Optional[str] = Header(None)
+    ):
+        user_id = user_for(authorization)
+        if user_id is None:
+            return unauthorized()
+        etag = f'"{_seed("top", user_id, time_range, limit, offset):x}"'
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        rng = random.Random(_seed("top", user_id, time_range))
+        indexes = rng.sample(range(config.catalog_size), min(offset + limit, config.catalog_size))[offset:]
+        return JSONResponse(
+            {"items": [_track(index) for index in indexes], "limit": limit, "offset": offset, "total": 50},
+            headers={"ETag": etag}
+        )
+
+    @app.get("/v1/audio-features")
+    async def audio_features(ids: str, authorization: Optional[str] = Header(None)):
+        if user_for(authorization) is None:
+            return unauthorized()
+        track_ids = ids.split(",")
+        if len(track_ids) > 100:
+            return JSONResponse({"error": {"status": 400, "message": "Too many ids requested"}}, status_code=400)
+        return {"audio_features": [_audio_features(track_id) for track_id in track_ids]}
+
+    @app.get("/v1/me/player/recently-played")
+    async def recently_played(
+        limit: int = 20,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        authorization: Optional[str] = Header(None)
+    ):
+        """Plays on a fixed per-user grid, so repeated syncs see a stable history"""
+        user_id = user_for(authorization)
+        if user_id is None:
+            return unauthorized()
+        interval_ms = int(3_600_000 / config.plays_per_hour)
+        phase = _seed("phase", user_id) % interval_ms
+        now_ms = int(time.time() * 1000)
+        newest = (now_ms - phase) // interval_ms * interval_ms + phase
+        if before is not None:
+            newest = min(newest, (before - 1 - phase) // interval_ms * interval_ms + phase)
+        # Spotify returns the newest plays first, or the oldest plays after `after`
+        if after is not None:
+            first = (after - phase) // interval_ms * interval_ms + phase + interval_ms
+            played = [first + i * interval_ms for i in range(limit) if first + i * interval_ms <= newest][::-1]
+        else:
+            played = [newest - i * interval_ms for i in range(limit)]
+        items = []
+        for played_at in played:
+            index = _seed("play", user_id, played_at) % config.catalog_size
+            items.append({
+                "track": _track(index),
+                "played_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(played_at / 1000)) + f".{played_at % 1000:03d}Z"
+            })
+        cursors = {"after": str(played[0]), "before": str(played[-1])} if played else None
+        return {"items": items, "limit": limit, "cursors": cursors}
+
+    @app.get("/v1/artists")
+    async def artists(ids: str, authorization: Optional[str] = Header(None)):
+        if user_for(authorization) is None:
+            return unauthorized()
+        return {"artists": [_artist(int(artist_id[len("artist"):])) for artist_id in ids.split(",") if artist_id.startswith("artist")]}
+
+    @app.post("/v1/users/{user_id}/playlists")
+    async def create_playlist(user_id: str, request: Request, authorization: Optional[str] = Header(None)):
+        if user_for(authorization) is None:
+            return unauthorized()
+        body = await request.json()
+        playlist_id = secrets.token_hex(11)
+        return JSONResponse(
+            {
+                "id": playlist_id,
+                "name": body.get("name"),
+                "public": body.get("public", False),
+                "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"}
+            },
+            status_code=201
+        )
+
+    @app.post("/v1/playlists/{playlist_id}/tracks")
+    async def add_tracks(playlist_id: str, request: Request, authorization: Optional[str] = Header(None)):
+        if user_for(authorization) is None:
+            return unauthorized()
+        body = await request.json()
+        if len(body.get("uris", [])) > 100:
+            return JSONResponse({"error": {"status": 400, "message": "Too many tracks"}}, status_code=400)
+        return JSONResponse({"snapshot_id": secrets.token_urlsafe(16)}, status_code=201)
+
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +/- spread around the latency")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--catalog-size", type=int, default=5000)
+    parser.add_argument("--plays-per-hour", type=float, default=12.0)
+    args = parser.parse_args()
+
+    config = FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        catalog_size=args.catalog_size,
+        plays_per_hour=args.plays_per_hour
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
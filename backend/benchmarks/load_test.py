@@ -0,0 +1,175 @@
+"""Drive backend endpoints at fixed concurrency levels and report latency percentiles
+
+Start the fake Spotify server and the backend pointed at it (see
+benchmarks/fake_spotify.py), then run from the backend directory:
+
+    python -m benchmarks.load_test --concurrency 1,10,50 --requests 500 --output results.json
+
+Each user logs in through the normal OAuth callback (the fake server
+accepts any code), and requests are spread round-robin over the users.
+Results are written as JSON so runs can be diffed or plotted.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List
+import httpx
+import numpy as np
+
+# Endpoint name -> (method, path); paths are relative to the API prefix
+ENDPOINTS = {
+    "top": ("GET", "/tracks/top?limit=50"),
+    "top-with-features": ("GET", "/tracks/top-with-features?limit=50"),
+    "top-with-features-stream": ("GET", "/tracks/top-with-features/stream?limit=50"),
+    "recent": ("GET", "/tracks/recent?limit=50"),
+    "time-analysis": ("GET", "/tracks/time-analysis"),
+    "time-buckets": ("GET", "/tracks/time-buckets?granularity=hour_of_week"),
+    "profile": ("GET", "/auth/profile"),
+    "twins-profile": ("POST", "/twins/profile"),
+    "twins": ("GET", "/twins?k=10"),
+    "blend-pool": ("POST", "/blend/pool")
+}
+
+async def login(base_url: str, api_prefix: str, user_id: str, cookie_name: str) -> str:
+    """Log in through the OAuth callback and return the session cookie's value
+
+    The signed value is also accepted as a Bearer token, which lets one
+    shared client send requests as every user. A throwaway client does the
+    login so the cookie doesn't end up in the shared client's jar, where it
+    would override every Bearer header.
+    """
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.get(f"{api_prefix}/auth/callback", params={"code": user_id, "state": "bench"})
+        token = response.cookies.get(cookie_name)
+        if response.status_code not in (200, 307) or token is None:
+            raise RuntimeError(f"Login for {user_id} failed with {response.status_code}: {response.text[:200]}")
+        return token
+
+async def run_level(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    tokens: List[str],
+    concurrency: int,
+    total: int
+) -> Dict[str, Any]:
+    """Send `total` requests with `concurrency` workers and summarize them"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        for index in counter:
+            headers = {"Authorization": f"Bearer {tokens[index % len(tokens)]}"}
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, headers=headers)
+                await response.aread()
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    samples = np.array(latencies) * 1000
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "statuses": statuses,
+        "duration_s": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_ms": {
+            "mean": round(float(samples.mean()), 3),
+            "p50": round(float(np.percentile(samples, 50)), 3),
+            "p95": round(float(np.percentile(samples, 95)), 3),
+            "p99": round(float(np.percentile(samples, 99)), 3),
+            "max": round(float(samples.max()), 3)
+        }
+    }
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    levels = [int(level) for level in args.concurrency.split(",")]
+    endpoints = args.endpoints.split(",") if args.endpoints else list(ENDPOINTS)
+    unknown = [name for name in endpoints if name not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)}. Choose from: {', '.join(ENDPOINTS)}")
+
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        tokens = await asyncio.gather(*(
+            login(args.base_url, args.api_prefix, f"bench-user-{index}", args.cookie_name) for index in range(args.users)
+        ))
+
+        results = []
+        for name in endpoints:
+            method, path = ENDPOINTS[name]
+            url = f"{args.api_prefix}{path}"
+            # One untimed pass per user so first-request sync costs don't skew the levels
+            if args.warmup:
+                await run_level(client, method, url, tokens, min(args.users, max(levels)), args.users)
+            for level in levels:
+                result = {"endpoint": name, "method": method, "path": path, **await run_level(
+                    client, method, url, tokens, level, args.requests
+                )}
+                results.append(result)
+                latency = result["latency_ms"]
+                print(
+                    f"{name:26} c={level:<4} {result['throughput_rps']:9.1f} req/s  "
+                    f"p50={latency['p50']:8.2f}ms p95={latency['p95']:8.2f}ms p99={latency['p99']:8.2f}ms  "
+                    f"errors={result['errors']}"
+                )
+
+    return {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "base_url": args.base_url,
+            "users": args.users,
+            "requests_per_level": args.requests,
+            "concurrency": levels,
+            "warmup": args.warmup
+        },
+        "results": results
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-prefix", default="/api/v1")
+    parser.add_argument("--cookie-name", default="session", help="the backend's SESSION_COOKIE_NAME")
+    parser.add_argument("--endpoints", default="", help=f"comma-separated subset of: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", default="1,10,50", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and level")
+    parser.add_argument("--users", type=int, default=20, help="distinct logged-in users")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,47 @@
+"""Start the Sonic Sync API
+
+    python run.py                 # development: one process with auto-reload
+    python run.py --workers 4     # production: N worker processes
+
+With more than one worker, sessions move to SQLite and Spotify rate
+budgets move to a shared memory-mapped table under DATA_DIR, so every
+worker sees the same logins and together they stay within one budget.
+The audio-feature cache and the Sonic Twins, compatibility and blend
+registrations are always shared through SQLite.
+"""
+import argparse
+import os
 import uvicorn
- 
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Start the Sonic Sync API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, help="run N production workers instead of the reloading dev server")
+    args = parser.parse_args()
+
+    if not args.workers:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    if args.workers > 1:
+        # Workers inherit the environment, so explicit settings still win
+        os.environ.setdefault("SESSION_BACKEND", "sqlite")
+        os.environ.setdefault("SPOTIFY_SHARED_BUDGET", "true")
+
+    # Preload: create data files, SQLite schemas and WAL mode once here, rather
+    # than having every worker race for the write lock on first start
+    from app.core.config import settings
+    import app.main  # noqa: F401
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=settings.SHUTDOWN_GRACE_PERIOD,
+        proxy_headers=True
+    )
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Importing the services creates their stores under DATA_DIR; keep those out of the real one
+os.environ.setdefault("SONIC_SYNC_DATA_DIR", tempfile.mkdtemp(prefix="sonic-sync-tests-"))
+
+# Run from anywhere: `app` lives in the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,68 @@
+import numpy as np
+from app.services.columnar import ColumnarPlayStore, PlayLog, TrackInterner
+
+def test_append_round_trips_through_the_mapped_columns(tmp_path):
+    log = PlayLog(str(tmp_path / "plays"))
+    assert len(log) == 0
+
+    assert log.append(np.array([100, 200, 300]), np.array([1, 2, 3])) == 3
+    assert log.append(np.array([400, 500]), np.array([4, 5])) == 2
+
+    timestamps, tracks = log.columns()
+    np.testing.assert_array_equal(timestamps, [100, 200, 300, 400, 500])
+    np.testing.assert_array_equal(tracks, [1, 2, 3, 4, 5])
+
+    # A fresh handle (another worker) maps the same files
+    timestamps, tracks = PlayLog(str(tmp_path / "plays")).window(200, 500)
+    np.testing.assert_array_equal(timestamps, [200, 300, 400])
+    np.testing.assert_array_equal(tracks, [2, 3, 4])
+
+def test_out_of_order_plays_rewrite_sorted_and_deduplicated(tmp_path):
+    log = PlayLog(str(tmp_path / "plays"))
+    log.append(np.array([100, 300, 500]), np.array([1, 3, 5]))
+    before, _ = log.columns()
+
+    # 300 is already stored; 200 and 400 fall between stored plays
+    assert log.append(np.array([400, 300, 200, 200]), np.array([4, 9, 2, 2])) == 2
+
+    timestamps, tracks = log.columns()
+    np.testing.assert_array_equal(timestamps, [100, 200, 300, 400, 500])
+    np.testing.assert_array_equal(tracks, [1, 2, 3, 4, 5])
+    # Views taken before the rewrite still see the old files
+    np.testing.assert_array_equal(before, [100, 300, 500])
+
+    reopened = PlayLog(str(tmp_path / "plays"))
+    np.testing.assert_array_equal(reopened.columns()[1], [1, 2, 3, 4, 5])
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_repeated_appends_only_add_new_timestamps(tmp_path):
+    log = PlayLog(str(tmp_path / "plays"))
+    log.append(np.array([100, 200]), np.array([1, 2]))
+    assert log.append(np.array([100, 200]), np.array([1, 2])) == 0
+    assert log.append(np.array([]), np.array([])) == 0
+    assert len(log) == 2
+
+def test_interner_indexes_are_stable_and_shared(tmp_path):
+    path = str(tmp_path / "track_ids.txt")
+    first = TrackInterner(path)
+    np.testing.assert_array_equal(first.intern(["a", "b", "a"]), [0, 1, 0])
+
+    # Another worker sees the existing IDs and appends after them
+    second = TrackInterner(path)
+    np.testing.assert_array_equal(second.intern(["c", "b"]), [2, 1])
+
+    # The first picks up IDs it has not seen yet on lookup and intern
+    assert first.lookup([2, 0]) == ["c", "a"]
+    np.testing.assert_array_equal(first.intern(["c"]), [2])
+    assert len(first) == 3
+
+def test_store_closes_evicted_logs_and_remaps_them(tmp_path):
+    store = ColumnarPlayStore(str(tmp_path), max_open=2)
+    for user in ("u1", "u2", "u3"):
+        store.append(user, [1000, 2000], [f"{user}-a", f"{user}-b"])
+
+    assert list(store._logs) == ["u2", "u3"]
+    timestamps, tracks = store.window("u1")
+    np.testing.assert_array_equal(timestamps, [1000, 2000])
+    assert store.interner.lookup(tracks) == ["u1-a", "u1-b"]
+    assert list(store._logs) == ["u3", "u1"]
@@ -0,0 +1,88 @@
+import numpy as np
+from app.services.aggregation import FEATURE_KEYS
+from app.services.mood_stats import SKETCH_BINS, SKETCH_UPPER, MoodProfileStats
+from app.services.time_buckets import DAY_MS
+
+N_SEGMENTS = 4
+N_FEATURES = len(FEATURE_KEYS)
+TEMPO = FEATURE_KEYS.index("tempo")
+
+def random_plays(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    timestamps = np.sort(rng.integers(0, 20 * DAY_MS, n))
+    matrix = rng.beta(2, 5, (n, N_FEATURES))
+    matrix[:, TEMPO] = rng.normal(120, 25, n).clip(40, 240)
+    # Some plays have no features, some lack a single feature
+    matrix[rng.random(n) < 0.05] = np.nan
+    matrix[rng.random((n, N_FEATURES)) < 0.05] = np.nan
+    segments = rng.integers(0, N_SEGMENTS, n)
+    return timestamps, matrix, segments
+
+def batch_statistics(matrix: np.ndarray, segments: np.ndarray):
+    mean = np.array([np.nanmean(matrix[segments == s], axis=0) for s in range(N_SEGMENTS)])
+    std = np.array([np.nanstd(matrix[segments == s], axis=0) for s in range(N_SEGMENTS)])
+    median = np.array([np.nanmedian(matrix[segments == s], axis=0) for s in range(N_SEGMENTS)])
+    count = np.array([(~np.isnan(matrix[segments == s])).sum(axis=0) for s in range(N_SEGMENTS)])
+    return mean, std, median, count
+
+def test_incremental_merge_equals_batch_moments():
+    timestamps, matrix, segments = random_plays(5000)
+
+    stats = MoodProfileStats(N_SEGMENTS)
+    # Uneven chunks, so merges land on days that already hold plays
+    for chunk in np.array_split(np.arange(len(timestamps)), [7, 700, 701, 2900]):
+        stats.ingest(timestamps[chunk], matrix[chunk], segments[chunk])
+
+    window = stats.window(since_day=0, now_ms=20 * DAY_MS)
+    mean, std, _, count = batch_statistics(matrix, segments)
+    np.testing.assert_array_equal(window["count"], count)
+    np.testing.assert_allclose(window["mean"], mean, rtol=1e-9)
+    np.testing.assert_allclose(window["std"], std, rtol=1e-9)
+    np.testing.assert_array_equal(window["rows"], np.bincount(segments, minlength=N_SEGMENTS))
+
+def test_window_only_reads_selected_days():
+    timestamps, matrix, segments = random_plays(3000, seed=1)
+    stats = MoodProfileStats(N_SEGMENTS)
+    stats.ingest(timestamps, matrix, segments)
+
+    recent = timestamps >= 12 * DAY_MS
+    window = stats.window(since_day=12, now_ms=20 * DAY_MS)
+    mean, std, _, _ = batch_statistics(matrix[recent], segments[recent])
+    np.testing.assert_allclose(window["mean"], mean, rtol=1e-9)
+    np.testing.assert_allclose(window["std"], std, rtol=1e-9)
+
+def test_median_sketch_stays_within_one_bin():
+    timestamps, matrix, segments = random_plays(20000, seed=2)
+    stats = MoodProfileStats(N_SEGMENTS)
+    for chunk in np.array_split(np.arange(len(timestamps)), 5):
+        stats.ingest(timestamps[chunk], matrix[chunk], segments[chunk])
+
+    _, _, median, _ = batch_statistics(matrix, segments)
+    error = np.abs(stats.window(since_day=0, now_ms=20 * DAY_MS)["median"] - median)
+    # Linear interpolation inside the median's bin is never off by more than the bin width
+    assert np.all(error <= SKETCH_UPPER / SKETCH_BINS)
+    # With this many plays the interpolation is far tighter than that
+    assert np.all(error[:, np.arange(N_FEATURES) != TEMPO] < 0.01)
+    assert np.all(error[:, TEMPO] < 1.0)
+
+def test_empty_segments_have_no_median():
+    stats = MoodProfileStats(N_SEGMENTS)
+    stats.ingest(np.array([DAY_MS]), np.full((1, N_FEATURES), 0.5), np.array([1]))
+    median = stats.window(since_day=0, now_ms=2 * DAY_MS)["median"]
+    assert np.isnan(median[0]).all()
+    assert np.all(np.abs(median[1] - 0.5) <= SKETCH_UPPER / SKETCH_BINS)
+
+def test_save_and_load_round_trip(tmp_path):
+    timestamps, matrix, segments = random_plays(1000, seed=3)
+    stats = MoodProfileStats(N_SEGMENTS, "Europe/Berlin")
+    stats.ingest(timestamps, matrix, segments)
+    path = str(tmp_path / "profile.npz")
+    stats.save(path)
+
+    loaded = MoodProfileStats.load(path)
+    assert loaded.timezone == "Europe/Berlin"
+    assert loaded.cursor == stats.cursor
+    assert loaded.has_median_sketch
+    expected = stats.window(since_day=0, now_ms=20 * DAY_MS)
+    for key, values in loaded.window(since_day=0, now_ms=20 * DAY_MS).items():
+        np.testing.assert_array_equal(values, expected[key])
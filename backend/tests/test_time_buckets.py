@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from app.services.spotify import SpotifyService
+from app.services.time_buckets import DAY_MS, HOUR_MS, TimeBucketer, segment_lookup
+
+SEGMENTS = SpotifyService.TIME_SEGMENTS
+
+def epoch_ms(year: int, month: int, day: int, hour: int = 0) -> int:
+    return int(datetime(year, month, day, hour, tzinfo=timezone.utc).timestamp() * 1000)
+
+def around(start_ms: int, hours: int = 72, step_ms: int = 7 * 60_000) -> np.ndarray:
+    """Plays every few minutes (off the quarter hours) for a few days"""
+    return np.arange(start_ms, start_ms + hours * HOUR_MS, step_ms, dtype=np.int64)
+
+def local_times(bucketer: TimeBucketer, timestamps: np.ndarray):
+    return [datetime.fromtimestamp(int(t) / 1000, tz=bucketer.tz) for t in timestamps]
+
+# Spring forward and fall back, a southern-hemisphere zone and a 30-minute DST shift
+TRANSITIONS = [
+    ("America/New_York", epoch_ms(2024, 3, 9)),
+    ("America/New_York", epoch_ms(2024, 11, 2)),
+    ("Europe/Berlin", epoch_ms(2024, 10, 26)),
+    ("Australia/Sydney", epoch_ms(2024, 4, 6)),
+    ("Australia/Lord_Howe", epoch_ms(2024, 10, 5))
+]
+
+@pytest.mark.parametrize("tz, start", TRANSITIONS)
+def test_hours_and_segments_follow_the_local_clock(tz, start):
+    bucketer = TimeBucketer(tz, SEGMENTS)
+    timestamps = around(start)
+    expected_hours = np.array([local.hour for local in local_times(bucketer, timestamps)])
+
+    hours, n_hours = bucketer.buckets(timestamps, "hour")
+    assert n_hours == 24
+    np.testing.assert_array_equal(hours, expected_hours)
+
+    segments, n_segments = bucketer.buckets(timestamps, "segment")
+    assert n_segments == len(SEGMENTS)
+    np.testing.assert_array_equal(segments, segment_lookup(SEGMENTS)[expected_hours])
+
+@pytest.mark.parametrize("tz, start", TRANSITIONS)
+def test_local_days_and_week_hours_across_transitions(tz, start):
+    bucketer = TimeBucketer(tz, SEGMENTS)
+    timestamps = around(start)
+    locals_ = local_times(bucketer, timestamps)
+
+    days = bucketer.local_ms(timestamps) // DAY_MS
+    expected_days = [(local.date() - datetime(1970, 1, 1).date()).days for local in locals_]
+    np.testing.assert_array_equal(days, expected_days)
+
+    week_hours, _ = bucketer.buckets(timestamps, "hour_of_week")
+    np.testing.assert_array_equal(week_hours, [local.weekday() * 24 + local.hour for local in locals_])
+
+@pytest.mark.parametrize("tz, start", TRANSITIONS)
+def test_day_start_is_local_midnight(tz, start):
+    bucketer = TimeBucketer(tz, SEGMENTS)
+    for offset in range(3):
+        day = bucketer.local_day(start + offset * DAY_MS)
+        midnight = bucketer.day_start_ms(day)
+        assert bucketer.local_day(midnight) == day
+        assert bucketer.local_day(midnight - 1) == day - 1
+        local = datetime.fromtimestamp(midnight / 1000, tz=bucketer.tz)
+        assert (local.hour, local.minute) == (0, 0)
+
+def test_utc_is_unshifted_and_segments_wrap_midnight():
+    bucketer = TimeBucketer("UTC", SEGMENTS)
+    timestamps = np.array([epoch_ms(2024, 1, 1, hour) for hour in (0, 2, 5, 23)])
+    np.testing.assert_array_equal(bucketer.local_ms(timestamps), timestamps)
+    segments, _ = bucketer.buckets(timestamps, "segment")
+    names = list(SEGMENTS)
+    assert [names[segment] for segment in segments] == ["night", "late_night", "early_morning", "night"]
+
+def test_unknown_timezone_is_rejected():
+    with pytest.raises(ValueError):
+        TimeBucketer("Mars/Olympus_Mons", SEGMENTS)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from app.services.twins import BruteForceIndex, IVFIndex, TwinsIndex
+
+DIM = 16
+
+def clustered_vectors(n: int, n_clusters: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.random((n_clusters, DIM)).astype(np.float32)
+    return centers[rng.integers(0, n_clusters, n)] + rng.normal(0, 0.03, (n, DIM)).astype(np.float32)
+
+def build(vectors: np.ndarray, nlist: int, nprobe: int):
+    ids = [f"user{i}" for i in range(len(vectors))]
+    exact = BruteForceIndex(DIM)
+    for user_id, vector in zip(ids, vectors):
+        exact.add(user_id, vector)
+    ivf = IVFIndex.train(vectors, nlist, nprobe)
+    ivf.add_many(ids, vectors)
+    return exact, ivf
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+def test_ivf_probing_every_list_matches_brute_force(metric):
+    vectors = clustered_vectors(2000)
+    exact, ivf = build(vectors, nlist=16, nprobe=16)
+
+    for query in vectors[:25]:
+        expected = exact.search(query, 10, metric)
+        found = ivf.search(query, 10, metric)
+        assert [user_id for user_id, _ in found] == [user_id for user_id, _ in expected]
+        np.testing.assert_allclose([score for _, score in found], [score for _, score in expected], rtol=1e-5, atol=1e-5)
+
+def test_ivf_recall_with_few_probes():
+    vectors = clustered_vectors(5000)
+    exact, ivf = build(vectors, nlist=70, nprobe=8)
+
+    hits = 0
+    queries = vectors[:100]
+    for query in queries:
+        expected = {user_id for user_id, _ in exact.search(query, 10)}
+        hits += len(expected & {user_id for user_id, _ in ivf.search(query, 10)})
+    assert hits / (10 * len(queries)) >= 0.9
+
+def test_ivf_upsert_and_remove_move_between_lists():
+    vectors = clustered_vectors(500)
+    _, ivf = build(vectors, nlist=10, nprobe=10)
+
+    far = np.full(DIM, 5.0, dtype=np.float32)
+    ivf.add("user0", far)
+    assert len(ivf) == 500
+    np.testing.assert_array_equal(ivf.get("user0"), far)
+    assert ivf.search(far, 1)[0][0] == "user0"
+
+    assert ivf.remove("user0")
+    assert not ivf.remove("user0")
+    assert "user0" not in ivf
+    assert all(user_id != "user0" for user_id, _ in ivf.search(far, 20))
+
+def test_twins_index_switches_to_ivf_and_keeps_results():
+    vectors = clustered_vectors(600)
+    twins = TwinsIndex(dim=DIM, ivf_threshold=500, nprobe=64)
+    exact = BruteForceIndex(DIM)
+    for i, vector in enumerate(vectors):
+        twins.upsert(f"user{i}", vector)
+        exact.add(f"user{i}", vector)
+
+    assert isinstance(twins.index, IVFIndex)
+    assert len(twins) == 600
+    matches = twins.search(vectors[0], k=5, exclude="user0")
+    assert [user_id for user_id, _ in matches] == [user_id for user_id, _ in exact.search(vectors[0], 6) if user_id != "user0"][:5]
+
+    distances = twins.search(vectors[0], k=3, metric="euclidean")
+    assert distances[0] == ("user0", pytest.approx(0.0, abs=1e-3))
+    assert all(score <= 0 for _, score in distances)
@@ -4,7 +4,7 @@ import TopTracks from './components/TopTracks';
 import TimeAnalysis from './components/TimeAnalysis';
 
 function App() {
-  const [accessToken, setAccessToken] = useState<string | null>(null);
+  const [userId, setUserId] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -16,7 +16,7 @@ function App() {
         
         if (response.ok) {
           const data = await response.json();
-          setAccessToken(data.access_token);
+          setUserId(data.authenticated ? data.user_id : null);
         }
       } catch (error) {
         console.error('Auth check failed:', error);
@@ -40,7 +40,7 @@ function App() {
     );
   }
 
-  if (!accessToken) {
+  if (!userId) {
     return (
       <Container maxWidth="sm">
         <Box sx={{ mt: 8, textAlign: 'center' }}>
@@ -71,13 +71,13 @@ function App() {
           Welcome to Sonic Sync
         </Typography>
         
-        <TimeAnalysis accessToken={accessToken} />
+        <TimeAnalysis />
         
         <Box sx={{ mt: 4 }}>
           <Typography variant="h4" gutterBottom>
             Your Top Tracks
           </Typography>
-          <TopTracks accessToken={accessToken} />
+          <TopTracks />
         </Box>
       </Box>
     </Container>
@@ -22,10 +22,6 @@ ChartJS.register(
   Legend
 );
 
-interface TimeAnalysisProps {
-  accessToken: string;
-}
-
 interface TimeSegment {
   track_count: number;
   features: {
@@ -53,7 +49,7 @@ interface TimeAnalysis {
   };
 }
 
-const TimeAnalysis: React.FC<TimeAnalysisProps> = ({ accessToken }) => {
+const TimeAnalysis: React.FC = () => {
   const [analysis, setAnalysis] = useState<TimeAnalysis | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
@@ -62,9 +58,7 @@ const TimeAnalysis: React.FC<TimeAnalysisProps> = ({ accessToken }) => {
     const fetchAnalysis = async () => {
       try {
         const response = await fetch('http://127.0.0.1:8000/api/v1/tracks/time-analysis', {
-          headers: {
-            'Authorization': `Bearer ${accessToken}`
-          }
+          credentials: 'include'
         });
         
         if (!response.ok) {
@@ -81,7 +75,7 @@ const TimeAnalysis: React.FC<TimeAnalysisProps> = ({ accessToken }) => {
     };
 
     fetchAnalysis();
-  }, [accessToken]);
+  }, []);
 
   if (loading) {
     return (